@@ -0,0 +1,3 @@
+"""
+Бенчмарки бота. Запускаются из корня репозитория: python -m benchmarks.<name>
+"""
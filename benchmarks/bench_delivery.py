@@ -0,0 +1,220 @@
+# benchmarks/bench_delivery.py
+"""
+Сквозная доставка через поддельный Bot API (benchmarks.fake_bot_api):
+
+- send      — N уведомлений через sender.build_send_notification и
+              outbound.OutboundQueue; задержка от постановки в очередь до
+              ответа API, пропускная способность, ошибки (в т.ч. 429)
+- callbacks — N нажатий «Done» через getUpdates (или webhook при
+              --updates webhook) → Application → done_handler; задержка
+              от нажатия до правки сообщения
+
+Результат — JSON (stdout или --out).
+
+    python -m benchmarks.bench_delivery [--scenario send|callbacks|all] [-n 500]
+        [--latency 0.03] [--jitter 0.02] [--rate-429 0.0] [--workers 4] [--chats 1]
+        [--telegram-limits] [--updates polling|webhook] [--out delivery.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from telegram import Bot
+from telegram.ext import ApplicationBuilder, CallbackQueryHandler
+
+from benchmarks.fake_bot_api import FakeBotApi
+from loop_watchdog import percentile
+from models import Task
+from outbound import OutboundJob, OutboundQueue
+from utils import load_config
+from webhook import WebhookServer
+
+TOKEN = "123456:FAKE"
+
+
+def latency_summary(samples) -> dict:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def make_tasks(folder: Path, n: int):
+    """Заметка на сегодня с n открытыми задачами и сами задачи (как из парсера)."""
+    from parser import parse_task_lines
+
+    path = folder / f"{date.today().isoformat()}.md"
+    lines = [f"- [ ] нагрузочная задача {i} [startTime:: {i // 60 % 24:02d}:{i % 60:02d}]" for i in range(n)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return parse_task_lines(str(path))
+
+
+async def scenario_send(api: FakeBotApi, tasks, args) -> dict:
+    from sender import build_send_notification
+
+    cfg = load_config()
+    limits = dict(global_rate=cfg.get("rate_global_per_sec", 30),
+                  chat_rate_per_min=cfg.get("rate_chat_per_min", 20),
+                  chat_burst=cfg.get("rate_chat_burst", 5)) if args.telegram_limits else \
+        dict(global_rate=1e9, chat_rate_per_min=1e9, chat_burst=10 ** 9)
+
+    submitted_at, latencies, errors = {}, [], []
+    done = asyncio.Event()
+
+    def on_result(job: OutboundJob, error):
+        latencies.append(time.perf_counter() - submitted_at[job.task.stable_id])
+        if error is not None:
+            errors.append(type(error).__name__)
+        if len(latencies) == len(tasks):
+            done.set()
+
+    async with Bot(token=TOKEN, base_url=api.base_url) as bot:
+        send = build_send_notification(bot)
+        queue = OutboundQueue(send, on_result, workers=args.workers, **limits)
+        await queue.start()
+        t0 = time.perf_counter()
+        for i, task in enumerate(tasks):
+            submitted_at[task.stable_id] = time.perf_counter()
+            queue.submit(OutboundJob(task, "before1", 15, {"chat_id": -1000 - i % args.chats}))
+        await done.wait()
+        wall = time.perf_counter() - t0
+        await queue.close()
+        await send.deleter.flush()
+
+    return {
+        "sent": len(tasks) - len(errors),
+        "failed": len(errors),
+        "errors": {name: errors.count(name) for name in set(errors)},
+        "wall_s": wall,
+        "throughput_per_s": len(tasks) / wall,
+        "latency": latency_summary(latencies),
+        "api_calls": api.counts(),
+    }
+
+
+async def scenario_callbacks(api: FakeBotApi, tasks, args) -> dict:
+    from done_handler import handle_done_button
+
+    index = {task.stable_id: task for task in tasks}
+    pressed_at = {}
+    for i, task in enumerate(tasks):
+        markup = {"inline_keyboard": [[{"text": "✔ Завершить", "callback_data": f"done::{task.stable_id}"}]]}
+        api.add_message(-1000 - i % args.chats, task.text, markup)
+
+    app = ApplicationBuilder().token(TOKEN).base_url(api.base_url).build()
+    app.add_handler(CallbackQueryHandler(lambda u, c: handle_done_button(u, c, index), pattern=r"^done::"))
+    await app.initialize()
+    await app.start()
+    webhook = None
+    if args.updates == "webhook":
+        webhook = WebhookServer(app, secret="bench-secret", port=0, workers=args.workers)
+        await webhook.start()
+        # Адрес известен только после запуска сервера (свободный порт)
+        webhook.url = f"{webhook.server.url}{webhook.path}"
+        await webhook.register()
+    else:
+        await app.updater.start_polling(poll_interval=0.0, timeout=10)
+    try:
+        t0 = time.perf_counter()
+        for chat_id, message_id in api.replay_callbacks():
+            pressed_at[(chat_id, message_id)] = time.perf_counter()
+
+        deadline = time.perf_counter() + args.timeout
+        while len(api.edited_at) < len(pressed_at) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        wall = time.perf_counter() - t0
+    finally:
+        if webhook is not None:
+            await webhook.close()
+        else:
+            await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+
+    latencies = [api.edited_at[key] - at for key, at in pressed_at.items() if key in api.edited_at]
+    note = Path(tasks[0].file_path).read_text(encoding="utf-8") if tasks else ""
+    return {
+        "updates": args.updates,
+        "pressed": len(pressed_at),
+        "handled": len(latencies),
+        "checked_in_file": note.count("- [x]"),
+        "wall_s": wall,
+        "throughput_per_s": len(latencies) / wall if wall else 0.0,
+        "latency": latency_summary(latencies),
+        "api_calls": api.counts(),
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    scenarios = ["send", "callbacks"] if args.scenario == "all" else [args.scenario]
+    for name in scenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            tasks = make_tasks(Path(tmp), args.n)
+            api = FakeBotApi(latency=args.latency, jitter=args.jitter,
+                             rate_429=args.rate_429, retry_after=args.retry_after)
+            await api.start()
+            try:
+                scenario = scenario_send if name == "send" else scenario_callbacks
+                results[name] = await scenario(api, tasks, args)
+            finally:
+                await api.close()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", choices=["send", "callbacks", "all"], default="all")
+    ap.add_argument("-n", type=int, default=500)
+    ap.add_argument("--latency", type=float, default=0.03)
+    ap.add_argument("--jitter", type=float, default=0.02)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--chats", type=int, default=1)
+    ap.add_argument("--telegram-limits", action="store_true",
+                    help="темп отправки из config.json вместо неограниченного")
+    ap.add_argument("--updates", choices=["polling", "webhook"], default="polling",
+                    help="как нажатия доходят до бота в сценарии callbacks")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as state_dir:
+        # Состояние бота (флаги, message_id) пишется во временную папку, а не в репозиторий
+        os.chdir(state_dir)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "benchmark": "bench_delivery",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+        print(f"Saved results to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_parser.py
+"""
+Скорость разбора строк: прежний парсер (readlines + re.search на строку
++ анализ текста с пересборкой regex) против однопроходного токенизатора
+с байтовым префильтром.
+
+    python -m benchmarks.bench_parser [--files 300] [--lines 200] [--repeat 5]
+"""
+import argparse
+import logging
+import random
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from parser import DATE_RE, PRIORITY_ICONS, parse_task_lines
+
+
+# === Прежняя реализация (для сравнения) ===
+
+def legacy_analyze(raw_text: str):
+    priority_match = re.search(r"[" + "".join(PRIORITY_ICONS) + r"]", raw_text)
+    has_priority = bool(priority_match)
+    priority_emoji = priority_match.group(0) if has_priority else "⏫"
+    cleaned_text = re.sub(r"[" + "".join(PRIORITY_ICONS) + r"]", "", raw_text)
+    cleaned_text = re.sub(r"\[startTime::.*?\]", "", cleaned_text)
+    cleaned_text = re.sub(r"\[endTime::.*?\]", "", cleaned_text)
+    return cleaned_text.strip(), has_priority, priority_emoji
+
+
+def legacy_parse(file_path: str):
+    tasks = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        line_stripped = line.strip()
+        if "- [ ]" not in line or "- [x]" in line:
+            continue
+        start_m = re.search(r"\[startTime::\s*(\d{2}:\d{2})\]", line)
+        end_m = re.search(r"\[endTime::\s*(\d{2}:\d{2})\]", line)
+        if not start_m:
+            continue
+        date_str = DATE_RE.search(Path(file_path).stem).group(0)
+        start_dt = datetime.strptime(f"{date_str} {start_m.group(1)}", "%Y-%m-%d %H:%M")
+        if end_m:
+            end_dt = datetime.strptime(f"{date_str} {end_m.group(1)}", "%Y-%m-%d %H:%M")
+        else:
+            end_dt = start_dt + timedelta(minutes=15)
+        tasks.append((i, line_stripped, start_dt, end_dt) + legacy_analyze(line_stripped))
+    return tasks
+
+
+# === Синтетические заметки ===
+
+def make_line(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.55:
+        return rng.choice(["", "Обычный текст заметки про день.", "## Заголовок", "> цитата"])
+    if kind < 0.7:
+        return f"- [x] сделано {rng.randint(1, 999)} [startTime:: 09:00]"
+    if kind < 0.8:
+        return f"- [ ] без времени {rng.randint(1, 999)}"
+    h, m = rng.randint(0, 22), rng.choice([0, 15, 30, 45])
+    prio = rng.choice(PRIORITY_ICONS + ["", ""])
+    end = f" [endTime:: {h + 1:02d}:{m:02d}]" if rng.random() < 0.6 else ""
+    return f"- [ ] задача {rng.randint(1, 999)} {prio} [startTime:: {h:02d}:{m:02d}]{end} ^id{rng.randint(1, 99)}"
+
+
+def make_vault(folder: Path, files: int, lines: int, seed: int = 1):
+    rng = random.Random(seed)
+    day = datetime(2024, 1, 1)
+    for n in range(files):
+        body = "\n".join(make_line(rng) for _ in range(lines)) + "\n"
+        if n % 4 == 0:
+            # Часть заметок без задач — их отсекает байтовый префильтр
+            body = "\n".join("Просто текст." for _ in range(lines)) + "\n"
+        (folder / f"{(day + timedelta(days=n)).date()}.md").write_text(body, encoding="utf-8")
+
+
+def bench(func, paths, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in paths:
+            func(p)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=300)
+    ap.add_argument("--lines", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        make_vault(folder, args.files, args.lines)
+        paths = [str(p) for p in sorted(folder.glob("*.md"))]
+        total_lines = args.files * args.lines
+
+        # Проверка эквивалентности результатов
+        mismatches = 0
+        for p in paths:
+            old = legacy_parse(p)
+            new = [(t.line_num, t.text, t.start_dt, t.end_dt, t.cleaned_text, t.has_priority,
+                    t.priority_emoji) for t in parse_task_lines(p)]
+            mismatches += old != new
+
+        before = bench(legacy_parse, paths, args.repeat)
+        after = bench(parse_task_lines, paths, args.repeat)
+
+    print(f"files={args.files} lines/file={args.lines} total_lines={total_lines} mismatched_files={mismatches}")
+    print(f"before: {before:.3f}s  {total_lines / before:,.0f} lines/s")
+    print(f"after:  {after:.3f}s  {total_lines / after:,.0f} lines/s  (x{before / after:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# benchmarks/bench_scale.py
+"""
+Масштабирование на синтетическом хранилище: разбор файлов, загрузка папки
+(холодный и тёплый кэш), планирование уведомлений и полный тик
+Notifier.check_tasks_once с заглушкой вместо отправки в Telegram.
+
+Результат — JSON (stdout или --out), чтобы сравнивать версии между собой.
+
+    python -m benchmarks.bench_scale [--notes 365] [--tasks 20] [--noise 30]
+                                     [--time-tags 0.8] [--end-tags 0.6]
+                                     [--repeat 5] [--out bench.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import date, datetime
+from pathlib import Path
+
+import task_analyzer
+from benchmarks.vault import VaultSpec, generate_vault
+from notification_logic import generate_notifications
+from outbound import OutboundQueue
+from parser import parse_task_lines
+from scan_cache import ScanCache
+from utils import load_config
+
+
+def summarize(samples, items: int) -> dict:
+    best = min(samples)
+    return {
+        "best_s": best,
+        "mean_s": statistics.fmean(samples),
+        "items": items,
+        "per_item_us": best / items * 1e6 if items else None,
+        "samples_s": samples,
+    }
+
+
+def timed(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - t0)
+    return samples, result
+
+
+def reset_scan_cache():
+    task_analyzer._scan_cache = ScanCache()
+
+
+async def bench_tick(folder: Path, offsets, repeat: int) -> dict:
+    """
+    Холодный тик (пустой кэш и очередь), тёплый тик (ничего не изменилось),
+    время, за которое заглушка «отправляет» всё, что тик поставил в очередь,
+    и первый тик после перезапуска со снимком (snapshot.py).
+    """
+    import notifier as notifier_module
+    from notifier import Notifier
+
+    sent = []
+
+    async def stub_send(task, key, minutes_delta, chat_args):
+        sent.append(key)
+
+    def make_notifier():
+        notifier = Notifier(str(folder), *offsets, send_func=stub_send, interval=60, sent_flags={})
+        # Без лимитов Telegram: меряем сам бот, а не token bucket
+        notifier.outbound = OutboundQueue(stub_send, notifier.on_send_result, workers=4,
+                                          global_rate=1e9, chat_rate_per_min=1e9, chat_burst=10 ** 9)
+        return notifier
+
+    cold, warm, drain, restart = [], [], [], []
+    submitted = 0
+    for _ in range(repeat):
+        reset_scan_cache()
+        sent.clear()
+        notifier = make_notifier()
+        try:
+            t0 = time.perf_counter()
+            await notifier.check_tasks_once()
+            cold.append(time.perf_counter() - t0)
+            submitted = len(notifier.outbound)
+
+            t0 = time.perf_counter()
+            await notifier.check_tasks_once()
+            warm.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await notifier.start()
+            await notifier.outbound.join()
+            drain.append(time.perf_counter() - t0)
+        finally:
+            # close() сохраняет снимок для следующего замера
+            await notifier.close()
+
+        reset_scan_cache()
+        restarted = make_notifier()
+        try:
+            t0 = time.perf_counter()
+            await restarted.restore_snapshot()
+            await restarted.check_tasks_once()
+            restart.append(time.perf_counter() - t0)
+        finally:
+            restarted.snapshot_path = None
+            await restarted.close()
+
+    # Тик читает только заметки в окне дат уведомлений
+    tasks = len(notifier_module.task_list)
+    return {
+        "tick_cold": summarize(cold, tasks),
+        "tick_warm": summarize(warm, tasks),
+        "send_drain": summarize(drain, submitted),
+        "tick_from_snapshot": summarize(restart, tasks),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--notes", type=int, default=365)
+    ap.add_argument("--tasks", type=int, default=20)
+    ap.add_argument("--noise", type=int, default=30)
+    ap.add_argument("--time-tags", type=float, default=0.8)
+    ap.add_argument("--end-tags", type=float, default=0.6)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    spec = VaultSpec(notes=args.notes, tasks_per_note=args.tasks, noise_lines=args.noise,
+                     time_tags=args.time_tags, end_tags=args.end_tags, last_day=date.today(), seed=args.seed)
+    cfg = load_config()
+    offsets = (cfg["default_warn_before_start"], cfg["default_warn_during"], cfg["default_warn_overdue"])
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "vault"
+        paths = [str(p) for p in generate_vault(folder, spec)]
+        # Состояние бота (флаги, message_id) пишется во временную папку, а не в репозиторий
+        os.chdir(tmp)
+        try:
+            results = {}
+
+            samples, _ = timed(lambda: [parse_task_lines(p) for p in paths], args.repeat)
+            results["parse_task_lines"] = summarize(samples, len(paths))
+
+            def load_cold():
+                reset_scan_cache()
+                return task_analyzer.load_tasks_from_folder(str(folder))
+
+            samples, tasks = timed(load_cold, args.repeat)
+            results["load_tasks_cold"] = summarize(samples, len(tasks))
+            samples, _ = timed(lambda: task_analyzer.load_tasks_from_folder(str(folder)), args.repeat)
+            results["load_tasks_warm"] = summarize(samples, len(tasks))
+
+            samples, plans = timed(lambda: [generate_notifications(t, *offsets) for t in tasks], args.repeat)
+            results["generate_notifications"] = summarize(samples, len(tasks))
+
+            results.update(asyncio.run(bench_tick(folder, offsets, args.repeat)))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "benchmark": "bench_scale",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "spec": {**asdict(spec), "last_day": spec.last_day.isoformat()},
+        "offsets": offsets,
+        "tasks": len(tasks),
+        "notifications_planned": sum(len(p) for p in plans),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+        print(f"Saved results to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# benchmarks/fake_bot_api.py
+"""
+Поддельный Telegram Bot API для нагрузочных прогонов без настоящего Telegram.
+
+Бот подключается к нему через TELEGRAM_BASE_URL (см. scheduler.py):
+
+    "TELEGRAM_BASE_URL": "http://127.0.0.1:8081/bot"
+
+Сервер записывает все вызовы (sendMessage, deleteMessage(s), editMessage*,
+answerCallbackQuery, ...), хранит «живые» сообщения, умеет добавлять
+задержку и отвечать 429 с retry_after, а через getUpdates отдаёт нажатия
+inline-кнопок (push_callback / replay_callbacks). После setWebhook нажатия
+вместо этого отправляются POST'ом на адрес webhook с его secret_token.
+
+Отдельно: python -m benchmarks.fake_bot_api [--port 8081] [--latency 0.05] [--rate-429 0.01]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from http_server import HttpRequest, HttpResponse, HttpServer
+
+log = logging.getLogger(__name__)
+
+PATH_RE = re.compile(r"^/bot(?P<token>[^/]+)/(?P<method>\w+)$")
+
+# Методы, на которые может прийти искусственный 429
+LIMITED_METHODS = {"sendmessage", "editmessagetext", "editmessagereplymarkup", "deletemessage", "deletemessages"}
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+
+@dataclass
+class ApiCall:
+    method: str
+    params: dict
+    at: float               # time.perf_counter() при получении
+    status: int = 200
+
+
+class FakeBotApi:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, rate_429: float = 0.0, retry_after: int = 1, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: List[ApiCall] = []
+        self.messages: Dict[Tuple[int, int], dict] = {}     # (chat_id, message_id) → Message
+        self.edited_at: Dict[Tuple[int, int], float] = {}   # последняя правка сообщения
+        self._rng = random.Random(seed)
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._updates: List[dict] = []
+        self._update_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self.webhook: Optional[dict] = None                 # параметры последнего setWebhook
+        self._client: Optional[httpx.AsyncClient] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self.server = HttpServer(self.handle, host, port)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.server.url}/bot"
+
+    async def start(self):
+        await self.server.start()
+
+    async def close(self):
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await self.server.close()
+
+    def counts(self) -> Dict[str, int]:
+        return dict(Counter(c.method if c.status == 200 else f"{c.method}:{c.status}" for c in self.calls))
+
+    # === Нажатия кнопок ===
+
+    def push_callback(self, chat_id: int, message_id: int, data: str = None, user_id: int = 1) -> int:
+        """Ставит в getUpdates нажатие кнопки под сообщением; возвращает update_id."""
+        message = self.messages[(chat_id, message_id)]
+        if data is None:
+            data = message["reply_markup"]["inline_keyboard"][0][0]["callback_data"]
+        update_id = next(self._update_ids)
+        update = {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": "Tester"},
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": message,
+            },
+        }
+        if self.webhook:
+            task = asyncio.create_task(self._deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+        return update_id
+
+    async def _deliver(self, update: dict):
+        """Как Telegram: POST на webhook, при ошибке — повтор через секунду."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=40))
+        headers = {}
+        if self.webhook.get("secret_token"):
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook["secret_token"]
+        for _ in range(5):
+            try:
+                response = await self._client.post(self.webhook["url"], json=update, headers=headers)
+                if response.status_code == 200:
+                    return
+                log.warning(f"[fake-api] ⚠️ Webhook answered {response.status_code} to update {update['update_id']}")
+            except httpx.HTTPError as e:
+                log.warning(f"[fake-api] ⚠️ Webhook delivery failed: {e}")
+            await asyncio.sleep(1)
+
+    def replay_callbacks(self, prefix: str = "done::") -> List[Tuple[int, int]]:
+        """Нажимает кнопку под каждым живым сообщением, чья callback_data начинается с prefix."""
+        pressed = []
+        for (chat_id, message_id), message in list(self.messages.items()):
+            for row in message.get("reply_markup", {}).get("inline_keyboard", []):
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        self.push_callback(chat_id, message_id, button["callback_data"])
+                        pressed.append((chat_id, message_id))
+        return pressed
+
+    def add_message(self, chat_id: int, text: str, reply_markup: dict = None) -> dict:
+        """Сообщение «как будто отправленное ботом» — для прогонов без sendMessage."""
+        return self._store_message({"chat_id": chat_id, "text": text, "reply_markup": reply_markup})
+
+    # === HTTP ===
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        match = PATH_RE.match(request.path)
+        if not match:
+            return HttpResponse.json({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+
+        method = match["method"]
+        params = self._params(request)
+        call = ApiCall(method, params, time.perf_counter())
+        self.calls.append(call)
+
+        lowered = method.lower()
+        if lowered != "getupdates" and (self.latency or self.jitter):
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+        if lowered in LIMITED_METHODS and self.rate_429 and self._rng.random() < self.rate_429:
+            call.status = 429
+            return HttpResponse.json({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, 429)
+
+        handler = getattr(self, f"_api_{lowered}", None)
+        result = await handler(params) if handler else True
+        if isinstance(result, HttpResponse):
+            call.status = result.status
+            return result
+        return HttpResponse.json({"ok": True, "result": result})
+
+    @staticmethod
+    def _params(request: HttpRequest) -> dict:
+        if not request.body:
+            return dict(request.query)
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return request.json()
+        # PTB шлёт form-urlencoded, значения сложных полей — JSON-строки
+        params = {}
+        for key, value in request.form().items():
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    def _store_message(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+        message_id = next(self._message_ids.setdefault(chat_id, itertools.count(1)))
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": "Fake chat"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if params.get("message_thread_id"):
+            message["message_thread_id"] = int(params["message_thread_id"])
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+        self.messages[(chat_id, message_id)] = message
+        return message
+
+    @staticmethod
+    def _bad_request(description: str) -> HttpResponse:
+        return HttpResponse.json({"ok": False, "error_code": 400, "description": f"Bad Request: {description}"}, 400)
+
+    async def _api_getme(self, params):
+        return BOT_USER
+
+    async def _api_sendmessage(self, params):
+        return self._store_message(params)
+
+    async def _api_deletemessage(self, params):
+        if self.messages.pop((int(params["chat_id"]), int(params["message_id"])), None) is None:
+            return self._bad_request("message to delete not found")
+        return True
+
+    async def _api_deletemessages(self, params):
+        chat_id = int(params["chat_id"])
+        for message_id in params["message_ids"]:
+            self.messages.pop((chat_id, int(message_id)), None)
+        return True
+
+    def _edit(self, params, **changes):
+        key = (int(params["chat_id"]), int(params["message_id"]))
+        message = self.messages.get(key)
+        if message is None:
+            return self._bad_request("message to edit not found")
+        message.update(changes)
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+        elif "reply_markup" in message and "text" in changes:
+            # Как в Telegram: правка текста без reply_markup снимает клавиатуру
+            del message["reply_markup"]
+        message["edit_date"] = int(time.time())
+        self.edited_at[key] = time.perf_counter()
+        return message
+
+    async def _api_editmessagetext(self, params):
+        return self._edit(params, text=params.get("text", ""))
+
+    async def _api_editmessagereplymarkup(self, params):
+        return self._edit(params)
+
+    async def _api_getupdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    async def _api_setwebhook(self, params):
+        self.webhook = {"url": params["url"], "secret_token": params.get("secret_token", "")}
+        return True
+
+    async def _api_deletewebhook(self, params):
+        self.webhook = None
+        return True
+
+    async def _api_getwebhookinfo(self, params):
+        return {"url": self.webhook["url"] if self.webhook else "", "has_custom_certificate": False,
+                "pending_update_count": len(self._updates) + len(self._deliveries)}
+
+
+async def serve(args):
+    api = FakeBotApi(port=args.port, latency=args.latency, jitter=args.jitter,
+                     rate_429=args.rate_429, retry_after=args.retry_after)
+    await api.start()
+    print(f"Fake Bot API: set TELEGRAM_BASE_URL to {api.base_url}")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            log.info(f"[fake-api] {api.counts()}")
+    finally:
+        await api.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=1)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/vault.py
+"""
+Генератор синтетического хранилища Obsidian: ежедневные заметки
+YYYY-MM-DD.md с задачами и «шумом» (обычный текст, выполненные задачи).
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List
+
+from parser import PRIORITY_ICONS
+
+NOISE = ["", "Обычный текст заметки про день.", "## Заголовок", "> цитата", "- пункт списка"]
+
+
+@dataclass
+class VaultSpec:
+    notes: int = 365                # число ежедневных заметок
+    tasks_per_note: int = 20        # открытых задач в заметке
+    noise_lines: int = 30           # строк без задач в заметке
+    time_tags: float = 0.8          # доля задач с [startTime:: ...]
+    end_tags: float = 0.6           # доля задач с временем начала, у которых есть и [endTime:: ...]
+    done_ratio: float = 0.2         # доля выполненных задач «- [x]» среди задач
+    last_day: date = None           # дата последней заметки (по умолчанию — сегодня)
+    seed: int = 1
+
+
+def make_task_line(rng: random.Random, spec: VaultSpec, n: int) -> str:
+    box = "- [x]" if rng.random() < spec.done_ratio else "- [ ]"
+    prio = rng.choice(PRIORITY_ICONS + ["", ""])
+    if rng.random() >= spec.time_tags:
+        return f"{box} задача {n} без времени {prio}"
+    h, m = rng.randint(0, 22), rng.choice([0, 15, 30, 45])
+    end = f" [endTime:: {h + 1:02d}:{m:02d}]" if rng.random() < spec.end_tags else ""
+    return f"{box} задача {n} {prio} [startTime:: {h:02d}:{m:02d}]{end} ^id{n}"
+
+
+def make_note(rng: random.Random, spec: VaultSpec) -> str:
+    lines = [rng.choice(NOISE) for _ in range(spec.noise_lines)]
+    for n in range(spec.tasks_per_note):
+        lines.insert(rng.randint(0, len(lines)), make_task_line(rng, spec, n))
+    return "\n".join(lines) + "\n"
+
+
+def generate_vault(folder: Path, spec: VaultSpec) -> List[Path]:
+    """
+    Создаёт spec.notes заметок подряд по дням, заканчивая spec.last_day.
+    Возвращает пути в порядке дат.
+    """
+    rng = random.Random(spec.seed)
+    last_day = spec.last_day or date.today()
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(spec.notes):
+        day = last_day - timedelta(days=spec.notes - 1 - i)
+        path = folder / f"{day.isoformat()}.md"
+        path.write_text(make_note(rng, spec), encoding="utf-8")
+        paths.append(path)
+    return paths
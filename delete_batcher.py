@@ -0,0 +1,77 @@
+# delete_batcher.py
+"""
+Пакетное удаление устаревших уведомлений.
+
+Вместо delete_message на каждое старое сообщение sender складывает их сюда;
+через короткую паузу (или при наборе 100 штук) они уходят одним вызовом
+Bot API deleteMessages на чат, а memory обновляется одним commit на пачку.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from telegram import Bot
+
+import metrics
+from memory import delete_message_ids
+
+log = logging.getLogger(__name__)
+
+# Лимит Bot API deleteMessages
+MAX_BATCH = 100
+
+
+class DeleteBatcher:
+    def __init__(self, bot: Bot, linger: float = 0.5):
+        self.bot = bot
+        self.linger = linger
+        # chat_id → {(task_id, key): message_id}
+        self._pending: Dict[object, Dict[Tuple[str, str], int]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: set = set()
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    def add(self, chat_id, task_id: str, key: str, message_id: int):
+        items = self._pending.setdefault(chat_id, {})
+        items[(task_id, key)] = message_id
+
+        loop = asyncio.get_running_loop()
+        if len(items) >= MAX_BATCH:
+            self._spawn_flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._spawn_flush, loop)
+
+    def _spawn_flush(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = loop.create_task(self.flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for chat_id, items in pending.items():
+            entries = list(items.items())
+            for start in range(0, len(entries), MAX_BATCH):
+                await self._delete_chunk(chat_id, entries[start:start + MAX_BATCH])
+
+    async def _delete_chunk(self, chat_id, entries):
+        message_ids = [message_id for _, message_id in entries]
+        started = time.perf_counter()
+        try:
+            # Сообщения, которых уже нет, Telegram просто пропускает
+            await self.bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+        except Exception as e:
+            # message_id остаются в memory — их снова предложит следующая стадия
+            log.warning(f"[🗑] Could not delete {len(message_ids)} old messages in {chat_id}: {e}")
+            return
+        finally:
+            metrics.DELETE_LATENCY.observe(time.perf_counter() - started)
+
+        metrics.DELETED_MESSAGES.inc(len(message_ids))
+        delete_message_ids([task_key for task_key, _ in entries])
+        log.info(f"[🗑] Deleted {len(message_ids)} outdated notifications in {chat_id} with one call")
@@ -0,0 +1,57 @@
+# digest.py
+"""
+Сводки вместо потока сообщений.
+
+Если за один тик наступило больше DIGEST_THRESHOLD уведомлений одной стадии
+для одного чата/топика (типично после перезапуска или долгого простоя:
+overdue-ключи не ограничены сверху), они сворачиваются в сводки по
+DIGEST_MAX_ITEMS задач — одно сообщение с кнопкой «Done» на каждую задачу.
+Так число сообщений ограничено при любом размере накопившегося хвоста.
+"""
+from typing import Dict, List, Tuple
+
+from outbound import OutboundJob
+
+DIGEST_KEY = "digest"
+
+
+def stage_of(key: str) -> str:
+    """before2 → before, overdue1 → overdue."""
+    return key.rstrip("0123456789")
+
+
+def coalesce(jobs: List[OutboundJob], threshold: int, max_items: int = 20) -> List[OutboundJob]:
+    """
+    Группы больше threshold (по чату, топику и стадии) превращаются в job'ы
+    сводок: job.items — исходные уведомления, у одной задачи их может быть
+    несколько (overdue1 и overdue2 после простоя). threshold ≤ 0 — без сводок.
+    """
+    if threshold <= 0 or len(jobs) <= threshold:
+        return jobs
+
+    groups: Dict[Tuple, List[OutboundJob]] = {}
+    for job in jobs:
+        group = (job.chat_args["chat_id"], job.chat_args.get("message_thread_id"), stage_of(job.key))
+        groups.setdefault(group, []).append(job)
+
+    result: List[OutboundJob] = []
+    for (_, _, stage), group in groups.items():
+        by_task: Dict[str, List[OutboundJob]] = {}
+        for job in group:
+            by_task.setdefault(job.task.stable_id, []).append(job)
+        if len(by_task) <= threshold:
+            result.extend(group)
+            continue
+        per_task = list(by_task.values())
+        for start in range(0, len(per_task), max_items):
+            items = [job for task_jobs in per_task[start:start + max_items] for job in task_jobs]
+            result.append(OutboundJob(items[0].task, f"{DIGEST_KEY}:{stage}", 0, items[0].chat_args, items=items))
+    return result
+
+
+def latest_per_task(items: List[OutboundJob]) -> List[OutboundJob]:
+    """Для текста сводки — по одной (самой поздней) стадии на задачу, в порядке появления."""
+    latest: Dict[str, OutboundJob] = {}
+    for job in items:
+        latest[job.task.stable_id] = job
+    return list(latest.values())
@@ -1,15 +1,104 @@
 # done_handler.py
+import asyncio
 import logging
-import json
-from telegram import Update
+import time
+from typing import Dict, List, Optional
+from telegram import InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 from pathlib import Path
 
+import metrics
 from memory import get_message_mapping  # 💡 Новый импорт
+from models import Task
+from utils import atomic_write_text
 
 log = logging.getLogger(__name__)
 
-async def handle_done_button(update: Update, context: ContextTypes.DEFAULT_TYPE, task_list):
+# Нажатия могут обрабатываться параллельно (webhook.py) — правки одного
+# файла идут по очереди, иначе одна перезапись затрёт другую
+_file_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def mark_done(file_path: str, line_num: int, text: str = None) -> Optional[int]:
+    """mark_done_in_file вне event loop, по одной правке на файл."""
+    lock = _file_locks.setdefault(file_path, asyncio.Lock())
+    async with lock:
+        return await asyncio.to_thread(mark_done_in_file, file_path, line_num, text)
+
+
+def locate_task_line(lines: List[str], text: str, hint: int) -> Optional[int]:
+    """
+    Находит строку задачи в файле. Сначала проверяет сохранённый номер (hint),
+    затем ищет строку с тем же текстом прямым проходом: строка, сдвинутая
+    правкой, находится без пересканирования хранилища. При нескольких
+    одинаковых строках берётся ближайшая к hint.
+    """
+    if 0 <= hint < len(lines) and lines[hint].strip() == text:
+        return hint
+
+    best = None
+    for i, line in enumerate(lines):
+        if "- [ ]" in line and line.strip() == text and (best is None or abs(i - hint) < abs(best - hint)):
+            best = i
+    return best
+
+
+def mark_done_in_file(file_path: str, line_num: int, text: str = None) -> Optional[int]:
+    """
+    Отмечает задачу выполненной: "- [ ]" → "- [x]" в нужной строке.
+    Файл перезаписывается атомарно (через временный файл), переводы строк сохраняются.
+    Возвращает номер изменённой строки или None, если задача не найдена.
+    """
+    path = Path(file_path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = f.readlines()
+
+    if text is not None:
+        idx = locate_task_line(lines, text, line_num)
+    else:
+        idx = line_num if 0 <= line_num < len(lines) and "- [ ]" in lines[line_num] else None
+
+    if idx is None:
+        return None
+
+    lines[idx] = lines[idx].replace("- [ ]", "- [x]", 1)
+    atomic_write_text(path, "".join(lines))
+    return idx
+
+
+def _remaining_keyboard(query, data: str) -> Optional[InlineKeyboardMarkup]:
+    """
+    Для сводки (несколько кнопок «Done» под сообщением) — клавиатура без
+    нажатой кнопки; None, если это обычное уведомление об одной задаче.
+    """
+    markup = query.message.reply_markup if query.message else None
+    if markup is None:
+        return None
+    buttons = [b for row in markup.inline_keyboard for b in row if (b.callback_data or "").startswith("done::")]
+    if len(buttons) < 2:
+        return None
+    rows = [[b for b in row if b.callback_data != data] for row in markup.inline_keyboard]
+    return InlineKeyboardMarkup([row for row in rows if row])
+
+
+async def _reply(query, text: str):
+    """Обычное уведомление заменяется текстом; в сводке убирается только нажатая кнопка."""
+    keyboard = _remaining_keyboard(query, query.data)
+    if keyboard is None:
+        await query.edit_message_text(text)
+    else:
+        await query.edit_message_reply_markup(reply_markup=keyboard)
+
+
+async def handle_done_button(update: Update, context: ContextTypes.DEFAULT_TYPE, task_index: Dict[str, Task]):
+    started = time.perf_counter()
+    result = await _handle_done(update, task_index)
+    metrics.CALLBACK_DURATION.observe(time.perf_counter() - started)
+    metrics.CALLBACKS.inc(result=result)
+
+
+async def _handle_done(update: Update, task_index: Dict[str, Task]) -> str:
+    """Возвращает исход для метрик: done, fallback, not_found, invalid или error."""
     try:
         query = update.callback_query
         await query.answer()
@@ -17,45 +106,43 @@ async def handle_done_button(update: Update, context: ContextTypes.DEFAULT_TYPE,
         parts = query.data.split("::")
         if len(parts) < 2:
             await query.edit_message_text("⚠️ Неверный формат callback_data.")
-            return
+            return "invalid"
 
         task_id = parts[1]
-        found_task = next((t for t in task_list if t.stable_id == task_id), None)
+        found_task = task_index.get(task_id)
 
         if found_task:
-            path = Path(found_task.file_path)
-            with open(path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-
-            lines[found_task.line_num] = lines[found_task.line_num].replace("- [ ]", "- [x]", 1)
-
-            with open(path, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-
-            await query.edit_message_text("✅ Задача завершена.")
-            log.info(f"[DONE] ✅ {found_task.text.strip()} ({task_id})")
-            return
+            idx = await mark_done(found_task.file_path, found_task.line_num, found_task.text)
+            if idx is not None:
+                await _reply(query, "✅ Задача завершена.")
+                moved = f" (строка сдвинулась {found_task.line_num}→{idx})" if idx != found_task.line_num else ""
+                log.info(f"[DONE] ✅ {found_task.text.strip()} ({task_id}){moved}")
+                return "done"
 
         # === fallback через message_ids.json ===
         mapping = get_message_mapping()
         if task_id in mapping:
             file_path, line_num = mapping[task_id]
-            path = Path(file_path)
-
-            with open(path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-
-            if "- [ ]" in lines[line_num]:
-                lines[line_num] = lines[line_num].replace("- [ ]", "- [x]", 1)
-                with open(path, "w", encoding="utf-8") as f:
-                    f.writelines(lines)
 
-                await query.edit_message_text("✅ Задача завершена (через fallback).")
+            if await mark_done(file_path, line_num) is not None:
+                await _reply(query, "✅ Задача завершена (через fallback).")
                 log.info(f"[DONE] 🛠 Fallback: {file_path}:{line_num}")
-                return
+                return "fallback"
 
-        await query.edit_message_text("⚠️ Задача не найдена или уже изменена.")
+        await _reply(query, "⚠️ Задача не найдена или уже изменена.")
+        return "not_found"
 
+    except OSError as e:
+        # Заметку не удалось записать (занята, нет прав) — сообщение с кнопкой
+        # не трогаем, чтобы нажать ещё раз
+        log.error(f"[DONE] ❌ Could not update the note: {e}")
+        return "error"
     except Exception as e:
         log.error(f"[ERROR] handle_done_button: {e}")
-        await update.callback_query.edit_message_text("⚠️ Ошибка при обработке задачи.")
+        try:
+            # Сводку целиком не затираем — остальные кнопки ещё нужны
+            if _remaining_keyboard(update.callback_query, update.callback_query.data) is None:
+                await update.callback_query.edit_message_text("⚠️ Ошибка при обработке задачи.")
+        except Exception:
+            pass
+        return "error"
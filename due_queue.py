@@ -0,0 +1,158 @@
+# due_queue.py
+"""
+Очередь уведомлений по времени отправки (min-heap).
+
+Записи (send_time, task_id, key) кладутся один раз, когда задача
+появляется в хранилище. Исчезнувшие задачи не вычищаются из кучи сразу:
+их записи отбрасываются при извлечении (ленивое удаление по поколению).
+"""
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models import Task
+
+log = logging.getLogger(__name__)
+
+# (send_time, seq, task_id, task_gen, key, minutes_delta)
+HeapEntry = Tuple[datetime, int, str, int, str, int]
+
+
+class DueQueue:
+    def __init__(self, plan_func: Callable[[Task], List[Tuple[datetime, str, str, int]]]):
+        """
+        plan_func(task) → [(send_time, key, prefix, minutes_delta), ...]
+        (обычно обёртка над generate_notifications с текущими смещениями)
+        """
+        self._plan = plan_func
+        self._heap: List[HeapEntry] = []
+        self._seq = itertools.count()
+        self._gen = itertools.count(1)
+        self._tasks: Dict[str, Tuple[Task, int]] = {}   # task_id → (task, поколение)
+        self._synced_generation: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        item = self._tasks.get(task_id)
+        return item[0] if item else None
+
+    def sync(self, tasks: Iterable[Task], sent_flags: Dict[str, Set[str]], generation: int = None):
+        """
+        Приводит очередь к актуальному списку задач.
+        Планируются новые задачи и задачи, у которых поменялись inline-поля
+        [remind:: ...] и т.п. (в stable_id они не входят); если generation
+        совпадает с прошлым вызовом, список не менялся и делать ничего не нужно.
+        """
+        if generation is not None and generation == self._synced_generation:
+            return
+        self._synced_generation = generation
+
+        current: Dict[str, Tuple[Task, int]] = {}
+        added = replanned = 0
+        for task in tasks:
+            task_id = task.stable_id
+            if task_id in current:
+                continue
+            known = self._tasks.get(task_id)
+            if known is not None:
+                if known[0].overrides == task.overrides:
+                    # Та же задача (id включает время и текст) — обновляем ссылку,
+                    # номер строки мог сдвинуться
+                    current[task_id] = (task, known[1])
+                    continue
+                # Смещения задачи изменились: новое поколение, записи старого
+                # плана отбросятся при извлечении
+                replanned += 1
+            else:
+                added += 1
+
+            gen = next(self._gen)
+            current[task_id] = (task, gen)
+            already = sent_flags.get(task_id, set())
+            for when, key, _prefix, minutes in self._plan(task):
+                if key not in already:
+                    heapq.heappush(self._heap, (when, next(self._seq), task_id, gen, key, minutes))
+
+        removed = len(self._tasks.keys() - current.keys())
+        self._tasks = current
+
+        if added or removed or replanned:
+            log.info(f"[queue] 🗓 +{added} / -{removed} / ~{replanned} replanned tasks, {len(self._heap)} entries pending")
+        self._compact()
+
+    def rebuild(self, sent_flags: Dict[str, Set[str]]):
+        """
+        Полная перестройка (например, после смены смещений в конфиге).
+        """
+        tasks = [task for task, _gen in self._tasks.values()]
+        self._tasks = {}
+        self._heap = []
+        self._synced_generation = None
+        self.sync(tasks, sent_flags)
+
+    def snapshot(self) -> Tuple[List[HeapEntry], Dict[str, Tuple[Task, int]]]:
+        return list(self._heap), dict(self._tasks)
+
+    def restore(self, state: Tuple[List[HeapEntry], Dict[str, Tuple[Task, int]]],
+                keep: Callable[[Task], bool] = None):
+        """
+        Восстанавливает кучу из снимка (см. snapshot()). Задачи, для которых
+        keep(task) ложно, отбрасываются — как если бы их спланировали заново.
+        Следующий sync не перепланирует уже известные задачи.
+        """
+        heap, tasks = state
+        if keep is not None:
+            tasks = {task_id: item for task_id, item in tasks.items() if keep(item[0])}
+        self._tasks = tasks
+        self._heap = [e for e in heap if tasks.get(e[2], (None, -1))[1] == e[3]]
+        heapq.heapify(self._heap)
+        self._seq = itertools.count(max((e[1] for e in self._heap), default=0) + 1)
+        self._gen = itertools.count(max((gen for _task, gen in tasks.values()), default=0) + 1)
+        self._synced_generation = None
+
+    def push(self, task_id: str, key: str, when: datetime, minutes_delta: int):
+        """
+        Повторно запланировать ключ (например, после неудачной отправки).
+        """
+        item = self._tasks.get(task_id)
+        if item is None:
+            return
+        heapq.heappush(self._heap, (when, next(self._seq), task_id, item[1], key, minutes_delta))
+
+    def next_due(self) -> Optional[datetime]:
+        self._drop_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[datetime, Task, str, int]]:
+        """
+        Извлекает все записи со временем отправки ≤ now.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _seq, task_id, gen, key, minutes = heapq.heappop(self._heap)
+            item = self._tasks.get(task_id)
+            if item is None or item[1] != gen:
+                continue
+            due.append((when, item[0], key, minutes))
+        return due
+
+    def _drop_stale_head(self):
+        while self._heap:
+            _when, _seq, task_id, gen, _key, _minutes = self._heap[0]
+            item = self._tasks.get(task_id)
+            if item is not None and item[1] == gen:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        # Если мёртвых записей стало больше живых — пересобираем кучу
+        if len(self._heap) < 64 or len(self._heap) < 2 * len(self._tasks):
+            return
+        live = [e for e in self._heap if self._tasks.get(e[2], (None, -1))[1] == e[3]]
+        if len(live) * 2 < len(self._heap):
+            heapq.heapify(live)
+            self._heap = live
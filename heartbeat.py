@@ -22,13 +22,13 @@ def get_current_slot():
     return f"slot {slot_index} ({time_fmt(slot_start)}–{time_fmt(slot_end)})"
 
 async def heartbeat(bot, interval=1800):  # 1800s = 30 минут
-    cfg = load_config()
-    chat_args = {"chat_id": cfg["CHAT_ID"]}
-    if cfg.get("TOPIC_ID"):
-        chat_args["message_thread_id"] = cfg["TOPIC_ID"]
-
     while True:
         try:
+            # Конфиг кэшируется — перечитывается только после правки файла
+            cfg = load_config()
+            chat_args = {"chat_id": cfg["CHAT_ID"]}
+            if cfg.get("TOPIC_ID"):
+                chat_args["message_thread_id"] = cfg["TOPIC_ID"]
             slot_info = get_current_slot()
             text = f"🕯 {slot_info}"
             await bot.send_message(**chat_args, text=text, parse_mode="HTML")
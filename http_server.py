@@ -0,0 +1,187 @@
+# http_server.py
+"""
+Минимальный HTTP/1.1-сервер на asyncio streams (без сторонних зависимостей).
+
+Нужен для локальных служебных точек: поддельного Bot API в бенчмарках,
+/metrics и приёма webhook. Поддерживает keep-alive и тело по Content-Length;
+chunked-запросы не принимаются (411), некорректный Content-Length — 400,
+слишком много или слишком длинные заголовки — 431; после ошибки
+соединение закрывается.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import parse_qsl, urlsplit
+
+log = logging.getLogger(__name__)
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+           429: "Too Many Requests", 431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]     # имена в нижнем регистре
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+    def form(self) -> Dict[str, str]:
+        return dict(parse_qsl(self.body.decode("utf-8"), keep_blank_values=True))
+
+
+@dataclass
+class HttpResponse:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def json(cls, data, status: int = 200) -> "HttpResponse":
+        return cls(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    @classmethod
+    def text(cls, text: str, status: int = 200, content_type: str = "text/plain; charset=utf-8") -> "HttpResponse":
+        return cls(status, text.encode("utf-8"), content_type)
+
+
+Handler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+
+class HttpServer:
+    def __init__(self, handler: Handler, host: str = "127.0.0.1", port: int = 0,
+                 max_body: int = 1 << 20, idle_timeout: float = 75.0,
+                 max_headers: int = 100, max_line: int = 8192):
+        self.handler = handler
+        self.host = host
+        self.port = port                # 0 — свободный порт, настоящий появится после start()
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self.max_headers = max_headers  # заголовков в запросе
+        self.max_line = max_line        # байт в строке запроса или заголовка
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._closing = False
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        # limit — буфер readline: строку длиннее не читаем целиком в память
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=self.max_line + 2)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"[http] 🌐 Listening on {self.url}")
+
+    async def close(self):
+        """
+        Закрывает сокет и обрывает открытые соединения: простаивающие
+        keep-alive и обработчики в ожидании (long polling fake Bot API).
+        """
+        if self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        connections = list(self._connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+        self._closing = False
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    await self._write(writer, HttpResponse.text("request line too long", 431), close=True)
+                    break
+                if not request_line.strip():
+                    break
+
+                try:
+                    method, target, _version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write(writer, HttpResponse.text("bad request line", 400), close=True)
+                    break
+
+                headers = await self._read_headers(reader)
+                if headers is None:
+                    await self._write(writer, HttpResponse.text("too many or too long headers", 431), close=True)
+                    break
+
+                if "chunked" in headers.get("transfer-encoding", ""):
+                    await self._write(writer, HttpResponse.text("chunked body not supported", 411), close=True)
+                    break
+                raw_length = headers.get("content-length", "0") or "0"
+                # Только десятичные цифры: без знака, пробелов и "1e3"
+                if not (raw_length.isascii() and raw_length.isdigit()):
+                    await self._write(writer, HttpResponse.text("bad content-length", 400), close=True)
+                    break
+                length = int(raw_length)
+                if length > self.max_body:
+                    await self._write(writer, HttpResponse.text("body too large", 413), close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                url = urlsplit(target)
+                request = HttpRequest(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+                try:
+                    response = await self.handler(request)
+                except Exception as e:
+                    log.error(f"[http] ❌ Handler failed for {method} {url.path}: {e}", exc_info=True)
+                    response = HttpResponse.text("internal error", 500)
+
+                close = headers.get("connection", "").lower() == "close"
+                await self._write(writer, response, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Отмена из close() — штатное завершение: asyncio 3.11 пишет в лог
+            # отменённую задачу соединения как необработанную ошибку
+            if not self._closing:
+                raise
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> Optional[Dict[str, str]]:
+        """Заголовки до пустой строки; None — превышены max_headers или max_line."""
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                return None
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            if len(headers) >= self.max_headers or len(line) > self.max_line + 2:
+                return None
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, response: HttpResponse, close: bool = False):
+        head = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, 'Unknown')}",
+                f"Content-Type: {response.content_type}",
+                f"Content-Length: {len(response.body)}",
+                f"Connection: {'close' if close else 'keep-alive'}"]
+        head += [f"{k}: {v}" for k, v in response.headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
+        await writer.drain()
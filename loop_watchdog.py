@@ -0,0 +1,109 @@
+# loop_watchdog.py
+"""
+Сторож event loop.
+
+Корутина-зонд каждые tick секунд отмечается в loop и меряет задержку
+своего пробуждения (lag). Отдельный поток следит за отметками: если loop
+не отвечает дольше threshold, он снимает стек главного потока через
+sys._current_frames() — в нём видна корутина и блокирующий вызов —
+и пишет его в лог. По накопленным задержкам считаются перцентили.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, q: float) -> float:
+    """q-перцентиль (0..100) уже отсортированного списка, ближайший ранг."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.5, tick: float = 0.1,
+                 window: int = 3000, report_every: float = 300):
+        self.threshold = threshold
+        self.tick = tick
+        self.report_every = report_every
+        self.lags: Deque[float] = deque(maxlen=window)    # последние задержки, сек
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stalled_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "LoopWatchdog":
+        return cls(
+            threshold=cfg.get("LOOP_STALL_SEC", 0.5),
+            report_every=cfg.get("LOOP_LAG_REPORT_SEC", 300),
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """Перцентили задержки loop в миллисекундах за последнее окно."""
+        values = sorted(self.lags)
+        return {
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": self.max_lag * 1000,
+            "stalls": self.stalls,
+        }
+
+    async def run(self):
+        """Зонд; запускается рядом с остальными корутинами в asyncio.gather."""
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        log.info(f"[watchdog] 🐶 Watching event loop, stall threshold {self.threshold * 1000:.0f} ms")
+
+        next_report = loop.time() + self.report_every
+        try:
+            while True:
+                expected = loop.time() + self.tick
+                await asyncio.sleep(self.tick)
+                now = loop.time()
+                lag = max(0.0, now - expected)
+                self.lags.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+                self._last_beat = time.monotonic()
+
+                if lag >= self.threshold:
+                    log.warning(f"[watchdog] 🐢 Event loop was blocked for {lag * 1000:.0f} ms")
+
+                if now >= next_report:
+                    s = self.stats()
+                    log.info(f"[watchdog] 📈 Loop lag p50 {s['p50_ms']:.1f} ms, p90 {s['p90_ms']:.1f} ms, "
+                             f"p99 {s['p99_ms']:.1f} ms, max {s['max_ms']:.0f} ms, stalls {s['stalls']}")
+                    next_report = now + self.report_every
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.tick / 2):
+            silent = time.monotonic() - self._last_beat
+            if silent < self.threshold + self.tick:
+                self._stalled_since = None
+                continue
+            if self._stalled_since == self._last_beat:
+                continue  # этот простой уже записан
+            self._stalled_since = self._last_beat
+            self.stalls += 1
+
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame else "  <no frame>\n"
+            log.warning(f"[watchdog] 🚨 Event loop stalled for {silent * 1000:.0f} ms, "
+                        f"loop thread is at:\n{stack.rstrip()}")
@@ -1,68 +1,115 @@
 from pathlib import Path
 import json
 import logging
-from typing import Dict, Set, Union, Tuple
+from typing import Dict, Iterable, Set, Union, Tuple
+
+from state_store import StateStore, open_store
 
 log = logging.getLogger(__name__)
 
 MEMORY_FILE = Path("sent_notifications.json")
 MESSAGE_FILE = Path("message_ids.json")
+STATE_DB_FILE = Path("state.sqlite3")
 
 _memory: Dict[str, Set[str]] = {}
 _message_ids: Dict[str, Dict[str, int]] = {}
 _message_meta: Dict[str, Tuple[str, int]] = {}  # task_id → (file_path, line_num)
-
-
-def load_sent_flags(path: Union[str, Path] = None) -> Dict[str, Set[str]]:
+_expiry: Dict[str, float] = {}                  # task_id → unix-время удаления (retention)
+_outbox: Dict[str, Dict[str, dict]] = {}        # task_id → key → запись outbox (см. state_store.Outbox)
+
+_store: Union[StateStore, None] = None
+
+
+def get_store() -> StateStore:
+    """
+    Хранилище выбирается по STATE_BACKEND в config.json ("json" или "sqlite").
+    """
+    global _store
+    if _store is None:
+        from utils import load_config
+        cfg = load_config()
+        _store = open_store(
+            cfg.get("STATE_BACKEND", "json"),
+            MEMORY_FILE,
+            MESSAGE_FILE,
+            Path(cfg.get("STATE_DB", STATE_DB_FILE)),
+        )
+    return _store
+
+
+def load_sent_flags() -> Dict[str, Set[str]]:
     global _memory
-    file = Path(path) if path else MEMORY_FILE
-
-    if file.exists():
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                raw = json.load(f)
-            _memory = {task_id: set(flags) for task_id, flags in raw.items()}
-            log.info(f"[memory] ✅ Loaded sent flags from {file}")
-        except Exception as e:
-            log.error(f"[memory] ❌ Error loading sent flags: {e}")
-            _memory = {}
-    else:
+    store = get_store()
+    try:
+        _memory = store.load_flags()
+        log.info(f"[memory] ✅ Loaded sent flags ({len(_memory)} tasks)")
+    except Exception as e:
+        log.error(f"[memory] ❌ Error loading sent flags: {e}")
         _memory = {}
-        log.info(f"[memory] ℹ No memory file at {file}, starting fresh")
-        save_sent_flags()
+        store.replace_flags(_memory)
 
     return _memory
 
 
 def save_sent_flags(data: Dict[str, Set[str]] = None):
-    to_save = data if data is not None else _memory
-    with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump({k: list(v) for k, v in to_save.items()}, f, indent=2, ensure_ascii=False)
-    log.info(f"[memory] 💾 Saved sent flags to {MEMORY_FILE}")
-
-
-def mark_as_sent(task_id: str, key: str):
+    """
+    Фиксирует изменения флагов. Флаги пишутся построчно в mark_as_sent,
+    здесь только commit (и полная замена, если передан чужой словарь).
+    """
+    store = get_store()
+    if data is not None and data is not _memory:
+        store.replace_flags(data)
+    store.commit()
+
+
+def mark_as_sent(task_id: str, key: str, expires_at: float = None):
+    store = get_store()
     if task_id not in _memory:
         _memory[task_id] = set()
     _memory[task_id].add(key)
+    store.add_flag(task_id, key)
 
+    if expires_at is not None and _expiry.get(task_id) != expires_at:
+        _expiry[task_id] = expires_at
+        store.set_expiry(task_id, expires_at)
 
-def save_message_id(task_id: str, key: str, message_id: int, file_path: str = None, line_num: int = None):
+
+def save_message_id(task_id: str, key: str, message_id: int, file_path: str = None, line_num: int = None,
+                    commit: bool = True):
+    """
+    commit=False — зафиксируется вместе со следующим commit (у отправки
+    из Notifier это save_sent_flags в on_send_result).
+    """
+    store = get_store()
     if task_id not in _message_ids:
         _message_ids[task_id] = {}
 
     _message_ids[task_id][key] = message_id
+    store.set_message_id(task_id, key, message_id)
 
     if file_path is not None and line_num is not None:
         _message_meta[task_id] = (file_path, line_num)
+        store.set_meta(task_id, file_path, line_num)
+
+    if commit:
+        store.commit()
+    log.debug(f"[memory] 💾 Saved message_id for {task_id}::{key}")
 
-    with open(MESSAGE_FILE, 'w', encoding='utf-8') as f:
-        json.dump({
-            "ids": _message_ids,
-            "meta": _message_meta
-        }, f, indent=2, ensure_ascii=False)
 
-    log.info(f"[memory] 💾 Saved message IDs to {MESSAGE_FILE}")
+def move_message_id(task_id: str, old_key: str, key: str, message_id: int, commit: bool = True):
+    """
+    Сообщение отредактировано под новую стадию: message_id переходит
+    со старого ключа на новый одним commit (commit=False — как у save_message_id).
+    """
+    store = get_store()
+    items = _message_ids.setdefault(task_id, {})
+    if old_key != key and items.pop(old_key, None) is not None:
+        store.delete_message_ids([(task_id, old_key)])
+    items[key] = message_id
+    store.set_message_id(task_id, key, message_id)
+    if commit:
+        store.commit()
+    log.debug(f"[memory] 💾 Moved message_id for {task_id}: {old_key} → {key}")
 
 
 def get_message_id(task_id: str, key: str) -> Union[int, None]:
@@ -70,33 +117,99 @@ def get_message_id(task_id: str, key: str) -> Union[int, None]:
 
 
 def delete_message_id(task_id: str, key: str):
-    if task_id in _message_ids and key in _message_ids[task_id]:
-        del _message_ids[task_id][key]
-        with open(MESSAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                "ids": _message_ids,
-                "meta": _message_meta
-            }, f, indent=2, ensure_ascii=False)
-        log.info(f"[memory] 🗑 Deleted message_id for {task_id}::{key}")
+    delete_message_ids([(task_id, key)])
+
+
+def delete_message_ids(items: Iterable[Tuple[str, str]]):
+    """
+    Удаляет пачку (task_id, key) одним commit.
+    """
+    removed = [(task_id, key) for task_id, key in items
+               if _message_ids.get(task_id, {}).pop(key, None) is not None]
+    if not removed:
+        return
+    store = get_store()
+    store.delete_message_ids(removed)
+    store.commit()
+    log.info(f"[memory] 🗑 Deleted {len(removed)} message_id(s)")
 
 
 def load_message_ids():
-    global _message_ids, _message_meta
-    if MESSAGE_FILE.exists():
-        try:
-            with open(MESSAGE_FILE, 'r', encoding='utf-8') as f:
-                raw = json.load(f)
-            _message_ids = raw.get("ids", {})
-            _message_meta = {k: tuple(v) for k, v in raw.get("meta", {}).items()}
-            log.info(f"[memory] ✅ Loaded message IDs from {MESSAGE_FILE}")
-        except Exception as e:
-            log.error(f"[memory] ❌ Error loading message IDs: {e}")
-            _message_ids = {}
-            _message_meta = {}
-    else:
+    global _message_ids, _message_meta, _expiry, _outbox
+    try:
+        store = get_store()
+        _message_ids, _message_meta = store.load_messages()
+        _expiry = store.load_expiry()
+        _outbox = store.load_outbox()
+        log.info(f"[memory] ✅ Loaded message IDs ({len(_message_ids)} tasks)")
+    except Exception as e:
+        log.error(f"[memory] ❌ Error loading message IDs: {e}")
         _message_ids = {}
         _message_meta = {}
-        log.info(f"[memory] ℹ No message file, starting fresh")
+        _expiry = {}
+        _outbox = {}
+
+
+def get_outbox() -> Dict[str, Dict[str, dict]]:
+    """Уведомления, которые ещё доставляются (переживают перезапуск)."""
+    return _outbox
+
+
+def outbox_put(entries: Iterable[Tuple[str, str, dict]], commit: bool = True):
+    """
+    Кладёт или обновляет записи outbox (task_id, key, item) одним commit.
+    commit=False — зафиксируется вместе со следующим commit.
+    """
+    store = get_store()
+    for task_id, key, item in entries:
+        _outbox.setdefault(task_id, {})[key] = item
+        store.put_outbox(task_id, key, item)
+    if commit:
+        store.commit()
+
+
+def outbox_remove(task_id: str, key: str, commit: bool = True):
+    """
+    Убирает запись из outbox. commit=False — зафиксируется вместе
+    со следующим save_sent_flags.
+    """
+    items = _outbox.get(task_id)
+    if items is None or items.pop(key, None) is None:
+        return
+    if not items:
+        del _outbox[task_id]
+    store = get_store()
+    store.delete_outbox(task_id, key)
+    if commit:
+        store.commit()
+
+
+def compact_expired(now_ts: float, default_ttl_sec: float) -> Tuple[int, int]:
+    """
+    Удаляет состояние задач, чей срок хранения истёк.
+    Записям без срока (из прежних версий) назначается now + default_ttl_sec.
+    Возвращает (число удалённых задач, примерный объём в байтах).
+    """
+    store = get_store()
+
+    for task_id in (_memory.keys() | _message_ids.keys() | _message_meta.keys() | _outbox.keys()) - _expiry.keys():
+        _expiry[task_id] = now_ts + default_ttl_sec
+        store.set_expiry(task_id, _expiry[task_id])
+
+    expired = [task_id for task_id, expires_at in _expiry.items() if expires_at <= now_ts]
+    reclaimed = 0
+    for task_id in expired:
+        entry = [task_id, sorted(_memory.pop(task_id, ())), _message_ids.pop(task_id, {}),
+                 _message_meta.pop(task_id, None), _expiry.pop(task_id, None), _outbox.pop(task_id, None)]
+        reclaimed += len(json.dumps(entry, ensure_ascii=False).encode())
+
+    if expired:
+        store.delete_tasks(expired)
+    store.commit()
+
+    log.info(f"[memory] 🧹 Retention: evicted {len(expired)} tasks (~{reclaimed} bytes), "
+             f"{len(_expiry)} tracked")
+    return len(expired), reclaimed
 
 
 def get_all_message_ids(task_id: str) -> dict:
@@ -45,3 +45,29 @@ def format_notification_message(task: Task, notif_type: str, minutes_delta: int)
     title_line = f"{emoji} {safe_text}" if info["has_priority"] else safe_text
     return f"`{prefix}`\n\n🕒 {safe_time}\n\n🔔 {title_line}\n\n`{safe_date}`"
 
+
+
+STAGE_TITLES = {"before": "Скоро начнутся", "during": "Начались", "overdue": "Просрочены"}
+
+
+def format_digest_message(entries, stage: str) -> str:
+    """
+    Сводка: entries — [(task, notif_type, minutes_delta)], номера строк
+    совпадают с подписями кнопок «Done» под сообщением.
+    """
+    title = STAGE_TITLES.get(stage, "Уведомления")
+    lines = [f"📋 *{escape_markdown_v2(title)}: {len(entries)}*"]
+    for n, (task, notif_type, minutes_delta) in enumerate(entries, start=1):
+        info = analyze_task_text(task)
+        text = info["cleaned_text"]
+        if len(text) > 80:
+            text = text[:79] + "…"
+        if notif_type == "before":
+            when = f"in {minutes_delta}m"
+        elif notif_type == "overdue":
+            when = f"over {minutes_delta}m"
+        else:
+            when = "now"
+        emoji = f"{info['priority_emoji']} " if info["has_priority"] else ""
+        lines.append(f"{n}\\. `{when}` 🕒 {escape_markdown_v2(info['time_range'])} {emoji}{escape_markdown_v2(text)}")
+    return lines[0] + "\n\n" + "\n".join(lines[1:])
@@ -0,0 +1,218 @@
+# metrics.py
+"""
+Метрики в текстовом формате Prometheus и необязательная точка /metrics.
+
+Счётчики и гистограммы живут в памяти процесса; модули обновляют их
+напрямую (metrics.SCAN_DURATION.observe(...)). HTTP-точка включается
+ключом METRICS_PORT в config.json.
+"""
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from http_server import HttpRequest, HttpResponse, HttpServer
+
+log = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        # Разбор файлов идёт в пуле потоков — обновления под блокировкой
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Metric):
+    """Значение задаётся set() или вычисляется функцией при каждом чтении."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, func: Callable[[], float] = None):
+        super().__init__(name, help_text)
+        self.func = func
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.func is not None:
+            try:
+                return [f"{self.name} {_format_value(self.func())}"]
+            except Exception as e:
+                log.debug(f"[metrics] Gauge {self.name} failed: {e}")
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # labels → (счётчики по корзинам, сумма, количество)
+        self._series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(float(bound))),))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+
+def _register(metric: Metric) -> Metric:
+    REGISTRY.append(metric)
+    return metric
+
+
+def gauge_func(name: str, help_text: str, func: Callable[[], float]) -> Gauge:
+    """Регистрирует вычисляемый gauge (например, глубину очереди)."""
+    for i, metric in enumerate(REGISTRY):
+        if metric.name == name:
+            REGISTRY[i] = Gauge(name, help_text, func)
+            return REGISTRY[i]
+    return _register(Gauge(name, help_text, func))
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# === Метрики бота ===
+
+SCAN_DURATION = _register(Histogram(
+    "notifier_scan_duration_seconds", "Time to refresh the task cache from the vault",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+SCAN_FILES = _register(Counter(
+    "notifier_scan_files_total", "Files looked at during scans, by outcome "
+    "(parsed, unchanged, touched, removed, pruned, error)"))
+TASKS_PARSED = _register(Counter(
+    "notifier_tasks_parsed_total", "Tasks produced by re-parsed files"))
+TASKS_LOADED = _register(Gauge(
+    "notifier_tasks_loaded", "Tasks currently in the notification window"))
+NOTIFICATIONS = _register(Counter(
+    "notifier_notifications_total", "Notifications by outcome (due, sent, failed, dropped, missed)"))
+SEND_LATENCY = _register(Histogram(
+    "notifier_send_latency_seconds", "Duration of one send_notification call"))
+DELETE_LATENCY = _register(Histogram(
+    "notifier_delete_latency_seconds", "Duration of one deleteMessages call"))
+DELETED_MESSAGES = _register(Counter(
+    "notifier_deleted_messages_total", "Outdated notifications deleted"))
+CALLBACK_DURATION = _register(Histogram(
+    "notifier_callback_duration_seconds", "Time to handle a Done button press"))
+CALLBACKS = _register(Counter(
+    "notifier_callbacks_total", "Done button presses by result (done, fallback, not_found, error)"))
+WEBHOOK_UPDATES = _register(Counter(
+    "notifier_webhook_updates_total", "Updates posted to the webhook by result (accepted, forbidden, invalid, overloaded)"))
+WEBHOOK_LATENCY = _register(Histogram(
+    "notifier_webhook_latency_seconds", "Time from accepting a webhook update to the end of its processing"))
+STAGE_DURATION = _register(Histogram(
+    "notifier_stage_duration_seconds", "Time spent in one stage of a tick or a send (see profiling.py)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+
+
+async def handle_request(request: HttpRequest) -> HttpResponse:
+    if request.path != "/metrics":
+        return HttpResponse.text("not found", 404)
+    if request.method != "GET":
+        return HttpResponse.text("method not allowed", 405)
+    return HttpResponse.text(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def start_metrics_server(cfg: dict) -> Optional[HttpServer]:
+    """
+    Поднимает /metrics, если в конфиге задан METRICS_PORT (слушает METRICS_HOST,
+    по умолчанию только локально).
+    """
+    port = cfg.get("METRICS_PORT")
+    if not port:
+        return None
+    server = HttpServer(handle_request, cfg.get("METRICS_HOST", "127.0.0.1"), int(port))
+    await server.start()
+    log.info(f"[metrics] 📊 Prometheus metrics at {server.url}/metrics")
+    return server
@@ -2,28 +2,42 @@
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from hashlib import md5
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Task:
     """
     Представление задачи из Obsidian-файла.
+    Неизменяемая запись: разбор текста и stable_id считаются один раз при создании.
     """
     file_path: str              # Путь к файлу, где найдена задача
     line_num: int               # Номер строки задачи
     text: str                   # Текст задачи
     start_dt: datetime          # Время начала задачи
     end_dt: datetime            # Время конца задачи
-    sent_notifications: set[str] = field(default_factory=set)  # Что уже отправлено
+
+    # Разбор текста: парсер передаёт готовый, иначе считается в __post_init__
+    cleaned_text: str = field(default=None, kw_only=True, repr=False, compare=False)
+    has_priority: bool = field(default=None, kw_only=True, repr=False, compare=False)
+    priority_emoji: str = field(default=None, kw_only=True, repr=False, compare=False)
+    # Переопределения смещений из полей [remind:: ...], [during:: ...], [overdue:: ...]
+    overrides: tuple = field(default=None, kw_only=True, repr=False, compare=False)
+    stable_id: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.cleaned_text is None:
+            from task_analyzer import analyze_raw_text
+            cleaned, has_priority, priority_emoji = analyze_raw_text(self.text)
+            object.__setattr__(self, "cleaned_text", cleaned)
+            object.__setattr__(self, "has_priority", has_priority)
+            object.__setattr__(self, "priority_emoji", priority_emoji)
+        if self.overrides is None:
+            from parser import parse_overrides
+            object.__setattr__(self, "overrides", parse_overrides(self.text))
+
+        key_str = f"{self.start_dt.isoformat()}|{self.end_dt.isoformat()}|{self.cleaned_text}"
+        object.__setattr__(self, "stable_id", md5(key_str.encode()).hexdigest())
 
     def get_time_range(self) -> str:
         """Вернуть диапазон времени задачи в формате HH:MM–HH:MM"""
         return f"{self.start_dt.strftime('%H:%M')}–{self.end_dt.strftime('%H:%M')}"
-
-    @property
-    def stable_id(self) -> str:
-        from hashlib import md5
-        from task_analyzer import analyze_task_text
-        cleaned = analyze_task_text(self)["cleaned_text"]
-        key_str = f"{self.start_dt.isoformat()}|{self.end_dt.isoformat()}|{cleaned}"
-        return md5(key_str.encode()).hexdigest()
-
@@ -5,13 +5,156 @@ Each notification is defined by:
 - a unique key (for deduplication)
 - a human-friendly prefix
 - how many minutes before/after the event it is triggered
+
+Offsets are compiled once into a RuleTable (timedeltas, keys and prefixes
+are precomputed), so planning a task is a single pass without regex work.
+A task can override any of the three lists with inline fields such as
+[remind:: 30m,5m], [during:: 0m,30m] or [overdue:: none]. Override offsets
+are limited by override_max_offset (or the global offsets, if larger):
+the note window and retention only reach that far, so a longer override
+would never be delivered and is rejected with a warning instead.
 """
 
-from datetime import datetime
-from typing import List, Tuple
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Sequence, Set, Tuple
 
 from models import Task
-from utils import parse_relative_time
+from utils import OFFSET_RE, max_offset, parse_relative_time
+
+log = logging.getLogger(__name__)
+
+Notification = Tuple[datetime, str, str, int]
+
+KINDS = ("before", "during", "overdue")
+# Значение поля, отключающее уведомления этого вида
+DISABLED_VALUES = {"none", "off", "no", "-"}
+
+
+@dataclass(frozen=True)
+class Rule:
+    key: str                # before1, during2, overdue1...
+    from_start: bool        # отсчёт от start_dt (before/during) или от end_dt (overdue)
+    delta: timedelta        # со знаком: send_time = якорь + delta
+    prefix: str
+    minutes: int
+
+
+@dataclass(frozen=True)
+class RuleTable:
+    before: Tuple[str, ...]
+    during: Tuple[str, ...]
+    overdue: Tuple[str, ...]
+    rules: Tuple[Rule, ...]
+    override_cap: timedelta = timedelta()   # override_max_offset из конфига
+
+    def plan(self, task: Task) -> List[Notification]:
+        """
+        (send_time, key, prefix, minutes_delta) for every rule; inline
+        overrides of the task select their own (also cached) table.
+        """
+        table = self.for_task(task) if task.overrides else self
+        start, end = task.start_dt, task.end_dt
+        return [((start if r.from_start else end) + r.delta, r.key, r.prefix, r.minutes) for r in table.rules]
+
+    def for_task(self, task: Task) -> "RuleTable":
+        """
+        Table for the task's inline overrides, cached per (table, overrides).
+        Rejected overrides are logged once per task, not on every re-plan.
+        """
+        table, rejected = _with_overrides(self, task.overrides)
+        for kind, value, reason in rejected:
+            if (task.stable_id, kind, value) in _warned_overrides:
+                continue
+            _warned_overrides.add((task.stable_id, kind, value))
+            log.warning(f"[rules] ⚠️ Ignoring {reason.format(f'[{kind}:: {value}]')} "
+                        f"in {task.file_path}:{task.line_num}")
+        return table
+
+    def override_limit(self, kind: str) -> timedelta:
+        """
+        Largest offset an override of this kind may use: as far as the note
+        window reaches on that side (see task_analyzer.active_date_window).
+        """
+        if kind == "before":
+            return max(self.override_cap, max_offset(self.before))
+        return max(self.override_cap, max_offset(self.during), max_offset(self.overdue))
+
+
+def parse_override(value: str) -> Optional[Tuple[str, ...]]:
+    """
+    "30m, 5m" → ("30m", "5m"); "none" → (); None, if an offset is malformed.
+    """
+    value = value.strip()
+    if value.lower() in DISABLED_VALUES:
+        return ()
+    offsets = tuple(o.strip() for o in value.split(",") if o.strip())
+    if not offsets or not all(OFFSET_RE.fullmatch(o) for o in offsets):
+        return None
+    return offsets
+
+
+# (stable_id, kind, value) of overrides already reported by RuleTable.for_task
+_warned_overrides: Set[Tuple[str, str, str]] = set()
+
+
+@lru_cache(maxsize=1024)
+def _with_overrides(table: RuleTable, overrides: Tuple[Tuple[str, str], ...]
+                    ) -> Tuple[RuleTable, Tuple[Tuple[str, str, str], ...]]:
+    """
+    (table with the overrides applied, rejected (kind, value, reason) triples).
+    """
+    offsets = {"before": table.before, "during": table.during, "overdue": table.overdue}
+    rejected = []
+    for kind, value in overrides:
+        parsed = parse_override(value)
+        if parsed is None:
+            rejected.append((kind, value, "invalid {}"))
+            continue
+        limit = table.override_limit(kind)
+        if max_offset(o.lstrip("+-") for o in parsed) > limit:
+            rejected.append((kind, value, f"{{}}: offsets beyond {int(limit.total_seconds() // 60)}m "
+                                          f"are not delivered (raise override_max_offset)"))
+            continue
+        offsets[kind] = parsed
+    return compile_rules(offsets["before"], offsets["during"], offsets["overdue"], table.override_cap), tuple(rejected)
+
+
+@lru_cache(maxsize=256)
+def _compile(before: Tuple[str, ...], during: Tuple[str, ...], overdue: Tuple[str, ...],
+             override_cap: timedelta) -> RuleTable:
+    rules: List[Rule] = []
+
+    # --- BEFORE start ---
+    for idx, offset in enumerate(before, start=1):
+        delta = parse_relative_time(offset)
+        minutes = abs(int(delta.total_seconds() // 60))
+        rules.append(Rule(f"before{idx}", True, -delta, f"in ⬇️{minutes}m\n\n", minutes))
+
+    # --- DURING task ---
+    for idx, offset in enumerate(during, start=1):
+        delta = parse_relative_time(offset)
+        minutes = abs(int(delta.total_seconds() // 60))
+        rules.append(Rule(f"during{idx}", True, delta, "" if idx == 1 else f"▶️ +{minutes}m\n\n", minutes))
+
+    # --- OVERDUE after end ---
+    for idx, offset in enumerate(overdue, start=1):
+        delta = parse_relative_time(offset)
+        minutes = abs(int(delta.total_seconds() // 60))
+        rules.append(Rule(f"overdue{idx}", False, delta, f"over⚠️{minutes}m\n\n", minutes))
+
+    return RuleTable(before, during, overdue, tuple(rules), override_cap)
+
+
+def compile_rules(warn_before: Sequence[str], warn_during: Sequence[str], warn_overdue: Sequence[str],
+                  override_cap: timedelta = timedelta()) -> RuleTable:
+    """
+    Compiled table for the given offset lists; equal lists share one table.
+    override_cap: how far per-task overrides may reach beyond the lists.
+    """
+    return _compile(tuple(warn_before), tuple(warn_during), tuple(warn_overdue), override_cap)
 
 
 def generate_notifications(
@@ -19,7 +162,7 @@ def generate_notifications(
     warn_before: List[str],
     warn_during: List[str],
     warn_overdue: List[str],
-) -> List[Tuple[datetime, str, str, int]]:
+) -> List[Notification]:
     """
     For a given task and warning offsets, return a list of:
     (send_time, unique_key, prefix, minutes_delta) for each notification.
@@ -28,6 +171,9 @@ def generate_notifications(
     - DURING: offsets from start_dt (e.g. 0m = at start)
     - OVERDUE: offsets after end_dt (e.g. 15m after)
 
+    Inline fields of the task ([remind:: ...], [during:: ...], [overdue:: ...])
+    replace the corresponding list.
+
     Args:
         task: Task object with .start_dt and .end_dt
         warn_before: list of strings like ["15m", "5m"]
@@ -41,33 +187,4 @@ def generate_notifications(
             - message prefix for formatting
             - delta in minutes from event anchor
     """
-    notifications: List[Tuple[datetime, str, str, int]] = []
-
-    # --- BEFORE start ---
-    for idx, offset in enumerate(warn_before, start=1):
-        delta = parse_relative_time(offset)
-        send_time = task.start_dt - delta
-        minutes = abs(int(delta.total_seconds() // 60))
-        key = f"before{idx}"
-        prefix = f"in ⬇️{minutes}m\n\n"
-        notifications.append((send_time, key, prefix, minutes))
-
-    # --- DURING task ---
-    for idx, offset in enumerate(warn_during, start=1):
-        delta = parse_relative_time(offset)
-        send_time = task.start_dt + delta
-        minutes = abs(int(delta.total_seconds() // 60))
-        key = f"during{idx}"
-        prefix = "" if idx == 1 else f"▶️ +{minutes}m\n\n"
-        notifications.append((send_time, key, prefix, minutes))
-
-    # --- OVERDUE after end ---
-    for idx, offset in enumerate(warn_overdue, start=1):
-        delta = parse_relative_time(offset)
-        send_time = task.end_dt + delta
-        minutes = abs(int(delta.total_seconds() // 60))
-        key = f"overdue{idx}"
-        prefix = f"over⚠️{minutes}m\n\n"
-        notifications.append((send_time, key, prefix, minutes))
-
-    return notifications
+    return compile_rules(warn_before, warn_during, warn_overdue).plan(task)
@@ -1,18 +1,42 @@
 # notifier.py
 import asyncio
 import logging
+import time
 from datetime import datetime
-from typing import Callable, List
+from pathlib import Path
+from typing import Callable, Dict, List
 
+import metrics
 from models import Task
-from task_analyzer import load_tasks_from_folder
-from notification_logic import generate_notifications
-from memory import load_sent_flags, mark_as_sent, save_sent_flags
+from task_analyzer import active_date_window, load_tasks_from_folder_async, scan_cache, scan_generation
+from notification_logic import compile_rules
+from memory import (
+    load_sent_flags, mark_as_sent, save_sent_flags, compact_expired,
+    get_outbox, outbox_put, outbox_remove,
+)
+from retention import RetentionPolicy
+from utils import override_cap
+from watcher import create_watcher
+from scan_cache import create_scan_executor
+from due_queue import DueQueue
+from outbound import OutboundJob, OutboundQueue
+from outbox import RetryPolicy
+from digest import coalesce
+from snapshot import dump_snapshot, load_snapshot, write_snapshot
+from profiling import SEND, TICK, report_tick
 
 log = logging.getLogger(__name__)
 
 # 📌 Глобальный task_list
 task_list: List[Task] = []
+# stable_id → Task для кнопки «Done». Обновляется на месте, поэтому ссылку
+# на словарь можно один раз передать в обработчик при старте.
+task_index: Dict[str, Task] = {}
+
+
+def update_task_index(tasks: List[Task]):
+    task_index.clear()
+    task_index.update((task.stable_id, task) for task in tasks)
 
 def should_send(now: datetime, when: datetime, key: str, tol_before: int, tol_during: int) -> bool:
     delta = (now - when).total_seconds()
@@ -24,57 +48,446 @@ def should_send(now: datetime, when: datetime, key: str, tol_before: int, tol_du
         return 0 <= delta <= tol_before
     return False
 
+class Notifier:
+    """
+    Состояние цикла уведомлений: кэш задач, очередь по сроку, исходящая
+    очередь и текущие настройки. Один тик — check_tasks_once;
+    notification_loop решает, когда его вызывать.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        warn_before: List[str],
+        warn_during: List[str],
+        warn_overdue: List[str],
+        send_func: Callable,
+        interval: int = None,
+        sent_flags: dict = None,
+        config: dict = None,
+    ):
+        """config — уже загруженный config.json (по умолчанию читается здесь)."""
+        from utils import load_config
+        cfg = load_config() if config is None else config
+        self.folder_path = folder_path
+        self.warn_before = warn_before
+        self.warn_during = warn_during
+        self.warn_overdue = warn_overdue
+        # Смещения компилируются один раз; задачи с [remind:: ...] и т.п. берут свою таблицу
+        self.rules = compile_rules(warn_before, warn_during, warn_overdue, override_cap(cfg))
+        self.send_func = send_func
+        self.interval = cfg.get("CHECK_INTERVAL", 60) if interval is None else interval
+        self.sent_flags = load_sent_flags() if sent_flags is None else sent_flags
+
+        self.chat_args = self._chat_args_from(cfg)
+        self.tol_before = cfg.get("tolerance_before_sec", 300)
+        self.tol_during = cfg.get("tolerance_during_sec", 1200)
+
+        # Чтение и разбор заметок — в пуле, чтобы кнопки и heartbeat не ждали скана
+        self.scan_executor = create_scan_executor(cfg.get("SCAN_EXECUTOR", "off"), cfg.get("SCAN_WORKERS"))
+
+        # Срок хранения состояния: после него флаги задачи удаляются,
+        # поэтому такие задачи и не планируются (иначе overdue ушли бы повторно)
+        self.retention = RetentionPolicy.from_config(cfg, warn_overdue)
+        self.compact_every = cfg.get("retention_compact_sec", 3600)
+
+        # Повторы доставки из outbox: retry_after / экспонента с джиттером
+        self.retry = RetryPolicy.from_config(cfg)
+        self._retry_handles: Dict[tuple, asyncio.TimerHandle] = {}
+        self._outbox_resumed = False
+
+        # Очередь по времени отправки: между уведомлениями задачи не перебираются
+        self.queue = DueQueue(self.plan)
+
+        # Заметки за даты вне окна уведомлений не читаются вовсе
+        self.active_window = None
+        self.indexed_generation = None
+        self._scan_failed = False
+        self.loaded_cfg = cfg
+
+        # Исходящая очередь: параллельные отправки под лимитами Telegram
+        self.in_flight = set()
+        self.outbound = OutboundQueue(
+            send_func,
+            self.on_send_result,
+            workers=cfg.get("send_workers", 4),
+            global_rate=cfg.get("rate_global_per_sec", 30),
+            chat_rate_per_min=cfg.get("rate_chat_per_min", 20),
+            chat_burst=cfg.get("rate_chat_burst", 5),
+            send_digest=getattr(send_func, "digest", None),
+        )
+        # Сводки: больше digest_threshold уведомлений одной стадии за раз → одно сообщение
+        self.digest_threshold = cfg.get("DIGEST_THRESHOLD", 5) if self.outbound.send_digest else 0
+        self.digest_max_items = cfg.get("DIGEST_MAX_ITEMS", 20)
+
+        # Тёплый старт: кэш разбора и очередь из снимка (пустой SNAPSHOT_FILE — выкл.)
+        self.snapshot_path = cfg.get("SNAPSHOT_FILE", "snapshot.bin")
+        self.snapshot_every = cfg.get("SNAPSHOT_EVERY_SEC", 300)
+        metrics.gauge_func("notifier_outbox_depth", "Notifications waiting in the durable outbox",
+                           lambda: sum(len(items) for items in get_outbox().values()))
+        metrics.gauge_func("notifier_outbound_queue_depth", "Send jobs queued in the outbound queue",
+                           lambda: len(self.outbound))
+        metrics.gauge_func("notifier_due_queue_entries", "Planned notifications in the due queue",
+                           lambda: len(self.queue))
+
+    @staticmethod
+    def _chat_args_from(cfg: dict) -> dict:
+        args = {"chat_id": cfg["CHAT_ID"]}
+        if cfg.get("TOPIC_ID"):
+            args["message_thread_id"] = cfg["TOPIC_ID"]
+        return args
+
+    async def start(self):
+        await self.outbound.start()
+
+    async def close(self):
+        # Неотправленное остаётся в outbox и продолжится после перезапуска
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        await self.outbound.close()
+        deleter = getattr(self.send_func, "deleter", None)
+        if deleter is not None:
+            await deleter.flush()
+        if self.scan_executor is not None:
+            self.scan_executor.shutdown(wait=False, cancel_futures=True)
+        await self.save_snapshot()
+
+    def _plan_key(self) -> tuple:
+        """От чего зависит план очереди: смещения и срок хранения."""
+        return self.rules.before, self.rules.during, self.rules.overdue, self.rules.override_cap, self.retention
+
+    async def restore_snapshot(self):
+        """Вызывается до первого тика."""
+        if not self.snapshot_path:
+            return
+        state = await asyncio.to_thread(load_snapshot, Path(self.snapshot_path), self.folder_path)
+        if state is None:
+            return
+        # Отметки файлов сверит первый скан: перепарсятся только изменившиеся
+        scan_cache().restore(state["entries"])
+        if state["plan_key"] != self._plan_key():
+            log.info("[snapshot] 🔁 Offsets or retention changed since the snapshot, queue will be re-planned")
+            return
+        now = datetime.now()
+        self.queue.restore(state["queue"], keep=lambda task: not self.retention.is_expired(task.end_dt, now))
+        log.info(f"[snapshot] 🗓 Restored {len(self.queue)} planned notifications")
+
+    async def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            raw = dump_snapshot(self.folder_path, self._plan_key(), scan_cache().entries, self.queue.snapshot())
+            await asyncio.to_thread(write_snapshot, Path(self.snapshot_path), raw)
+        except Exception as e:
+            log.error(f"[snapshot] ❌ Could not save snapshot: {e}")
+
+    def plan(self, task: Task):
+        if self.retention.is_expired(task.end_dt, datetime.now()):
+            return []
+        return self.rules.plan(task)
+
+    def reload_config(self):
+        """
+        Применяет изменённый config.json. Если поменялись смещения или
+        срок хранения, очередь перестраивается по новому плану
+        (уже отправленные ключи не повторяются).
+        """
+        from utils import load_config
+        try:
+            cfg = load_config()
+        except Exception as e:
+            log.error(f"[notifier] ❌ Could not reload config: {e}")
+            return
+        if cfg is self.loaded_cfg:
+            return
+        self.loaded_cfg = cfg
+
+        offsets = (cfg["default_warn_before_start"], cfg["default_warn_during"], cfg["default_warn_overdue"])
+        retention = RetentionPolicy.from_config(cfg, offsets[2])
+        cap = override_cap(cfg)
+        replan = (offsets != (self.warn_before, self.warn_during, self.warn_overdue)
+                  or cap != self.rules.override_cap or retention != self.retention)
+        self.warn_before, self.warn_during, self.warn_overdue = offsets
+        self.rules = compile_rules(*offsets, cap)
+        self.retention = retention
+
+        self.interval = cfg.get("CHECK_INTERVAL", self.interval)
+        self.tol_before = cfg.get("tolerance_before_sec", 300)
+        self.tol_during = cfg.get("tolerance_during_sec", 1200)
+        self.compact_every = cfg.get("retention_compact_sec", 3600)
+        self.retry = RetryPolicy.from_config(cfg)
+        self.chat_args = self._chat_args_from(cfg)
+        if self.outbound.send_digest:
+            self.digest_threshold = cfg.get("DIGEST_THRESHOLD", 5)
+        self.digest_max_items = cfg.get("DIGEST_MAX_ITEMS", 20)
+        self.snapshot_every = cfg.get("SNAPSHOT_EVERY_SEC", 300)
+
+        if replan:
+            self.queue.rebuild(self.sent_flags)
+        log.info(f"[notifier] 🔁 Config applied: every {self.interval}s, before={self.warn_before}, "
+                 f"during={self.warn_during}, overdue={self.warn_overdue}" + ("; queue re-planned" if replan else ""))
+
+    async def check_tasks_once(self, changed_paths=None, rescan=True):
+        started = time.perf_counter()
+        try:
+            await self._check_tasks_once(changed_paths, rescan)
+        finally:
+            report_tick(time.perf_counter() - started, self.loaded_cfg.get("PROFILE_SLOW_TICK_MS", 500))
+
+    async def _check_tasks_once(self, changed_paths, rescan):
+        global task_list
+        with TICK.span("config"):
+            self.reload_config()
+        now = datetime.now()
+        window = active_date_window(now, self.warn_before, self.warn_during, self.warn_overdue,
+                                    self.rules.override_cap)
+        if window != self.active_window and not rescan:
+            # Наступил новый день — окно сдвинулось, кэш подтянет файлы по индексу дат
+            rescan = True
+            changed_paths = set()
+        if self._scan_failed:
+            # Прошлый скан не удался — обходим папку целиком, пока не получится
+            rescan = True
+            changed_paths = None
+        if rescan and await self._scan(changed_paths, window):
+            self.active_window = window
+            generation = scan_generation()
+            with TICK.span("queue_sync"):
+                self.queue.sync(task_list, self.sent_flags, generation=generation)
+            if generation != self.indexed_generation:
+                with TICK.span("index"):
+                    update_task_index(task_list)
+                self.indexed_generation = generation
+            log.info(f"[notifier] 📋 Loaded {len(task_list)} tasks from {self.folder_path}")
+            if not self._outbox_resumed:
+                self.resume_outbox()
+
+        jobs = []
+        with TICK.span("pop_due"):
+            for when, task, key, minutes_delta in self.queue.pop_due(now):
+                task_id = task.stable_id
+                if key in self.sent_flags.get(task_id, ()) or (task_id, key) in self.in_flight:
+                    continue
+                if not should_send(now, when, key, self.tol_before, self.tol_during):
+                    log.debug(f"[notifier] ⌛ Missed tolerance window for {key} of {task_id}, dropping")
+                    metrics.NOTIFICATIONS.inc(result="missed")
+                    continue
+                self.in_flight.add((task_id, key))
+                jobs.append(OutboundJob(task, key, minutes_delta, self.chat_args))
+
+        if jobs:
+            metrics.NOTIFICATIONS.inc(len(jobs), result="due")
+            # Сначала в outbox (допуск should_send больше не важен), потом в отправку;
+            # результат придёт в on_send_result. На диск записи попадают с его
+            # commit: удачная отправка пишет состояние один раз, неудачная —
+            # сохраняет запись для повтора
+            now_ts = time.time()
+            with TICK.span("outbox_put"):
+                outbox_put(((job.task.stable_id, job.key, {"minutes_delta": job.minutes_delta, "created_at": now_ts,
+                                                           "attempts": 0, "next_at": now_ts}) for job in jobs),
+                           commit=False)
+            self.dispatch(jobs)
+
+    async def _scan(self, changed_paths, window) -> bool:
+        """
+        Перечитывает папку в task_list. Если папки нет (удалили, переместили,
+        отмонтировали), прежний список задач остаётся, а следующий тик
+        повторит полный обход. Возвращает True, если скан удался.
+        """
+        global task_list
+        try:
+            with TICK.span("scan"):
+                task_list = await load_tasks_from_folder_async(self.folder_path, changed_paths, window,
+                                                               self.scan_executor)
+        except (ValueError, OSError) as e:
+            if not self._scan_failed:
+                log.warning(f"[notifier] ⚠️ Cannot scan {self.folder_path} ({e}); "
+                            f"keeping {len(task_list)} tasks, will retry on the next tick")
+            self._scan_failed = True
+            return False
+        if self._scan_failed:
+            log.info(f"[notifier] ✅ {self.folder_path} is readable again")
+            self._scan_failed = False
+        return True
+
+    def dispatch(self, jobs: List[OutboundJob]):
+        """Отдаёт job'ы в исходящую очередь, сворачивая большие группы в сводки."""
+        for job in coalesce(jobs, self.digest_threshold, self.digest_max_items):
+            self.outbound.submit(job)
+
+    def resume_outbox(self):
+        """
+        Продолжает доставку, прерванную перезапуском. Вызывается после
+        первой загрузки задач: записи ссылаются на них по stable_id.
+        """
+        self._outbox_resumed = True
+        now_ts = time.time()
+        resumed = 0
+        due_now = []
+        for task_id, items in list(get_outbox().items()):
+            for key, item in list(items.items()):
+                if key in self.sent_flags.get(task_id, ()) or self.retry.is_stale(item["created_at"], now_ts):
+                    outbox_remove(task_id, key)
+                    continue
+                self.in_flight.add((task_id, key))
+                if item["next_at"] <= now_ts:
+                    due_now.append((task_id, key))
+                else:
+                    self._schedule_retry([(task_id, key)], item["next_at"] - now_ts)
+                resumed += 1
+        if due_now:
+            # Всё просроченное — одним вызовом, чтобы накопленное свернулось в сводки
+            self._schedule_retry(due_now, 0.0)
+        if resumed:
+            log.info(f"[notifier] 📤 Resumed {resumed} undelivered notification(s) from outbox")
+
+    def _schedule_retry(self, keys: List[tuple], delay: float):
+        """Один таймер на группу: повторы сводки снова уходят вместе."""
+        handle = asyncio.get_running_loop().call_later(delay, self._retry_now, keys)
+        for task_key in keys:
+            self._retry_handles[task_key] = handle
+
+    def _retry_now(self, keys: List[tuple]):
+        jobs = []
+        for task_id, key in keys:
+            self._retry_handles.pop((task_id, key), None)
+            item = get_outbox().get(task_id, {}).get(key)
+            task = task_index.get(task_id)
+            if item is None or task is None:
+                # Задачу удалили или изменили (другой stable_id) — доставлять нечего
+                self.in_flight.discard((task_id, key))
+                outbox_remove(task_id, key)
+                metrics.NOTIFICATIONS.inc(result="dropped")
+                log.info(f"[notifier] 🗑 Dropped outbox entry {key} for {task_id}: task is gone")
+                continue
+            jobs.append(OutboundJob(task, key, item["minutes_delta"], self.chat_args))
+        self.dispatch(jobs)
+
+    def on_send_result(self, job: OutboundJob, error):
+        items = job.items if job.items is not None else [job]
+        if error is None:
+            with SEND.span("state_save"):
+                for item in items:
+                    task_id = item.task.stable_id
+                    self.in_flight.discard((task_id, item.key))
+                    self.sent_flags.setdefault(task_id, set()).add(item.key)
+                    mark_as_sent(task_id, item.key, expires_at=self.retention.deadline(item.task.end_dt).timestamp())
+                    outbox_remove(task_id, item.key, commit=False)
+                save_sent_flags(self.sent_flags)
+            metrics.NOTIFICATIONS.inc(len(items), result="sent")
+            if job.items is not None:
+                log.info(f"[notifier] 📨 Sent {job.key} with {len(items)} notification(s)")
+            else:
+                log.info(f"[notifier] 📨 Sent {job.key} for {job.task.stable_id}")
+            return
+
+        metrics.NOTIFICATIONS.inc(len(items), result="failed")
+        now_ts = time.time()
+        entries = []
+        for item in items:
+            task_id = item.task.stable_id
+            entry = get_outbox().get(task_id, {}).get(item.key) or {
+                "minutes_delta": item.minutes_delta, "created_at": now_ts, "attempts": 0, "next_at": now_ts}
+            entries.append((task_id, item.key, entry))
+        attempts = max(entry["attempts"] for _, _, entry in entries) + 1
+        delay = self.retry.delay(attempts, error)
+
+        retry = []
+        for task_id, key, entry in entries:
+            if self.retry.is_stale(entry["created_at"], now_ts + delay):
+                self.in_flight.discard((task_id, key))
+                outbox_remove(task_id, key)
+                metrics.NOTIFICATIONS.inc(result="dropped")
+                log.error(f"[notifier] ❌ Giving up on {key} for {task_id} after {attempts} attempt(s): {error}")
+                continue
+            retry.append((task_id, key, {**entry, "attempts": attempts, "next_at": now_ts + delay}))
+        if not retry:
+            return
+
+        outbox_put(retry)
+        self._schedule_retry([(task_id, key) for task_id, key, _ in retry], delay)
+        what = f"{job.key} ({len(retry)} notification(s))" if job.items is not None else f"{job.key} for {job.task.stable_id}"
+        log.warning(f"[notifier] ❌ Failed to send {what} (attempt {attempts}), retry in {delay:.1f}s: {error}")
+
+    def seconds_until_due(self) -> float:
+        next_due = self.queue.next_due()
+        if next_due is None:
+            return float(self.interval)
+        return max(0.0, (next_due - datetime.now()).total_seconds())
+
+    def compact_state(self):
+        try:
+            compact_expired(datetime.now().timestamp(), self.retention.horizon.total_seconds())
+        except Exception as e:
+            log.error(f"[notifier] ❌ Retention compaction failed: {e}")
+
+
 async def notification_loop(
     folder_path: str,
     warn_before: List[str],
     warn_during: List[str],
     warn_overdue: List[str],
     send_func: Callable,
-    interval: int = 60,
+    interval: int = None,
     sent_flags: dict = None,
+    config: dict = None,
 ):
-    log.info(f"[notifier] ✅ Started checking every {interval}s; folder={folder_path}")
-    if sent_flags is None:
-        sent_flags = load_sent_flags()
-
+    """
+    Смещения, интервал и допуски берутся из аргументов (интервал — из
+    CHECK_INTERVAL, если не передан), а после правки config.json —
+    из него: изменения подхватываются на ближайшем тике без перезапуска.
+    config — уже загруженный config.json; None — прочитать здесь.
+    """
     from utils import load_config
-    cfg = load_config()
-    chat_args = {"chat_id": cfg["CHAT_ID"]}
-    if cfg.get("TOPIC_ID"):
-        chat_args["message_thread_id"] = cfg["TOPIC_ID"]
+    cfg = load_config() if config is None else config
+    notifier = Notifier(folder_path, warn_before, warn_during, warn_overdue, send_func, interval, sent_flags,
+                        config=cfg)
+    log.info(f"[notifier] ✅ Started checking every {notifier.interval}s; folder={folder_path}")
 
-    tol_before = cfg.get("tolerance_before_sec", 300)
-    tol_during = cfg.get("tolerance_during_sec", 1200)
+    # В режиме наблюдения папка перечитывается только по событиям,
+    # а раз в interval лишь пересчитываются сроки уведомлений
+    watcher = await create_watcher(
+        folder_path,
+        mode=cfg.get("WATCH_MODE", "off"),
+        debounce=cfg.get("WATCH_DEBOUNCE_SEC", 1.0),
+        poll_interval=cfg.get("WATCH_POLL_SEC", 2.0),
+    )
+    await notifier.restore_snapshot()
+    await notifier.start()
 
-    async def check_tasks_once():
-        global task_list
-        now = datetime.now()
-        task_list = load_tasks_from_folder(folder_path)
-        log.info(f"[notifier] 📋 Loaded {len(task_list)} tasks from {folder_path}")
-
-        for task in task_list:
-            task_id = task.stable_id
-            already = sent_flags.get(task_id, set())
-            notifications = generate_notifications(task, warn_before, warn_during, warn_overdue)
-
-            for when, key, prefix, minutes_delta in notifications:
-                if key in already:
-                    continue
-                if not should_send(now, when, key, tol_before, tol_during):
-                    continue
-                try:
-                    await send_func(task, key, minutes_delta, chat_args)
-                    already.add(key)
-                    mark_as_sent(task_id, key)
-                    log.info(f"[notifier] 📨 Sent {key} for {task_id}")
-                except Exception as e:
-                    log.warning(f"[notifier] ❌ Failed to send {key} for {task_id}, skipping save: {e}")
-                    continue
-            sent_flags[task_id] = already
+    loop = asyncio.get_running_loop()
+    try:
+        await notifier.check_tasks_once()
+        notifier.compact_state()
+        last_scan = last_compact = last_snapshot = loop.time()
+        while True:
+            if loop.time() - last_compact >= notifier.compact_every:
+                notifier.compact_state()
+                last_compact = loop.time()
+            if loop.time() - last_snapshot >= notifier.snapshot_every:
+                await notifier.save_snapshot()
+                last_snapshot = loop.time()
 
-        save_sent_flags(sent_flags)
+            interval = notifier.interval
+            scan_in = max(0.0, interval - (loop.time() - last_scan))
+            timeout = min(scan_in, notifier.seconds_until_due())
 
-    await check_tasks_once()
-    while True:
-        await asyncio.sleep(interval)
-        await check_tasks_once()
+            if watcher is None:
+                await asyncio.sleep(timeout)
+                # Папку перечитываем раз в interval, а к сроку уведомления просыпаемся без скана
+                rescan = loop.time() - last_scan >= interval
+                await notifier.check_tasks_once(rescan=rescan)
+                if rescan:
+                    last_scan = loop.time()
+            else:
+                changed = await watcher.wait_for_changes(timeout)
+                if changed:
+                    log.info(f"[notifier] 👁 {len(changed)} file(s) changed, re-checking")
+                # Пустое множество — изменений не было, скан не нужен
+                await notifier.check_tasks_once(changed, rescan=changed is None or bool(changed))
+                last_scan = loop.time()
+    finally:
+        await notifier.close()
+        if watcher is not None:
+            watcher.close()
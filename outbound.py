@@ -0,0 +1,188 @@
+# outbound.py
+"""
+Исходящая очередь уведомлений.
+
+Несколько воркеров отправляют сообщения параллельно; скорость ограничена
+token bucket'ами: общим (лимит Bot API ~30 сообщений/с) и на каждый чат
+(в группах ~20 сообщений/мин). Уведомления одной задачи отправляются
+строго по порядку — чтобы удаление прошлой стадии видело её message_id.
+Сводка (digest.py) ждёт очереди каждой вошедшей в неё задачи.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import metrics
+from models import Task
+from outbox import retry_after_of
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated: Optional[float] = None
+        self._held_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def hold(self, seconds: float):
+        """Не выдавать токены ближайшие seconds (например, после 429 с retry_after)."""
+        self._held_until = max(self._held_until, asyncio.get_running_loop().time() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if now < self._held_until:
+                    await asyncio.sleep(self._held_until - now)
+                    continue
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class OutboundJob:
+    task: Task
+    key: str
+    minutes_delta: int
+    chat_args: dict
+    items: Optional[List["OutboundJob"]] = None     # сводка: вошедшие уведомления (см. digest.py)
+
+
+class OutboundQueue:
+    def __init__(
+        self,
+        send_func: Callable[..., Awaitable],
+        on_result: Callable[[OutboundJob, Optional[BaseException]], None],
+        workers: int = 4,
+        global_rate: float = 30.0,
+        chat_rate_per_min: float = 20.0,
+        chat_burst: int = 5,
+        send_digest: Callable[..., Awaitable] = None,
+    ):
+        """
+        send_func(task, key, minutes_delta, chat_args) — как у build_send_notification.
+        send_digest(items, chat_args) — для job'ов-сводок (send_func.digest).
+        on_result(job, error) вызывается после каждой попытки (error=None — успех).
+        """
+        self.send_func = send_func
+        self.send_digest = send_digest
+        self.on_result = on_result
+        self.workers = workers
+        self.chat_rate = chat_rate_per_min / 60.0
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[object, TokenBucket] = {}
+        self._queue: "asyncio.Queue[OutboundJob]" = asyncio.Queue()
+        # задача → её job'ы в порядке submit; первый — в работе или у воркеров
+        self._lines: Dict[str, Deque[OutboundJob]] = {}
+        self._parked = 0                                    # job'ы, ждущие своей очереди
+        self._workers: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return self._queue.qsize() + self._parked
+
+    async def start(self):
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info(f"[outbound] 🚚 {self.workers} send workers, "
+                 f"{self._global.rate:g}/s global, {self.chat_rate * 60:g}/min per chat")
+
+    def submit(self, job: OutboundJob):
+        """
+        Job встаёт в очередь каждой своей задачи (у сводки их несколько) сразу
+        во все, поэтому порядок во всех очередях один — сводки не ждут друг
+        друга по кругу. Уходит воркерам, когда первый во всех своих очередях.
+        """
+        for task_id in self._task_ids(job):
+            self._lines.setdefault(task_id, deque()).append(job)
+        if self._is_ready(job):
+            self._queue.put_nowait(job)
+        else:
+            self._parked += 1
+
+    @staticmethod
+    def _task_ids(job: OutboundJob) -> List[str]:
+        items = job.items if job.items is not None else [job]
+        return sorted({item.task.stable_id for item in items})
+
+    def _is_ready(self, job: OutboundJob) -> bool:
+        return all(self._lines[task_id][0] is job for task_id in self._task_ids(job))
+
+    async def join(self):
+        await self._queue.join()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _worker(self, n: int):
+        while True:
+            job = await self._queue.get()
+            error = None
+            try:
+                await self._chat_bucket(job.chat_args["chat_id"]).acquire()
+                await self._global.acquire()
+                started = time.perf_counter()
+                try:
+                    if job.items is not None:
+                        await self.send_digest(job.items, job.chat_args)
+                    else:
+                        await self.send_func(job.task, job.key, job.minutes_delta, job.chat_args)
+                finally:
+                    metrics.SEND_LATENCY.observe(time.perf_counter() - started)
+            except asyncio.CancelledError:
+                self._queue.task_done()
+                raise
+            except Exception as e:
+                error = e
+                retry_after = retry_after_of(e)
+                if retry_after:
+                    # 429 относится ко всему чату — придерживаем его отправки
+                    self._chat_bucket(job.chat_args["chat_id"]).hold(retry_after)
+
+            try:
+                self.on_result(job, error)
+            except Exception as e:
+                log.error(f"[outbound] ❌ on_result failed for {job.key}: {e}")
+            finally:
+                # Следующий job той же задачи — только после результата предыдущего
+                self._release(job)
+                self._queue.task_done()
+
+    def _release(self, job: OutboundJob):
+        heads: List[OutboundJob] = []
+        for task_id in self._task_ids(job):
+            line = self._lines[task_id]
+            line.popleft()
+            if not line:
+                del self._lines[task_id]
+            elif not any(line[0] is head for head in heads):
+                heads.append(line[0])
+        for head in heads:
+            if self._is_ready(head):
+                self._parked -= 1
+                self._queue.put_nowait(head)
@@ -0,0 +1,56 @@
+# outbox.py
+"""
+Повторы доставки из outbox.
+
+Наступившее уведомление один раз кладётся в outbox (memory.outbox_put)
+и живёт там до успешной отправки. Неудачные попытки повторяются:
+после 429 — не раньше retry_after из ответа Telegram, иначе — по
+экспоненте с джиттером. Запись выбрасывается, только если доставка
+не укладывается в stale_after с момента постановки.
+"""
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """
+    Секунды из telegram.error.RetryAfter (int или timedelta в новых PTB),
+    None для прочих ошибок.
+    """
+    value = getattr(error, "retry_after", None)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    base: float = 2.0           # первая пауза, сек
+    cap: float = 300.0          # предел паузы, сек
+    stale_after: float = 3600.0 # сколько уведомление может ждать доставки, сек
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "RetryPolicy":
+        return cls(
+            base=cfg.get("outbox_retry_base_sec", 2.0),
+            cap=cfg.get("outbox_retry_cap_sec", 300.0),
+            stale_after=cfg.get("outbox_stale_sec", 3600.0),
+        )
+
+    def delay(self, attempts: int, error: BaseException = None, rng: random.Random = random) -> float:
+        """
+        Пауза перед попыткой attempts + 1 (attempts ≥ 1 — уже неудачных).
+        """
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            # Раньше Telegram всё равно не примет; джиттер разводит повторы разных задач
+            return retry_after + rng.uniform(0, self.base)
+        backoff = min(self.cap, self.base * 2 ** (attempts - 1))
+        return backoff / 2 + rng.uniform(0, backoff / 2)
+
+    def is_stale(self, created_at: float, at: float) -> bool:
+        return at - created_at > self.stale_after
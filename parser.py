@@ -1,51 +1,149 @@
+import io
+import mmap
 import re
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List
+from datetime import date, datetime, time, timedelta
+from typing import List, NamedTuple, Optional
 import logging
 
 from models import Task
 from utils import load_config
 
 log = logging.getLogger(__name__)
-cfg = load_config()
 
 DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
 
+# === Эмоджи, обозначающие приоритет задачи ===
+PRIORITY_ICONS = ["⏫", "⏬", "🔺", "🔼", "🔽"]
+
+TASK_OPEN = "- [ ]"
+TASK_OPEN_BYTES = TASK_OPEN.encode()
+TASK_DONE = "- [x]"
+
+_ICONS_CLASS = "[" + "".join(PRIORITY_ICONS) + "]"
+
+# Один вызов на строку достаёт все поля: каждое — необязательный lookahead
+# с семантикой re.search (первое вхождение)
+LINE_RE = re.compile(
+    r"(?=.*?\[startTime::\s*(\d{2}):(\d{2})\])?"
+    r"(?=.*?\[endTime::\s*(\d{2}):(\d{2})\])?"
+    r"(?=.*?(" + _ICONS_CLASS + r"))?"
+)
+# Переопределения уведомлений задачи: [remind:: 30m,5m], [during:: 0m], [overdue:: none]
+OVERRIDE_RE = re.compile(r"\[(remind|before|during|overdue)::\s*([^\]]*)\]")
+OVERRIDE_KINDS = {"remind": "before", "before": "before", "during": "during", "overdue": "overdue"}
+# Очистка текста от значков приоритета, временных тегов и переопределений — тоже одним проходом
+CLEAN_RE = re.compile(_ICONS_CLASS + r"|\[startTime::.*?\]|\[endTime::.*?\]|" + OVERRIDE_RE.pattern)
+
+
+class LineTokens(NamedTuple):
+    start: Optional[time]       # время из [startTime:: HH:MM] или None
+    end: Optional[time]         # время из [endTime:: HH:MM] или None
+    priority: Optional[str]     # первый значок приоритета
+    cleaned: str                # текст без тегов времени и значков приоритета
+    overrides: tuple            # (("before", "30m,5m"), ("overdue", "none")), см. notification_logic
+
+
+def tokenize_line(text: str) -> LineTokens:
+    """
+    Разбирает строку задачи предкомпилированными шаблонами:
+    один match на поля и один sub на очистку.
+    Невалидное время (например, 25:99) даёт ValueError.
+    """
+    sh, sm, eh, em, priority = LINE_RE.match(text).groups()
+    start = time(int(sh), int(sm)) if sh is not None else None
+    end = time(int(eh), int(em)) if eh is not None else None
+    return LineTokens(start, end, priority, CLEAN_RE.sub("", text).strip(), parse_overrides(text))
+
+
+def parse_overrides(text: str) -> tuple:
+    """
+    Поля-переопределения в порядке появления; строки без них регуляркой не сканируются.
+    """
+    if "[remind::" not in text and "[before::" not in text and "[during::" not in text and "[overdue::" not in text:
+        return ()
+    return tuple((OVERRIDE_KINDS[kind], value.strip()) for kind, value in OVERRIDE_RE.findall(text))
+
+
 def parse_task_lines(file_path: str) -> List[Task]:
-    tasks: List[Task] = []
+    try:
+        with open(file_path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return []
+            # Быстрый отсев: ищем "- [ ]" в сырых байтах, ничего не декодируя
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(TASK_OPEN_BYTES) == -1:
+                    return []
+                data = mm[:]
+    except Exception as e:
+        log.error(f"[parser] ❌ Failed to read file {file_path} → {e}")
+        return []
+
+    return parse_task_bytes(file_path, data)
 
+
+def parse_task_bytes(file_path: str, data: bytes) -> List[Task]:
+    """
+    Разбирает содержимое файла в байтах; без "- [ ]" строка даже не декодируется.
+    """
+    if TASK_OPEN_BYTES not in data:
+        return []
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        # StringIO с newline=None даёт те же строки, что и readlines() в текстовом режиме
+        lines = io.StringIO(data.decode("utf-8"), newline=None).readlines()
+    except UnicodeDecodeError as e:
+        log.error(f"[parser] ❌ Failed to decode file {file_path} → {e}")
+        return []
+    return parse_task_content(file_path, lines)
+
+
+def parse_task_content(file_path: str, lines: List[str]) -> List[Task]:
+    """
+    Разбирает уже прочитанные строки файла (используется кэшем сканирования).
+    """
+    tasks: List[Task] = []
 
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
+    # Надёжно извлекаем дату из имени файла — один раз на файл
+    stem = Path(file_path).stem
+    date_match = DATE_RE.search(stem)
+    date_str = date_match.group(0) if date_match else None
 
-            if "- [ ]" not in line or "- [x]" in line:
-                continue
+    file_date = None
+    if date_str is not None:
+        try:
+            file_date = date.fromisoformat(date_str)
+        except ValueError:
+            pass
+    debug = log.isEnabledFor(logging.DEBUG)
 
-            log.debug(f"[parser] 🔍 Found task candidate in {file_path}:{i} → {line_stripped}")
+    try:
+        for i, line in enumerate(lines):
+            if TASK_OPEN not in line or TASK_DONE in line:
+                continue
 
-            start_m = re.search(r"\[startTime::\s*(\d{2}:\d{2})\]", line)
-            end_m   = re.search(r"\[endTime::\s*(\d{2}:\d{2})\]",   line)
+            line_stripped = line.strip()
+            if debug:
+                log.debug(f"[parser] 🔍 Found task candidate in {file_path}:{i} → {line_stripped}")
 
-            if not start_m:
-                log.debug(f"[parser] ⛔ No [startTime:: .. ] found in {file_path}:{i}")
+            if "[startTime::" not in line:
+                if debug:
+                    log.debug(f"[parser] ⛔ No [startTime:: .. ] found in {file_path}:{i}")
                 continue
 
             try:
-                # Надёжно извлекаем дату из имени файла
-                stem = Path(file_path).stem
-                date_match = DATE_RE.search(stem)
-                if not date_match:
+                tokens = tokenize_line(line_stripped)
+                if tokens.start is None:
+                    if debug:
+                        log.debug(f"[parser] ⛔ No [startTime:: .. ] found in {file_path}:{i}")
+                    continue
+
+                if file_date is None:
                     raise ValueError(f"No valid date in filename: {stem}")
 
-                date_str = date_match.group(0)
-                start_dt = datetime.strptime(f"{date_str} {start_m.group(1)}", "%Y-%m-%d %H:%M")
+                start_dt = datetime.combine(file_date, tokens.start)
 
-                if end_m:
-                    end_dt = datetime.strptime(f"{date_str} {end_m.group(1)}", "%Y-%m-%d %H:%M")
+                if tokens.end is not None:
+                    end_dt = datetime.combine(file_date, tokens.end)
                 else:
                     end_dt = start_dt + timedelta(minutes=15)
 
@@ -54,23 +152,28 @@ def parse_task_lines(file_path: str) -> List[Task]:
                     line_num=i,
                     text=line_stripped,
                     start_dt=start_dt,
-                    end_dt=end_dt
+                    end_dt=end_dt,
+                    cleaned_text=tokens.cleaned,
+                    has_priority=tokens.priority is not None,
+                    priority_emoji=tokens.priority or "⏫",  # дефолт приоритета
+                    overrides=tokens.overrides,
                 )
                 tasks.append(task)
-                log.info(f"[parser] ✅ Parsed task ({date_str}): {task.text}")
+                if debug:
+                    log.debug(f"[parser] ✅ Parsed task ({date_str}): {task.text}")
 
             except Exception as e:
                 log.warning(f"[parser] ⚠️ Time parse error in {file_path}:{i} → {e}")
 
     except Exception as e:
-        log.error(f"[parser] ❌ Failed to read file {file_path} → {e}")
+        log.error(f"[parser] ❌ Failed to parse file {file_path} → {e}")
 
     return tasks
 
 
 def parse_tasks_from_files() -> List[Task]:
     tasks: List[Task] = []
-    base_path = Path(cfg["TASKS_FOLDER"])
+    base_path = Path(load_config()["TASKS_FOLDER"])
 
     if not base_path.exists():
         log.warning(f"[parser] 📁 Task folder not found: {base_path}")
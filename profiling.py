@@ -0,0 +1,204 @@
+# profiling.py
+"""
+Профилирование бота.
+
+1. Этапы тика и отправки: `with TICK.span("scan"):` копит время по этапам;
+   в конце тика сводка пишется в лог (INFO — если тик медленнее
+   PROFILE_SLOW_TICK_MS, иначе DEBUG) и в метрику notifier_stage_duration_seconds.
+2. Снимки по запросу: cProfile и tracemalloc за PROFILE_SECONDS секунд,
+   файлы — в PROFILE_DIR. Запуск — сигналом SIGUSR1 (не на Windows)
+   или командой /profile от пользователя из ADMIN_IDS.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """
+    Сумма, число и максимум времени по этапам с момента последнего take().
+    Спаны могут идти из пула потоков (разбор файлов) — отсюда блокировка.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, List[float]] = {}   # этап → [сумма, число, максимум]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                self._stages[stage] = [seconds, 1, seconds]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+                entry[2] = max(entry[2], seconds)
+        metrics.STAGE_DURATION.observe(seconds, stage=f"{self.name}.{stage}")
+
+    def take(self) -> Dict[str, List[float]]:
+        with self._lock:
+            stages, self._stages = self._stages, {}
+        return stages
+
+    @staticmethod
+    def format(stages: Dict[str, List[float]]) -> str:
+        parts = []
+        for stage, (total, count, longest) in sorted(stages.items(), key=lambda kv: -kv[1][0]):
+            parts.append(f"{stage} {total * 1000:.1f}ms" + (f" ×{count} (max {longest * 1000:.1f})" if count > 1 else ""))
+        return ", ".join(parts) or "-"
+
+
+TICK = StageTimer("tick")
+SEND = StageTimer("send")
+
+
+def report_tick(elapsed: float, slow_ms: float):
+    """
+    Сводка по тику; отправки, закончившиеся с прошлого тика, — туда же.
+    """
+    tick, send = TICK.take(), SEND.take()
+    level = logging.INFO if elapsed * 1000 >= slow_ms else logging.DEBUG
+    if log.isEnabledFor(level):
+        log.log(level, f"[profile] ⏱ Tick {elapsed * 1000:.1f}ms: {StageTimer.format(tick)}"
+                       + (f" | sends: {StageTimer.format(send)}" if send else ""))
+
+
+# === Снимки по запросу ===
+
+class ProfileDumper:
+    def __init__(self, folder: Path = Path("profiles"), seconds: float = 30, top: int = 40):
+        self.folder = Path(folder)
+        self.seconds = seconds
+        self.top = top
+        self._running: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "ProfileDumper":
+        return cls(Path(cfg.get("PROFILE_DIR", "profiles")), cfg.get("PROFILE_SECONDS", 30))
+
+    @property
+    def busy(self) -> bool:
+        return self._running is not None and not self._running.done()
+
+    def trigger(self, seconds: float = None) -> Optional[asyncio.Task]:
+        """Запускает снимок в фоне; None, если предыдущий ещё не закончен."""
+        if self.busy:
+            log.warning("[profile] ⏳ A profile is already being captured")
+            return None
+        self._running = asyncio.get_running_loop().create_task(self.capture(seconds or self.seconds))
+        return self._running
+
+    async def capture(self, seconds: float) -> List[Path]:
+        """
+        cProfile потока event loop и прирост памяти (tracemalloc) за seconds.
+        Возвращает пути записанных файлов.
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        log.info(f"[profile] 🔬 Capturing cProfile + tracemalloc for {seconds:g}s")
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+        after = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+
+        written = await asyncio.to_thread(self._write, stamp, profiler, before, after)
+        log.info(f"[profile] 💾 Saved {', '.join(str(p) for p in written)}")
+        return written
+
+    def _write(self, stamp: str, profiler: cProfile.Profile,
+               before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Path]:
+        prof_path = self.folder / f"cprofile-{stamp}.prof"
+        profiler.dump_stats(str(prof_path))
+
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(self.top)
+        stats_path = self.folder / f"cprofile-{stamp}.txt"
+        stats_path.write_text(text.getvalue(), encoding="utf-8")
+
+        snap_path = self.folder / f"tracemalloc-{stamp}.snapshot"
+        after.dump(str(snap_path))
+        lines = [f"Top {self.top} allocation growth by line:"]
+        lines += [str(stat) for stat in after.compare_to(before, "lineno")[:self.top]]
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        if peak:
+            lines.append(f"traced now {current} bytes, peak {peak} bytes")
+        mem_path = self.folder / f"tracemalloc-{stamp}.txt"
+        mem_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        return [prof_path, stats_path, snap_path, mem_path]
+
+
+def install_signal_trigger(dumper: ProfileDumper) -> bool:
+    """SIGUSR1 → снимок. На Windows сигналов нет — остаётся команда /profile."""
+    sig = getattr(signal, "SIGUSR1", None)
+    if sig is None:
+        return False
+    try:
+        asyncio.get_running_loop().add_signal_handler(sig, dumper.trigger)
+    except (NotImplementedError, RuntimeError):
+        return False
+    log.info("[profile] 📡 Send SIGUSR1 to capture a profile")
+    return True
+
+
+def build_profile_command(dumper: ProfileDumper):
+    """
+    /profile [секунды] — снимок по команде. Доступна только пользователям
+    из ADMIN_IDS (список перечитывается из config.json на каждый вызов).
+    """
+    from utils import load_config
+
+    async def profile_command(update, context):
+        user = update.effective_user
+        if user is None or user.id not in load_config().get("ADMIN_IDS", []):
+            log.warning(f"[profile] 🚫 /profile from non-admin {user.id if user else None}")
+            return
+        try:
+            seconds = float(context.args[0]) if context.args else None
+        except ValueError:
+            await update.effective_message.reply_text("Usage: /profile [seconds]")
+            return
+        task = dumper.trigger(seconds)
+        if task is None:
+            await update.effective_message.reply_text("⏳ A profile is already being captured")
+            return
+        await update.effective_message.reply_text(f"🔬 Profiling for {seconds or dumper.seconds:g}s…")
+        written = await task
+        await update.effective_message.reply_text("💾 Saved:\n" + "\n".join(str(p) for p in written))
+
+    return profile_command
@@ -0,0 +1,39 @@
+# retention.py
+"""
+Политика хранения состояния задач.
+
+После end_dt + наибольшее смещение overdue задача уже не может дать
+ни одного уведомления; ещё через ttl её флаги и message_id удаляются
+из памяти и хранилища (memory.compact_expired). Наибольшее смещение
+учитывает и предел переопределений задач (override_max_offset).
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List
+
+from utils import max_offset, override_cap
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    max_overdue: timedelta      # наибольшее из default_warn_overdue и override_max_offset
+    ttl: timedelta              # запас сверх него
+
+    @classmethod
+    def from_config(cls, cfg: dict, warn_overdue: List[str]) -> "RetentionPolicy":
+        return cls(
+            max_overdue=max(max_offset(warn_overdue), override_cap(cfg)),
+            ttl=timedelta(seconds=cfg.get("retention_ttl_sec", 86400)),
+        )
+
+    @property
+    def horizon(self) -> timedelta:
+        """Сколько хранится состояние после end_dt задачи."""
+        return self.max_overdue + self.ttl
+
+    def deadline(self, end_dt: datetime) -> datetime:
+        """Момент, после которого состояние задачи можно удалить."""
+        return end_dt + self.horizon
+
+    def is_expired(self, end_dt: datetime, now: datetime) -> bool:
+        return self.deadline(end_dt) <= now
@@ -0,0 +1,298 @@
+# scan_cache.py
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from hashlib import md5
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import metrics
+from models import Task
+from parser import DATE_RE, parse_task_bytes
+from profiling import TICK
+
+log = logging.getLogger(__name__)
+
+Window = Tuple[date, date]
+
+
+def date_from_filename(file_path: str) -> Optional[date]:
+    """
+    Дата заметки из имени файла (YYYY-MM-DD), как в parse_task_content.
+    """
+    match = DATE_RE.search(Path(file_path).stem)
+    if not match:
+        return None
+    try:
+        return date.fromisoformat(match.group(0))
+    except ValueError:
+        return None
+
+
+@dataclass
+class FileEntry:
+    """
+    Состояние одного файла на момент последнего разбора.
+    """
+    mtime_ns: int
+    size: int
+    digest: str         # md5 содержимого — ловит touch без изменений
+    tasks: List[Task]
+
+
+class ScanCache:
+    """
+    Кэш разбора хранилища: повторно парсит только добавленные, изменённые
+    и удалённые файлы. Живёт между тиками notification_loop.
+
+    Дата заметки берётся из имени файла (индекс дата → файлы), поэтому
+    файлы вне активного окна дат не открываются и даже не stat-ятся.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, FileEntry] = {}
+        self.generation = 0             # растёт при любом изменении набора задач
+        self.file_dates: Dict[str, Optional[date]] = {}     # путь → дата из имени
+        self.date_index: Dict[date, Set[str]] = {}          # дата → пути
+        self._window: Optional[Window] = None
+        self._tasks: List[Task] = []
+
+    def restore(self, entries: Dict[str, FileEntry]):
+        """
+        Тёплый старт: записи из снимка. Первый полный refresh сверит их
+        отметки (mtime, size) со stat и перепарсит только изменившиеся файлы.
+        """
+        self.entries = dict(entries)
+        self.generation = 0
+
+    def refresh(self, folder_path: str, changed_paths: Iterable[str] = None,
+                window: Optional[Window] = None) -> List[Task]:
+        """
+        Обновляет кэш и возвращает плоский список задач.
+        changed_paths — пути из файлового наблюдателя: тогда перепроверяются
+        только они, без обхода всей папки. None означает полный обход.
+        window — (первая, последняя) дата заметок, которые ещё могут дать
+        уведомление; None — без отсечения.
+        """
+        started = time.perf_counter()
+        counts = _new_counts()
+        for key in self._plan(Path(folder_path), changed_paths, window, counts):
+            entry = self.entries.get(key)
+            self._apply(key, entry, check_file(key, _stamp(entry)), counts)
+        return self._finish(window, counts, started)
+
+    async def refresh_async(self, folder_path: str, changed_paths: Iterable[str] = None,
+                            window: Optional[Window] = None, executor: Executor = None) -> List[Task]:
+        """
+        То же, что refresh, но без блокировки event loop: обход папки идёт
+        в потоке, а чтение и разбор файлов — в executor (пул потоков или
+        процессов). Результаты применяются по мере готовности, так что
+        между файлами loop успевает обслужить кнопки и heartbeat.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        counts = _new_counts()
+        keys = await asyncio.to_thread(self._plan, Path(folder_path), changed_paths, window, counts)
+
+        async def check(key: str):
+            entry = self.entries.get(key)
+            return key, entry, await loop.run_in_executor(executor, check_file, key, _stamp(entry))
+
+        for next_done in asyncio.as_completed([check(key) for key in keys]):
+            key, entry, result = await next_done
+            self._apply(key, entry, result, counts)
+
+        return self._finish(window, counts, started)
+
+    def _plan(self, folder: Path, changed_paths: Optional[Iterable[str]],
+              window: Optional[Window], counts: Dict[str, int]) -> List[str]:
+        """
+        Обновляет индекс файлов и возвращает пути, которые надо перепроверить.
+        """
+        if changed_paths is None:
+            self._index_folder(folder)
+            for key in [k for k in self.entries if k not in self.file_dates]:
+                del self.entries[key]
+                counts["removed"] += 1
+            return self._files_in_window(window)
+
+        keys = []
+        for changed in changed_paths:
+            path = Path(changed)
+            if path.suffix != ".md" or path.parent != folder:
+                continue
+            key = str(folder / path.name)
+            if path.exists():
+                self._index_add(key)
+            else:
+                self._index_remove(key)
+            if key not in self.file_dates or self._in_window(key, window):
+                keys.append(key)
+
+        if window != self._window:
+            # Окно сдвинулось (новый день) — подтягиваем вошедшие в него файлы по индексу
+            keys.extend(k for k in self._files_in_window(window) if k not in self.entries)
+        return list(dict.fromkeys(keys))
+
+    def _finish(self, window: Optional[Window], counts: Dict[str, int], started: float) -> List[Task]:
+        if window is not None:
+            for key in [k for k in self.entries if not self._in_window(k, window)]:
+                del self.entries[key]
+                counts["pruned"] += 1
+        self._window = window
+
+        if counts["parsed"] or counts["removed"] or counts["pruned"] or not self.generation:
+            self.generation += 1
+            self._tasks = [t for e in self.entries.values() for t in e.tasks]
+            log.info(f"[scan] 🔄 Re-parsed {counts['parsed']} files, removed {counts['removed']}, "
+                     f"pruned {counts['pruned']}, touched {counts['touched']}; "
+                     f"{len(self.entries)} of {len(self.file_dates)} files cached")
+
+        metrics.SCAN_DURATION.observe(time.perf_counter() - started)
+        for result, n in counts.items():
+            if n:
+                metrics.SCAN_FILES.inc(n, result=result)
+        metrics.TASKS_LOADED.set(len(self._tasks))
+        return self._tasks
+
+    # === Индекс дата → файлы ===
+
+    def _index_folder(self, folder: Path):
+        self.file_dates = {}
+        self.date_index = {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.name.endswith(".md") and entry.is_file():
+                    self._index_add(str(folder / entry.name))
+
+    def _index_add(self, key: str):
+        if key in self.file_dates:
+            return
+        file_date = date_from_filename(key)
+        self.file_dates[key] = file_date
+        if file_date is not None:
+            self.date_index.setdefault(file_date, set()).add(key)
+
+    def _index_remove(self, key: str):
+        file_date = self.file_dates.pop(key, None)
+        if file_date is not None:
+            paths = self.date_index.get(file_date)
+            if paths is not None:
+                paths.discard(key)
+                if not paths:
+                    del self.date_index[file_date]
+
+    def _in_window(self, key: str, window: Optional[Window]) -> bool:
+        if window is None:
+            return True
+        file_date = self.file_dates.get(key)
+        # Без даты в имени парсер всё равно не соберёт из файла ни одной задачи
+        return file_date is not None and window[0] <= file_date <= window[1]
+
+    def _files_in_window(self, window: Optional[Window]) -> List[str]:
+        if window is None:
+            return list(self.file_dates)
+        first, last = window
+        if (last - first).days >= len(self.date_index):
+            return [k for d, paths in self.date_index.items() if first <= d <= last for k in paths]
+        keys = []
+        day = first
+        while day <= last:
+            keys.extend(self.date_index.get(day, ()))
+            day += timedelta(days=1)
+        return keys
+
+    def _apply(self, key: str, entry: Optional[FileEntry], result, counts: Dict[str, int]):
+        """
+        Применяет результат check_file к кэшу (всегда в потоке event loop).
+        """
+        if result is None:
+            counts["error"] += 1
+            return
+        if result == "same":
+            counts["unchanged"] += 1
+            return
+        if result == "missing":
+            if self.entries.pop(key, None) is not None:
+                counts["removed"] += 1
+            return
+        if isinstance(result, tuple):
+            # Файл «тронут», но содержимое то же — обновляем только отметки
+            entry.mtime_ns, entry.size = result
+            counts["touched"] += 1
+            return
+        self.entries[key] = result
+        counts["parsed"] += 1
+        metrics.TASKS_PARSED.inc(len(result.tasks))
+
+
+Stamp = Optional[Tuple[int, int, str]]
+
+
+def _new_counts() -> Dict[str, int]:
+    return {"parsed": 0, "unchanged": 0, "touched": 0, "removed": 0, "pruned": 0, "error": 0}
+
+CheckResult = Union[None, str, Tuple[int, int], FileEntry]
+
+
+def _stamp(entry: Optional[FileEntry]) -> Stamp:
+    return (entry.mtime_ns, entry.size, entry.digest) if entry else None
+
+
+def check_file(key: str, stamp: Stamp) -> CheckResult:
+    """
+    Проверяет и при необходимости разбирает один файл.
+    Не трогает кэш, поэтому выполняется в любом пуле (в том числе процессов).
+    Возвращает:
+      "missing" — файла нет; "same" — отметки не изменились;
+      (mtime_ns, size) — файл тронут без изменения содержимого;
+      FileEntry — файл перечитан; None — ошибка (уже в логе).
+    """
+    try:
+        st = os.stat(key)
+    except FileNotFoundError:
+        return "missing"
+    except OSError as e:
+        log.warning(f"[scan] ⚠️ Cannot stat {key} → {e}")
+        return None
+
+    if stamp and stamp[0] == st.st_mtime_ns and stamp[1] == st.st_size:
+        return "same"
+
+    try:
+        with open(key, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        log.error(f"[scan] ❌ Failed to read file {key} → {e}")
+        return None
+
+    digest = md5(data).hexdigest()
+    if stamp and stamp[2] == digest:
+        return st.st_mtime_ns, st.st_size
+
+    # В пуле процессов спан остаётся в дочернем процессе и в сводку тика не попадает
+    with TICK.span("parse"):
+        tasks = parse_task_bytes(key, data)
+    return FileEntry(st.st_mtime_ns, st.st_size, digest, tasks)
+
+
+def create_scan_executor(mode: str = "off", workers: int = None) -> Optional[Executor]:
+    """
+    Пул для разбора файлов: "off" (по умолчанию; без отдельного пула —
+    разбор в потоке по умолчанию asyncio), "thread" или "process".
+    workers по умолчанию — число ядер.
+    """
+    workers = workers or os.cpu_count() or 1
+    if mode == "process":
+        log.info(f"[scan] ⚙️ Parsing files in a pool of {workers} processes")
+        return ProcessPoolExecutor(max_workers=workers)
+    if mode == "off":
+        return None
+    if mode != "thread":
+        log.warning(f"[scan] ⚠️ Unknown SCAN_EXECUTOR '{mode}', using threads")
+    log.info(f"[scan] ⚙️ Parsing files in a pool of {workers} threads")
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
@@ -3,15 +3,21 @@
 import asyncio
 import logging
 import sys
-from telegram import Bot
-from telegram.ext import Application, ApplicationBuilder, CallbackQueryHandler
+from typing import Tuple
+
+from telegram.ext import Application, ApplicationBuilder, CallbackQueryHandler, CommandHandler
+from telegram.request import HTTPXRequest
 
 from done_handler import handle_done_button
 from utils import load_config
 from memory import load_sent_flags
-from notifier import notification_loop, task_list
+from notifier import notification_loop, task_index
 from heartbeat import heartbeat
+from loop_watchdog import LoopWatchdog
+from profiling import ProfileDumper, build_profile_command, install_signal_trigger
+import metrics
 from sender import build_send_notification
+from webhook import serve_webhook
 
 sys.stdout.reconfigure(encoding='utf-8')  # 💡 добавь это до логгера
 
@@ -28,30 +34,79 @@ logging.basicConfig(
     stream=sys.stdout,
 )
 
-def build_application(config) -> Application:
-    app = ApplicationBuilder().token(config["TELEGRAM_TOKEN"]).build()
-    app.add_handler(CallbackQueryHandler(lambda u, c: handle_done_button(u, c, task_list), pattern=r"^done::"))
+# Сторонние библиотеки не опускаются ниже INFO: на DEBUG httpx/httpcore
+# и telegram пишут URL запросов с токеном бота и тела ответов
+THIRD_PARTY_LOGGERS = ("httpx", "httpcore", "telegram")
+
+def configure_log_level(level):
+    """LOG_LEVEL применяется к модулям бота; сторонние логгеры — не подробнее INFO."""
+    root = logging.getLogger()
+    root.setLevel(level)
+    third_party_level = max(logging.INFO, root.getEffectiveLevel())
+    for name in THIRD_PARTY_LOGGERS:
+        logging.getLogger(name).setLevel(third_party_level)
+
+def build_requests(config) -> Tuple[HTTPXRequest, HTTPXRequest]:
+    """
+    Два HTTP-пула на всё время работы процесса:
+    - общий — отправка, удаление, правки, ответы на кнопки; размер
+      HTTP_POOL_SIZE, при исчерпании ждём до HTTP_POOL_TIMEOUT_SEC;
+    - отдельный на getUpdates: long polling держит соединение десятки
+      секунд и не должен отнимать его у отправок.
+    """
+    request = HTTPXRequest(
+        connection_pool_size=config.get("HTTP_POOL_SIZE", 16),
+        pool_timeout=config.get("HTTP_POOL_TIMEOUT_SEC", 5.0),
+    )
+    get_updates_request = HTTPXRequest(connection_pool_size=2)
+    return request, get_updates_request
+
+def build_application(config, dumper: ProfileDumper = None) -> Application:
+    """
+    Одно Application на процесс: его bot отправляет уведомления,
+    а updater принимает нажатия кнопок — через общие пулы build_requests.
+    """
+    request, get_updates_request = build_requests(config)
+    builder = (ApplicationBuilder().token(config["TELEGRAM_TOKEN"])
+               .request(request).get_updates_request(get_updates_request))
+    # TELEGRAM_BASE_URL — например, поддельный Bot API из benchmarks.fake_bot_api
+    if config.get("TELEGRAM_BASE_URL"):
+        builder = builder.base_url(config["TELEGRAM_BASE_URL"])
+    app = builder.build()
+    app.add_handler(CallbackQueryHandler(lambda u, c: handle_done_button(u, c, task_index), pattern=r"^done::"))
+    if dumper is not None:
+        # Снимок идёт десятки секунд — не держим очередь апдейтов
+        app.add_handler(CommandHandler("profile", build_profile_command(dumper), block=False))
     return app
 
-async def safe_polling(app_factory):
+async def stop_application(app: Application):
+    """Останавливает updater и Application, если они ещё работают."""
+    try:
+        if app.updater.running:
+            await app.updater.stop()
+        if app.running:
+            log.info("🛑 Stopping application...")
+            await app.stop()
+            log.info("✅ Application stopped cleanly")
+    except RuntimeError:
+        pass    # уже остановлено параллельно (отмена gather)
+    except Exception as shutdown_error:
+        log.error(f"🧹 Error during shutdown: {shutdown_error}", exc_info=True)
+
+async def safe_polling(app: Application):
+    """
+    Поллинг на уже запущенном Application. При падении перезапускается
+    только updater: HTTP-пулы и соединения остаются.
+    """
     while True:
         try:
-            log.info("🚀 Launching polling manually")
-            app = app_factory()
-
-            try:
-                await app.initialize()
-                log.info("✅ Initialized application")
-            except Exception as init_error:
-                log.error(f"❌ Initialization failed: {init_error}", exc_info=True)
-                raise init_error
-
-            await app.start()
+            log.info("🚀 Launching polling")
             await app.updater.start_polling()
             log.info("📡 Polling started")
 
-            while True:
+            while app.updater.running:
                 await asyncio.sleep(5)
+            log.warning("⚠️ Polling stopped, restarting")
 
         except asyncio.CancelledError:
             log.warning("⚠️ Polling manually cancelled")
@@ -64,47 +119,71 @@ async def safe_polling(app_factory):
 
         finally:
             try:
-                if 'app' in locals() and app.running:
-                    log.info("🛑 Stopping application...")
+                if app.updater.running:
                     await app.updater.stop()
-                    await app.stop()
-                    await app.shutdown()
-                    log.info("✅ Application stopped cleanly")
-            except Exception as shutdown_error:
-                log.error(f"🧹 Error during shutdown: {shutdown_error}", exc_info=True)
+            except RuntimeError:
+                pass
+            except Exception as stop_error:
+                log.error(f"🧹 Error while stopping updater: {stop_error}", exc_info=True)
 
 async def main():
     config = load_config()
 
-    required_keys = [
-        "TELEGRAM_TOKEN",
-        "CHAT_ID",
-        "TASKS_FOLDER",
-        "default_warn_before_start",
-        "default_warn_during",
-        "default_warn_overdue",
-    ]
-    for key in required_keys:
-        if key not in config:
-            raise KeyError(f"Missing required config key: {key}")
+    # Обязательные ключи и значения проверяет load_config
+    # LOG_LEVEL=DEBUG включает подробный лог парсера (строка на каждую задачу)
+    configure_log_level(config.get("LOG_LEVEL", "INFO"))
 
     sent_flags = load_sent_flags()
-    bot = Bot(token=config["TELEGRAM_TOKEN"])
+
+    # Снимки cProfile/tracemalloc: SIGUSR1 или /profile от ADMIN_IDS
+    dumper = ProfileDumper.from_config(config)
+    install_signal_trigger(dumper)
+
+    app = build_application(config, dumper)
+    while True:
+        try:
+            await app.initialize()
+            log.info("✅ Initialized application")
+            break
+        except Exception as init_error:
+            log.error(f"❌ Initialization failed: {init_error}; retrying in 5 seconds", exc_info=True)
+            await asyncio.sleep(5)
+    bot = app.bot
     send_func = build_send_notification(bot)
-    app = build_application(config)
-
-    await asyncio.gather(
-        notification_loop(
-            folder_path=config["TASKS_FOLDER"],
-            warn_before=config["default_warn_before_start"],
-            warn_during=config["default_warn_during"],
-            warn_overdue=config["default_warn_overdue"],
-            send_func=send_func,
-            sent_flags=sent_flags,
-        ),
-        heartbeat(bot),
-        safe_polling(lambda: build_application(config))
-    )
+    watchdog = LoopWatchdog.from_config(config)
+    metrics.gauge_func("notifier_loop_lag_p99_seconds", "Event loop lag, 99th percentile over the last window",
+                       lambda: watchdog.stats()["p99_ms"] / 1000)
+    metrics.gauge_func("notifier_loop_stalls", "Event loop stalls longer than LOOP_STALL_SEC",
+                       lambda: watchdog.stalls)
+    await metrics.start_metrics_server(config)
+
+    # UPDATE_MODE=webhook — нажатия приходят POST'ом на webhook.py, без getUpdates
+    if config.get("UPDATE_MODE", "polling") == "webhook":
+        receive_updates = serve_webhook(app, config)
+    else:
+        receive_updates = safe_polling(app)
+
+    await app.start()
+    try:
+        await asyncio.gather(
+            notification_loop(
+                folder_path=config["TASKS_FOLDER"],
+                warn_before=config["default_warn_before_start"],
+                warn_during=config["default_warn_during"],
+                warn_overdue=config["default_warn_overdue"],
+                send_func=send_func,
+                interval=config.get("CHECK_INTERVAL", 60),
+                sent_flags=sent_flags,
+                config=config,
+            ),
+            heartbeat(bot),
+            watchdog.run(),
+            receive_updates,
+        )
+    finally:
+        await stop_application(app)
+        # Закрывает HTTP-пулы
+        await app.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
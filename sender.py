@@ -1,83 +1,184 @@
 # sender.py
 from telegram.constants import ParseMode
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-import asyncio
+from telegram.error import BadRequest
 from pathlib import Path
 import logging
-import random
 
-from message_builder import format_notification_message
+from message_builder import format_digest_message, format_notification_message
 from memory import (
     save_message_id,
+    move_message_id,
     get_message_id,
-    delete_message_id,
     get_all_message_ids,
 )
+from delete_batcher import DeleteBatcher
+from digest import latest_per_task
 from task_analyzer import analyze_task_text
+from profiling import SEND
+from utils import load_config
 
 log = logging.getLogger(__name__)
 
+DIGEST_BUTTONS_PER_ROW = 5
+
+
+def notif_type_of(key: str) -> str:
+    return (
+        "before" if key.startswith("before") else
+        "overdue" if key.startswith("overdue") else
+        "during" if key.startswith("during") else
+        "main"
+    )
+
+
 def build_send_notification(bot: Bot):
-    async def send_notification(task, key, minutes_delta, chat_args):
-        notif_type = (
-            "before" if key.startswith("before") else
-            "overdue" if key.startswith("overdue") else
-            "during" if key.startswith("during") else
-            "main"
-        )
+    """
+    NOTIFY_MODE в config.json:
+      "resend" — каждая стадия новым сообщением, старые удаляются;
+      "edit"   — у задачи одно «живое» сообщение, стадии правят его
+                 (editMessageText); заново отправляются только стадии
+                 из NOTIFY_PUSH_STAGES (по умолчанию "during" — «Now»),
+                 чтобы пришло push-уведомление.
+    """
+    deleter = DeleteBatcher(bot)
 
+    async def edit_live(task, key, notif_type, text, keyboard, chat_args) -> bool:
+        """
+        Правит последнее сообщение задачи; False — править нечего
+        (или сообщение пропало) и нужна обычная отправка.
+        """
         task_id = task.stable_id
-        filename = Path(task.file_path).stem
-
+        existing = get_all_message_ids(task_id)
+        if not existing:
+            return False
+        live_key, live_id = max(existing.items(), key=lambda item: item[1])
         try:
-            # Удаление устаревших уведомлений этого task_id
-            existing_keys = get_all_message_ids(task_id).keys()
-            to_check = []
+            with SEND.span("api"):
+                await bot.edit_message_text(
+                    chat_id=chat_args["chat_id"],
+                    message_id=live_id,
+                    text=text,
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=keyboard,
+                )
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                log.warning(f"[EDIT] Could not edit {live_key} of {task_id}, sending anew: {e}")
+                return False
+
+        with SEND.span("save"):
+            # На диск — вместе с флагом отправки (commit в Notifier.on_send_result)
+            move_message_id(task_id, live_key, key, live_id, commit=False)
+        # Остальные сообщения задачи (если были) устарели
+        for old_key, msg_id in existing.items():
+            if old_key != live_key:
+                deleter.add(chat_args["chat_id"], task_id, old_key, msg_id)
+        log.info(f"[EDITED] {notif_type.upper()} | {task.text.strip()} ({task_id}) [{Path(task.file_path).stem}]")
+        return True
 
-            if notif_type == "before":
-                current_idx = int(key.replace("before", ""))
-                to_check = [f"before{i}" for i in range(1, current_idx)]
+    def queue_outdated(task, key, notif_type, chat_id):
+        """Ставит в DeleteBatcher прошлые стадии задачи, которые key делает устаревшими."""
+        task_id = task.stable_id
+        existing_keys = get_all_message_ids(task_id).keys()
+        to_check = []
 
-            elif notif_type == "during":
-                to_check = [k for k in existing_keys if k.startswith("before")]
+        if notif_type == "before":
+            current_idx = int(key.replace("before", ""))
+            to_check = [f"before{i}" for i in range(1, current_idx)]
 
-            elif notif_type == "overdue":
-                current_idx = int(key.replace("overdue", ""))
-                to_check = (
-                    [k for k in existing_keys if k.startswith("before") or k.startswith("during")]
-                    + [f"overdue{i}" for i in range(1, current_idx)]
-                )
+        elif notif_type == "during":
+            to_check = [k for k in existing_keys if k.startswith("before")]
+
+        elif notif_type == "overdue":
+            current_idx = int(key.replace("overdue", ""))
+            to_check = (
+                [k for k in existing_keys if k.startswith("before") or k.startswith("during")]
+                + [f"overdue{i}" for i in range(1, current_idx)]
+            )
+
+        # Удаляются пачкой через deleteMessages (см. delete_batcher)
+        for old_key in to_check:
+            msg_id = get_message_id(task_id, old_key)
+            if msg_id:
+                deleter.add(chat_id, task_id, old_key, msg_id)
+                log.debug(f"[🗑] Queued outdated notification {old_key} for {task_id} [{Path(task.file_path).stem}]")
 
-            for old_key in to_check:
-                msg_id = get_message_id(task_id, old_key)
-                if msg_id:
-                    try:
-                        await bot.delete_message(chat_id=chat_args["chat_id"], message_id=msg_id)
-                        delete_message_id(task_id, old_key)
-                        log.info(f"[🗑] Deleted outdated notification {old_key} for {task_id} [{filename}]")
-                    except Exception as e:
-                        log.warning(f"[⚠️] Could not delete old {old_key} message: {e}")
+    async def send_notification(task, key, minutes_delta, chat_args):
+        notif_type = notif_type_of(key)
+
+        task_id = task.stable_id
+        filename = Path(task.file_path).stem
+        cfg = load_config()
+        edit_mode = cfg.get("NOTIFY_MODE", "resend") == "edit" and \
+            notif_type not in cfg.get("NOTIFY_PUSH_STAGES", ["during"])
 
+        try:
             # Кнопка завершения с доп.данными
             callback_data = f"done::{task.stable_id}"
             keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("✔ Завершить", callback_data=callback_data)]])
 
-            # Отправка
-            await asyncio.sleep(random.uniform(0.2, 0.5))
-            text = format_notification_message(task, notif_type, minutes_delta)
-            sent = await bot.send_message(
-                chat_id=chat_args["chat_id"],
-                text=text,
-                message_thread_id=chat_args.get("message_thread_id"),
-                parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=keyboard
-            )
+            with SEND.span("render"):
+                text = format_notification_message(task, notif_type, minutes_delta)
+            # Одна правка вместо удаления и новой отправки
+            if edit_mode and await edit_live(task, key, notif_type, text, keyboard, chat_args):
+                return
+
+            # Удаление устаревших уведомлений этого task_id
+            with SEND.span("delete_queue"):
+                queue_outdated(task, key, notif_type, chat_args["chat_id"])
 
-            save_message_id(task_id, key, sent.message_id)
+            # Отправка (темп задаёт outbound.OutboundQueue)
+            with SEND.span("api"):
+                sent = await bot.send_message(
+                    chat_id=chat_args["chat_id"],
+                    text=text,
+                    message_thread_id=chat_args.get("message_thread_id"),
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=keyboard
+                )
+
+            with SEND.span("save"):
+                # На диск — вместе с флагом отправки (commit в Notifier.on_send_result)
+                save_message_id(task_id, key, sent.message_id, commit=False)
             log.info(f"[SENT] {notif_type.upper()} | {task.text.strip()} ({task_id}) [{filename}]")
 
         except Exception as e:
             log.error(f"[ERROR] Failed to send {notif_type} for task {task_id} [{filename}]: {e}")
             raise
 
+    async def send_digest(items, chat_args):
+        """
+        Сводка по нескольким задачам (см. digest.py): одно сообщение,
+        под ним кнопка «Done» на каждую задачу. Прошлые стадии задач
+        удаляются как обычно; message_id сводки за задачами не сохраняется —
+        следующие стадии не должны её удалять или править.
+        """
+        entries = latest_per_task(items)
+        stage = notif_type_of(entries[0].key)
+        with SEND.span("render"):
+            text = format_digest_message([(job.task, notif_type_of(job.key), job.minutes_delta) for job in entries], stage)
+            buttons = [InlineKeyboardButton(f"✔ {n}", callback_data=f"done::{job.task.stable_id}")
+                       for n, job in enumerate(entries, start=1)]
+            keyboard = InlineKeyboardMarkup([buttons[i:i + DIGEST_BUTTONS_PER_ROW]
+                                             for i in range(0, len(buttons), DIGEST_BUTTONS_PER_ROW)])
+        try:
+            with SEND.span("delete_queue"):
+                for job in items:
+                    queue_outdated(job.task, job.key, notif_type_of(job.key), chat_args["chat_id"])
+            with SEND.span("api"):
+                await bot.send_message(
+                    chat_id=chat_args["chat_id"],
+                    text=text,
+                    message_thread_id=chat_args.get("message_thread_id"),
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=keyboard
+                )
+            log.info(f"[SENT] DIGEST {stage.upper()} | {len(entries)} tasks, {len(items)} notifications")
+        except Exception as e:
+            log.error(f"[ERROR] Failed to send {stage} digest of {len(entries)} tasks: {e}")
+            raise
+
+    send_notification.deleter = deleter
+    send_notification.digest = send_digest
     return send_notification
@@ -0,0 +1,79 @@
+# snapshot.py
+"""
+Снимок для тёплого старта.
+
+При остановке и раз в SNAPSHOT_EVERY_SEC кэш разбора (scan_cache.FileEntry
+по файлам, вместе с задачами) и очередь уведомлений (due_queue.DueQueue)
+сохраняются в компактный бинарный файл: pickle + zlib. При запуске записи
+кэша проверяются по mtime/size при первом скане — перепарсятся только
+изменившиеся файлы, а очередь не планируется заново.
+
+Снимок — локальный файл самого бота (pickle доверяет содержимому);
+при любой несовместимости он просто игнорируется и старт будет холодным.
+"""
+import logging
+import pickle
+import time
+import zlib
+from dataclasses import fields
+from pathlib import Path
+from typing import Optional
+
+from models import Task
+from utils import atomic_write_bytes
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def _schema() -> tuple:
+    # Поменялись поля Task — старые объекты в снимке уже не годятся
+    return SNAPSHOT_VERSION, tuple(f.name for f in fields(Task))
+
+
+def dump_snapshot(folder: str, plan_key, entries, queue_state) -> bytes:
+    """
+    Сериализует состояние. Вызывается в потоке event loop, чтобы кэш
+    и очередь не менялись во время pickle; сжатие и запись — уже вне его.
+    """
+    return pickle.dumps({
+        "schema": _schema(),
+        "saved_at": time.time(),
+        "folder": str(folder),
+        "plan_key": plan_key,
+        "entries": entries,
+        "queue": queue_state,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_snapshot(path: Path, raw: bytes):
+    started = time.perf_counter()
+    data = zlib.compress(raw, 1)
+    atomic_write_bytes(path, data)
+    log.info(f"[snapshot] 💾 Saved {len(data) / 1024:.0f} KiB to {path} in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+def load_snapshot(path: Path, folder: str) -> Optional[dict]:
+    """
+    Снимок для этой папки или None (нет файла, другая версия, повреждён).
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    started = time.perf_counter()
+    try:
+        state = pickle.loads(zlib.decompress(path.read_bytes()))
+    except Exception as e:
+        log.warning(f"[snapshot] ⚠️ Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("schema") != _schema():
+        log.warning(f"[snapshot] ⚠️ Ignoring snapshot {path}: saved by an incompatible version")
+        return None
+    if state.get("folder") != str(folder):
+        log.warning(f"[snapshot] ⚠️ Ignoring snapshot {path}: it is for {state.get('folder')}")
+        return None
+    age = time.time() - state["saved_at"]
+    log.info(f"[snapshot] ♻️ Loaded {len(state['entries'])} files from {path} "
+             f"(saved {age / 60:.0f} min ago) in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return state
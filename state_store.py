@@ -0,0 +1,355 @@
+# state_store.py
+"""
+Хранилища состояния бота (отправленные флаги, message_id, привязка к строкам).
+
+- JsonStore: прежние sent_notifications.json / message_ids.json,
+  пишутся атомарно и только если что-то изменилось
+- SqliteStore: одна строка на запись, транзакции, WAL;
+  при первом запуске один раз импортирует JSON-файлы
+memory.py держит данные в памяти и пишет изменения в выбранное хранилище.
+"""
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple
+
+from utils import atomic_write_text
+
+log = logging.getLogger(__name__)
+
+Flags = Dict[str, Set[str]]
+MessageIds = Dict[str, Dict[str, int]]
+MessageMeta = Dict[str, Tuple[str, int]]
+Expiry = Dict[str, float]   # task_id → unix-время, после которого состояние удаляется
+# task_id → key → {"minutes_delta", "created_at", "attempts", "next_at"}: уведомления в доставке
+Outbox = Dict[str, Dict[str, dict]]
+
+
+class StateStore:
+    """
+    Интерфейс хранилища. Изменения копятся до commit().
+    """
+
+    def load_flags(self) -> Flags:
+        raise NotImplementedError
+
+    def load_messages(self) -> Tuple[MessageIds, MessageMeta]:
+        raise NotImplementedError
+
+    def load_expiry(self) -> Expiry:
+        raise NotImplementedError
+
+    def add_flag(self, task_id: str, key: str):
+        raise NotImplementedError
+
+    def replace_flags(self, flags: Flags):
+        raise NotImplementedError
+
+    def set_message_id(self, task_id: str, key: str, message_id: int):
+        raise NotImplementedError
+
+    def set_meta(self, task_id: str, file_path: str, line_num: int):
+        raise NotImplementedError
+
+    def delete_message_ids(self, items: Iterable[Tuple[str, str]]):
+        raise NotImplementedError
+
+    def set_expiry(self, task_id: str, expires_at: float):
+        raise NotImplementedError
+
+    def load_outbox(self) -> Outbox:
+        raise NotImplementedError
+
+    def put_outbox(self, task_id: str, key: str, item: dict):
+        raise NotImplementedError
+
+    def delete_outbox(self, task_id: str, key: str):
+        raise NotImplementedError
+
+    def delete_tasks(self, task_ids: Iterable[str]):
+        """Удаляет всё состояние задач: флаги, message_id, привязку, срок и outbox."""
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonStore(StateStore):
+    """
+    Совместимый с прежним форматом JSON-бэкенд.
+    Держит ссылки на словари memory.py и переписывает файл целиком,
+    но только если он «грязный», и через временный файл.
+    """
+
+    def __init__(self, flags_file: Path, message_file: Path):
+        self.flags_file = Path(flags_file)
+        self.message_file = Path(message_file)
+        self._flags: Flags = {}
+        self._ids: MessageIds = {}
+        self._meta: MessageMeta = {}
+        self._expiry: Expiry = {}
+        self._outbox: Outbox = {}
+        self._flags_dirty = False
+        self._messages_dirty = False
+
+    def load_flags(self) -> Flags:
+        if self.flags_file.exists():
+            with open(self.flags_file, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            self._flags = {task_id: set(flags) for task_id, flags in raw.items()}
+        else:
+            self._flags = {}
+            self._flags_dirty = True
+        return self._flags
+
+    def load_messages(self) -> Tuple[MessageIds, MessageMeta]:
+        if self.message_file.exists():
+            with open(self.message_file, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            self._ids = raw.get("ids", {})
+            self._meta = {k: tuple(v) for k, v in raw.get("meta", {}).items()}
+            self._expiry = raw.get("expires", {})
+            self._outbox = raw.get("outbox", {})
+        else:
+            self._ids, self._meta, self._expiry, self._outbox = {}, {}, {}, {}
+        return self._ids, self._meta
+
+    def load_expiry(self) -> Expiry:
+        # Сроки лежат в message_ids.json рядом с ids/meta и читаются вместе с ними
+        return self._expiry
+
+    def add_flag(self, task_id: str, key: str):
+        self._flags.setdefault(task_id, set()).add(key)
+        self._flags_dirty = True
+
+    def replace_flags(self, flags: Flags):
+        self._flags = flags
+        self._flags_dirty = True
+
+    def set_message_id(self, task_id: str, key: str, message_id: int):
+        self._ids.setdefault(task_id, {})[key] = message_id
+        self._messages_dirty = True
+
+    def set_meta(self, task_id: str, file_path: str, line_num: int):
+        self._meta[task_id] = (file_path, line_num)
+        self._messages_dirty = True
+
+    def delete_message_ids(self, items: Iterable[Tuple[str, str]]):
+        # Словари общие с memory.py — запись там уже могла быть удалена
+        for task_id, key in items:
+            self._ids.get(task_id, {}).pop(key, None)
+            self._messages_dirty = True
+
+    def set_expiry(self, task_id: str, expires_at: float):
+        self._expiry[task_id] = expires_at
+        self._messages_dirty = True
+
+    def load_outbox(self) -> Outbox:
+        # Тоже лежит в message_ids.json и читается в load_messages
+        return self._outbox
+
+    def put_outbox(self, task_id: str, key: str, item: dict):
+        self._outbox.setdefault(task_id, {})[key] = item
+        self._messages_dirty = True
+
+    def delete_outbox(self, task_id: str, key: str):
+        items = self._outbox.get(task_id, {})
+        items.pop(key, None)
+        if not items:
+            self._outbox.pop(task_id, None)
+        self._messages_dirty = True
+
+    def delete_tasks(self, task_ids: Iterable[str]):
+        for task_id in task_ids:
+            self._flags.pop(task_id, None)
+            self._ids.pop(task_id, None)
+            self._meta.pop(task_id, None)
+            self._expiry.pop(task_id, None)
+            self._outbox.pop(task_id, None)
+        self._flags_dirty = self._messages_dirty = True
+
+    def commit(self):
+        if self._flags_dirty:
+            atomic_write_text(self.flags_file, json.dumps(
+                {k: sorted(v) for k, v in self._flags.items()}, indent=2, ensure_ascii=False))
+            self._flags_dirty = False
+            log.info(f"[store] 💾 Saved sent flags to {self.flags_file}")
+        if self._messages_dirty:
+            atomic_write_text(self.message_file, json.dumps(
+                {"ids": self._ids, "meta": self._meta, "expires": self._expiry, "outbox": self._outbox}, indent=2, ensure_ascii=False))
+            self._messages_dirty = False
+            log.info(f"[store] 💾 Saved message IDs to {self.message_file}")
+
+
+class SqliteStore(StateStore):
+    """
+    SQLite-бэкенд: каждая отправка — вставка одной строки и короткая транзакция.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sent_flags (
+            task_id TEXT NOT NULL,
+            key     TEXT NOT NULL,
+            PRIMARY KEY (task_id, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS message_ids (
+            task_id    TEXT NOT NULL,
+            key        TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (task_id, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS message_meta (
+            task_id   TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            line_num  INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS task_expiry (
+            task_id    TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            task_id       TEXT NOT NULL,
+            key           TEXT NOT NULL,
+            minutes_delta INTEGER NOT NULL,
+            created_at    REAL NOT NULL,
+            attempts      INTEGER NOT NULL,
+            next_at       REAL NOT NULL,
+            PRIMARY KEY (task_id, key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS store_meta (
+            name  TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_file: Path, legacy_flags_file: Path = None, legacy_message_file: Path = None):
+        self.db_file = Path(db_file)
+        self.conn = sqlite3.connect(self.db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._import_legacy(legacy_flags_file, legacy_message_file)
+
+    def _import_legacy(self, flags_file: Path, message_file: Path):
+        """
+        Однократный импорт прежних JSON-файлов (отмечается в store_meta).
+        """
+        done = self.conn.execute("SELECT value FROM store_meta WHERE name = 'json_imported'").fetchone()
+        if done:
+            return
+
+        legacy = JsonStore(flags_file or Path("-"), message_file or Path("-"))
+        flags, (ids, meta), expiry, outbox = {}, ({}, {}), {}, {}
+        try:
+            if flags_file and Path(flags_file).exists():
+                flags = legacy.load_flags()
+            if message_file and Path(message_file).exists():
+                ids, meta = legacy.load_messages()
+                expiry = legacy.load_expiry()
+                outbox = legacy.load_outbox()
+        except Exception as e:
+            # Без отметки: импорт повторится при следующем запуске, когда файл починят
+            log.error(f"[store] ❌ Could not read legacy JSON state, import postponed to the next start: {e}")
+            return
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sent_flags VALUES (?, ?)",
+                [(t, k) for t, keys in flags.items() for k in keys])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO message_ids VALUES (?, ?, ?)",
+                [(t, k, m) for t, keys in ids.items() for k, m in keys.items()])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO message_meta VALUES (?, ?, ?)",
+                [(t, fp, ln) for t, (fp, ln) in meta.items()])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO task_expiry VALUES (?, ?)", list(expiry.items()))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?, ?)",
+                [(t, k, item["minutes_delta"], item["created_at"], item["attempts"], item["next_at"])
+                 for t, items in outbox.items() for k, item in items.items()])
+            self.conn.execute("INSERT INTO store_meta VALUES ('json_imported', '1')")
+
+        if flags or ids or meta or expiry or outbox:
+            log.info(f"[store] 📥 Imported {len(flags)} flagged tasks, {len(ids)} message sets, "
+                     f"{len(expiry)} expiry times and {sum(map(len, outbox.values()))} outbox entries from JSON")
+
+    def load_flags(self) -> Flags:
+        flags: Flags = {}
+        for task_id, key in self.conn.execute("SELECT task_id, key FROM sent_flags"):
+            flags.setdefault(task_id, set()).add(key)
+        return flags
+
+    def load_messages(self) -> Tuple[MessageIds, MessageMeta]:
+        ids: MessageIds = {}
+        for task_id, key, message_id in self.conn.execute("SELECT task_id, key, message_id FROM message_ids"):
+            ids.setdefault(task_id, {})[key] = message_id
+        meta = {t: (fp, ln) for t, fp, ln in self.conn.execute("SELECT * FROM message_meta")}
+        return ids, meta
+
+    def load_expiry(self) -> Expiry:
+        return dict(self.conn.execute("SELECT task_id, expires_at FROM task_expiry"))
+
+    def add_flag(self, task_id: str, key: str):
+        self.conn.execute("INSERT OR IGNORE INTO sent_flags VALUES (?, ?)", (task_id, key))
+
+    def replace_flags(self, flags: Flags):
+        self.conn.execute("DELETE FROM sent_flags")
+        self.conn.executemany("INSERT INTO sent_flags VALUES (?, ?)",
+                              [(t, k) for t, keys in flags.items() for k in keys])
+
+    def set_message_id(self, task_id: str, key: str, message_id: int):
+        self.conn.execute("INSERT OR REPLACE INTO message_ids VALUES (?, ?, ?)", (task_id, key, message_id))
+
+    def set_meta(self, task_id: str, file_path: str, line_num: int):
+        self.conn.execute("INSERT OR REPLACE INTO message_meta VALUES (?, ?, ?)", (task_id, file_path, line_num))
+
+    def delete_message_ids(self, items: Iterable[Tuple[str, str]]):
+        self.conn.executemany("DELETE FROM message_ids WHERE task_id = ? AND key = ?", list(items))
+
+    def set_expiry(self, task_id: str, expires_at: float):
+        self.conn.execute("INSERT OR REPLACE INTO task_expiry VALUES (?, ?)", (task_id, expires_at))
+
+    def load_outbox(self) -> Outbox:
+        outbox: Outbox = {}
+        for task_id, key, minutes_delta, created_at, attempts, next_at in self.conn.execute(
+                "SELECT task_id, key, minutes_delta, created_at, attempts, next_at FROM outbox"):
+            outbox.setdefault(task_id, {})[key] = {
+                "minutes_delta": minutes_delta, "created_at": created_at,
+                "attempts": attempts, "next_at": next_at,
+            }
+        return outbox
+
+    def put_outbox(self, task_id: str, key: str, item: dict):
+        self.conn.execute("INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?, ?)", (
+            task_id, key, item["minutes_delta"], item["created_at"], item["attempts"], item["next_at"]))
+
+    def delete_outbox(self, task_id: str, key: str):
+        self.conn.execute("DELETE FROM outbox WHERE task_id = ? AND key = ?", (task_id, key))
+
+    def delete_tasks(self, task_ids: Iterable[str]):
+        rows = [(t,) for t in task_ids]
+        for table in ("sent_flags", "message_ids", "message_meta", "task_expiry", "outbox"):
+            self.conn.executemany(f"DELETE FROM {table} WHERE task_id = ?", rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(backend: str, flags_file: Path, message_file: Path, db_file: Path) -> StateStore:
+    """
+    backend: "json" (прежние файлы) или "sqlite".
+    """
+    if backend == "sqlite":
+        log.info(f"[store] 🗄 Using SQLite state at {db_file}")
+        return SqliteStore(db_file, flags_file, message_file)
+    if backend != "json":
+        log.warning(f"[store] ⚠️ Unknown STATE_BACKEND '{backend}', falling back to json")
+    return JsonStore(flags_file, message_file)
@@ -1,37 +1,38 @@
-import re
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from typing import List, Tuple
+
 from models import Task
-from parser import parse_task_lines
+from parser import PRIORITY_ICONS, tokenize_line
+from utils import max_offset
+from scan_cache import ScanCache
+
+# === Кэш разбора файлов, живёт между тиками ===
+_scan_cache = ScanCache()
+
+def analyze_raw_text(raw_text: str) -> Tuple[str, bool, str]:
+    """
+    Разбор строки задачи: (cleaned_text, has_priority, priority_emoji).
+    Вызывается один раз при создании Task — результат хранится в самой задаче.
+    """
+    tokens = tokenize_line(raw_text)
+    has_priority = tokens.priority is not None
+    priority_emoji = tokens.priority if has_priority else "⏫"  # дефолт приоритета
+    return tokens.cleaned, has_priority, priority_emoji
 
-# === Эмоджи, обозначающие приоритет задачи ===
-PRIORITY_ICONS = ["⏫", "⏬", "🔺", "🔼", "🔽"]
 
 def analyze_task_text(task: Task) -> dict:
     """
-    Разбирает текст задачи и возвращает словарь с информацией:
+    Возвращает словарь с информацией о задаче (из полей, посчитанных при создании):
     - cleaned_text: текст без временных тегов и приоритетов
     - has_priority: есть ли приоритетный значок
     - priority_emoji: какой значок найден (или дефолт)
     - time_range: форматированный диапазон времени
     """
-    raw_text = task.text
-
-    # Поиск одного из приоритетных символов
-    priority_match = re.search(r"[" + "".join(PRIORITY_ICONS) + r"]", raw_text)
-    has_priority = bool(priority_match)
-    priority_emoji = priority_match.group(0) if has_priority else "⏫"  # дефолт приоритета
-
-    # Очистка текста от приоритетных символов и временных тегов
-    cleaned_text = raw_text
-    cleaned_text = re.sub(r"[" + "".join(PRIORITY_ICONS) + r"]", "", cleaned_text)
-    cleaned_text = re.sub(r"\[startTime::.*?\]", "", cleaned_text)
-    cleaned_text = re.sub(r"\[endTime::.*?\]", "", cleaned_text)
-    cleaned_text = cleaned_text.strip()
-
     return {
-        "cleaned_text": cleaned_text,
-        "has_priority": has_priority,
-        "priority_emoji": priority_emoji,
+        "cleaned_text": task.cleaned_text,
+        "has_priority": task.has_priority,
+        "priority_emoji": task.priority_emoji,
         "time_range": task.get_time_range()
     }
 
@@ -53,15 +54,54 @@ def format_task_for_telegram(task: Task, prefix: str = "") -> str:
     return message
 
 
-def load_tasks_from_folder(folder_path: str) -> list[Task]:
+def active_date_window(now: datetime, warn_before: List[str], warn_during: List[str],
+                       warn_overdue: List[str], override_cap: timedelta = timedelta()) -> Tuple[date, date]:
+    """
+    Диапазон дат заметок, задачи из которых ещё могут дать уведомление:
+    [сегодня − макс. смещение после начала/конца − 1 день, сегодня + макс. смещение до начала].
+    Лишний день слева — потому что задача может идти до конца своих суток.
+    override_cap — предел смещений [remind:: ...] и т.п. в самих задачах:
+    их заметки должны попасть в окно, даже если глобальные смещения короче.
+    """
+    max_before = max(max_offset(warn_before), override_cap)
+    max_after = max(max_offset(warn_during), max_offset(warn_overdue), override_cap)
+    return (now - max_after - timedelta(days=1)).date(), (now + max_before).date()
+
+
+def load_tasks_from_folder(folder_path: str, changed_paths=None, window=None) -> list[Task]:
     """
     Загружает задачи из всех Markdown-файлов в указанной папке.
+    Неизменившиеся файлы берутся из кэша разбора без повторного чтения.
+    Если передан changed_paths (от наблюдателя), перепроверяются только они.
+    window — диапазон дат (см. active_date_window); заметки вне его пропускаются.
     """
     path = Path(folder_path)
     if not path.exists() or not path.is_dir():
         raise ValueError(f"Invalid folder path: {folder_path}")
 
-    all_tasks = []
-    for file_path in path.glob("*.md"):
-        all_tasks.extend(parse_task_lines(str(file_path)))
-    return all_tasks
+    return _scan_cache.refresh(folder_path, changed_paths, window)
+
+
+async def load_tasks_from_folder_async(folder_path: str, changed_paths=None, window=None,
+                                       executor=None) -> list[Task]:
+    """
+    Асинхронный вариант load_tasks_from_folder: файлы читаются и разбираются
+    в executor (см. scan_cache.create_scan_executor), event loop не блокируется.
+    """
+    path = Path(folder_path)
+    if not path.is_dir():
+        raise ValueError(f"Invalid folder path: {folder_path}")
+
+    return await _scan_cache.refresh_async(folder_path, changed_paths, window, executor)
+
+
+def scan_cache() -> ScanCache:
+    """Общий кэш разбора (для снимка тёплого старта, см. snapshot.py)."""
+    return _scan_cache
+
+
+def scan_generation() -> int:
+    """
+    Номер версии набора задач: меняется, только если что-то перепарсилось.
+    """
+    return _scan_cache.generation
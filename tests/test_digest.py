@@ -0,0 +1,35 @@
+from digest import DIGEST_KEY, coalesce, latest_per_task
+from outbound import OutboundJob
+from parser import parse_task_content
+
+NOTE = "/vault/2030-01-02.md"
+CHAT = {"chat_id": 1}
+TOPIC = {"chat_id": 1, "message_thread_id": 7}
+
+
+def job(n: int, key: str = "overdue1", chat_args: dict = CHAT) -> OutboundJob:
+    [task] = parse_task_content(NOTE, [f"- [ ] задача {n} [startTime:: 10:00]"])
+    return OutboundJob(task, key, 5, chat_args)
+
+
+def test_small_batches_are_sent_as_is():
+    jobs = [job(n) for n in range(3)]
+    assert coalesce(jobs, threshold=3) is jobs
+    assert coalesce(jobs * 2, threshold=0) == jobs * 2
+
+
+def test_groups_above_the_threshold_become_digests():
+    overdue = [job(n) for n in range(5)] + [job(0, "overdue2")]
+    before = [job(n, "before1") for n in range(2)]
+    topic = [job(n, chat_args=TOPIC) for n in range(2)]
+
+    result = coalesce(overdue + before + topic, threshold=3, max_items=3)
+
+    digests = [j for j in result if j.items is not None]
+    assert [(d.key, len(latest_per_task(d.items))) for d in digests] == [(f"{DIGEST_KEY}:overdue", 3),
+                                                                         (f"{DIGEST_KEY}:overdue", 2)]
+    # Обе просроченные стадии задачи 0 — в одной сводке, по задаче не больше max_items
+    assert [j.key for j in digests[0].items] == ["overdue1", "overdue2", "overdue1", "overdue1"]
+    assert latest_per_task(digests[0].items)[0].key == "overdue2"
+    # Другие стадии и другой топик под порогом — по отдельности
+    assert [j for j in result if j.items is None] == before + topic
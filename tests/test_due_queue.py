@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+from due_queue import DueQueue
+from notification_logic import compile_rules
+from parser import parse_task_content
+
+RULES = compile_rules(["15m"], ["0m"], ["5m"], timedelta(hours=24))
+NOTE = "/vault/2030-01-02.md"
+
+
+def parse(line: str):
+    [task] = parse_task_content(NOTE, [line])
+    return task
+
+
+def pending(queue: DueQueue):
+    return sorted((when.strftime("%H:%M"), key) for when, _task, key, _m in queue.pop_due(datetime.max))
+
+
+def test_editing_overrides_of_a_queued_task_replans_it():
+    queue = DueQueue(RULES.plan)
+    before = parse("- [ ] встреча [startTime:: 10:00] [endTime:: 11:00]")
+    queue.sync([before], {}, generation=1)
+
+    after = parse("- [ ] встреча [startTime:: 10:00] [endTime:: 11:00] [remind:: 60m] [overdue:: none]")
+    assert after.stable_id == before.stable_id
+    queue.sync([after], {}, generation=2)
+
+    assert pending(queue) == [("09:00", "before1"), ("10:00", "during1")]
+
+
+def test_unchanged_overrides_keep_the_plan_and_sent_keys():
+    queue = DueQueue(RULES.plan)
+    task = parse("- [ ] звонок [startTime:: 10:00] [remind:: 30m]")
+    queue.sync([task], {}, generation=1)
+    assert [key for _when, _task, key, _m in queue.pop_due(datetime(2030, 1, 2, 9, 30))] == ["before1"]
+
+    # Строка сдвинулась, поля те же — уже извлечённое не возвращается
+    moved = parse_task_content(NOTE, ["\n", "- [ ] звонок [startTime:: 10:00] [remind:: 30m]"])[0]
+    queue.sync([moved], {task.stable_id: {"before1"}}, generation=2)
+    assert pending(queue) == [("10:00", "during1"), ("10:20", "overdue1")]
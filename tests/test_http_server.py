@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from http_server import HttpResponse, HttpServer
+
+
+async def echo(request):
+    return HttpResponse.json({"method": request.method, "path": request.path, "query": request.query,
+                              "body": request.body.decode()})
+
+
+async def exchange(server: HttpServer, raw: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(), 5)
+    finally:
+        writer.close()
+
+
+def request(raw: bytes, **limits) -> bytes:
+    async def scenario():
+        server = HttpServer(echo, max_body=64, max_headers=4, max_line=128, **limits)
+        await server.start()
+        try:
+            return await exchange(server, raw)
+        finally:
+            await server.close()
+
+    return asyncio.run(scenario())
+
+
+def status_of(response: bytes) -> int:
+    return int(response.split(b" ", 2)[1])
+
+
+def test_keep_alive_requests_share_a_connection():
+    response = request(b"POST /a?x=1 HTTP/1.1\r\nContent-Length: 2\r\n\r\nhi"
+                       b"GET /b HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert response.count(b"HTTP/1.1 200 OK") == 2
+    assert b'"path": "/a", "query": {"x": "1"}, "body": "hi"' in response
+    assert response.rstrip().endswith(b'"path": "/b", "query": {}, "body": ""}')
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: 1e3\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nhi\r\n0\r\n\r\n", 411),
+    (b"POST / HTTP/1.1\r\nContent-Length: 65\r\n\r\n" + b"x" * 65, 413),
+    (b"GET /" + b"a" * 200 + b" HTTP/1.1\r\n\r\n", 431),
+    (b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n", 431),
+    (b"GET / HTTP/1.1\r\n" + b"".join(b"X-%d: 1\r\n" % n for n in range(5)) + b"\r\n", 431),
+])
+def test_malformed_requests_are_rejected_and_the_connection_closed(raw, status):
+    response = request(raw)
+    assert status_of(response) == status
+    assert b"Connection: close" in response
+    # Ответ ровно один: остаток запроса не разбирается как следующий
+    assert response.count(b"HTTP/1.1 ") == 1
+
+
+def test_close_drops_idle_keep_alive_connections():
+    async def scenario():
+        server = HttpServer(echo)
+        await server.start()
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"GET / HTTP/1.1\r\n\r\n")
+        await reader.readuntil(b'""}')
+        await asyncio.wait_for(server.close(), 1)
+        assert await asyncio.wait_for(reader.read(), 1) == b""
+        writer.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime, timedelta
+
+from notification_logic import compile_rules
+from parser import parse_task_content
+from retention import RetentionPolicy
+from task_analyzer import active_date_window
+
+
+def test_overrides_beyond_the_cap_are_rejected():
+    rules = compile_rules(["15m"], ["0m"], ["5m"], timedelta(hours=6))
+    [task] = parse_task_content("/vault/2030-01-02.md", [
+        "- [ ] отчёт [startTime:: 10:00] [endTime:: 11:00] [remind:: 300m] [overdue:: 2880m]"])
+
+    keys = {key: when for when, key, _prefix, _m in rules.plan(task)}
+    assert keys["before1"] == datetime(2030, 1, 2, 5, 0)
+    # 2 суток после конца — дальше окна и срока хранения: остаются глобальные смещения
+    assert keys["overdue1"] == datetime(2030, 1, 2, 11, 5)
+
+
+def test_window_and_retention_cover_the_cap():
+    evening = datetime(2030, 1, 1, 20, 0)
+    assert active_date_window(evening, ["15m"], ["0m"], ["5m"])[1] == evening.date()
+    # [remind:: 300m] у задачи в 01:00 завтрашней заметки
+    assert active_date_window(evening, ["15m"], ["0m"], ["5m"], timedelta(hours=6))[1] == datetime(2030, 1, 2).date()
+
+    policy = RetentionPolicy.from_config({"override_max_offset": "48h", "retention_ttl_sec": 0}, ["5m"])
+    assert policy.horizon == timedelta(hours=48)
+
+
+def test_override_tables_are_cached_and_rejections_logged_once(caplog):
+    rules = compile_rules(["15m"], ["0m"], ["5m"], timedelta(hours=6))
+    [task] = parse_task_content("/vault/2030-01-03.md", [
+        "- [ ] созвон [startTime:: 10:00] [remind:: 30m] [during:: soon]"])
+    [twin] = parse_task_content("/vault/2030-01-03.md", [
+        "- [ ] другой созвон [startTime:: 12:00] [remind:: 30m] [during:: soon]"])
+
+    with caplog.at_level(logging.WARNING, logger="notification_logic"):
+        table = rules.for_task(task)
+        assert rules.for_task(task) is table
+        rules.plan(task)
+        assert rules.for_task(twin) is table
+
+    assert table.before == ("30m",) and table.during == ("0m",)
+    # Один раз на задачу, а не на каждое перепланирование
+    assert [r.getMessage() for r in caplog.records] == [
+        "[rules] ⚠️ Ignoring invalid [during:: soon] in /vault/2030-01-03.md:0"] * 2
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import shutil
+from datetime import date
+
+import pytest
+
+import notifier
+import utils
+from notifier import Notifier
+from watcher import InotifyWatcher, create_watcher
+
+
+@pytest.fixture
+def vault(tmp_path, monkeypatch):
+    folder = tmp_path / "vault"
+    folder.mkdir()
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "TELEGRAM_TOKEN": "t", "CHAT_ID": 1, "TASKS_FOLDER": str(folder),
+        # Без смещений ничего не планируется и не отправляется — проверяется только скан
+        "default_warn_before_start": [], "default_warn_during": [], "default_warn_overdue": [],
+        "SNAPSHOT_FILE": "",
+    }), encoding="utf-8")
+    monkeypatch.setattr(utils, "CONFIG_PATH", config)
+    monkeypatch.chdir(tmp_path)
+    return folder
+
+
+def write_note(folder, *lines):
+    (folder / f"{date.today():%Y-%m-%d}.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize("mode", ["inotify", "poll"])
+def test_vault_removed_and_recreated_under_running_watcher(vault, mode):
+    if mode == "inotify" and not InotifyWatcher.available():
+        pytest.skip("inotify is not available")
+
+    async def send(**kwargs):
+        raise AssertionError("nothing is due")
+
+    async def scenario():
+        write_note(vault, "- [ ] первая [startTime:: 10:00]")
+        bot = Notifier(str(vault), [], [], [], send, sent_flags={})
+        watcher = await create_watcher(str(vault), mode=mode, debounce=0.05, poll_interval=0.05)
+        if mode == "inotify":
+            watcher.rewatch_interval = 0.05
+        try:
+            await bot.check_tasks_once()
+            assert len(notifier.task_list) == 1
+
+            shutil.rmtree(vault)
+            changed = await watcher.wait_for_changes(5)
+            assert changed is None
+            # Папки нет: тик не падает, прежние задачи остаются
+            await bot.check_tasks_once(changed, rescan=True)
+            assert len(notifier.task_list) == 1
+            await bot.check_tasks_once(set(), rescan=False)
+            assert len(notifier.task_list) == 1
+
+            vault.mkdir()
+            write_note(vault, "- [ ] первая [startTime:: 10:00]", "- [ ] вторая [startTime:: 11:00]")
+            changed = await watcher.wait_for_changes(5)
+            assert changed is None
+            await bot.check_tasks_once(changed, rescan=True)
+            assert sorted(task.cleaned_text.split()[-1] for task in notifier.task_list) == ["вторая", "первая"]
+        finally:
+            watcher.close()
+
+    asyncio.run(scenario())
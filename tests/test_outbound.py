@@ -0,0 +1,192 @@
+import asyncio
+import json
+from datetime import date
+
+import utils
+from notifier import Notifier
+from outbound import OutboundJob, OutboundQueue
+from parser import parse_task_content
+
+NOTE = "/vault/2030-01-02.md"
+
+
+def task(name: str):
+    [parsed] = parse_task_content(NOTE, [f"- [ ] {name} [startTime:: 10:00]"])
+    return parsed
+
+
+def job(name: str, key: str = "before1", chat_id: int = 1) -> OutboundJob:
+    return OutboundJob(task(name), key, 0, {"chat_id": chat_id})
+
+
+class Throttled(Exception):
+    """Как telegram.error.RetryAfter: outbound смотрит только на retry_after."""
+    retry_after = 0.3
+
+
+async def run(queue: OutboundQueue, jobs):
+    await queue.start()
+    try:
+        for item in jobs:
+            queue.submit(item)
+        await queue.join()
+    finally:
+        await queue.close()
+
+
+def test_jobs_of_one_task_are_sent_in_order_while_tasks_overlap():
+    events = []
+
+    async def send(task, key, minutes_delta, chat_args):
+        events.append(("start", task.cleaned_text, key))
+        await asyncio.sleep(0.01)
+        events.append(("end", task.cleaned_text, key))
+
+    queue = OutboundQueue(send, lambda job, error: None, workers=4, global_rate=1000, chat_rate_per_min=60000,
+                          chat_burst=100)
+    jobs = [job("a", "before1"), job("a", "during1"), job("b", "before1"), job("a", "overdue1")]
+    asyncio.run(run(queue, jobs))
+
+    a_events = [(kind, key) for kind, name, key in events if name.endswith("a")]
+    assert a_events == [("start", "before1"), ("end", "before1"), ("start", "during1"), ("end", "during1"),
+                        ("start", "overdue1"), ("end", "overdue1")]
+    # Другая задача не ждёт очереди первой
+    assert events.index(("start", "- [ ] b", "before1")) < events.index(("end", "- [ ] a", "before1"))
+
+
+def sent_at(jobs, **limits):
+    times = {}
+
+    async def send(task, key, minutes_delta, chat_args):
+        times[task.cleaned_text.split()[-1]] = asyncio.get_running_loop().time()
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        await run(OutboundQueue(send, lambda job, error: None, workers=8, **limits), jobs)
+        return {name: at - started for name, at in times.items()}
+
+    return asyncio.run(scenario())
+
+
+def test_chat_bucket_limits_one_chat_only():
+    times = sent_at([job("a"), job("b"), job("c"), job("d", chat_id=2)],
+                    global_rate=1000, chat_rate_per_min=300, chat_burst=2)
+    # 300/мин = 5/с: после двух токенов запаса третий — через ~0.2 с
+    assert times["a"] < 0.1 and times["b"] < 0.1
+    assert times["c"] >= 0.15
+    assert times["d"] < 0.1
+
+
+def test_global_bucket_limits_all_chats():
+    times = sent_at([job(name, chat_id=n) for n, name in enumerate("abcde")],
+                    global_rate=4, chat_rate_per_min=60000, chat_burst=100)
+    assert sorted(times.values())[3] < 0.1
+    assert sorted(times.values())[4] >= 0.2
+
+
+def test_retry_after_holds_the_chat():
+    results = []
+    times = {}
+
+    async def send(task, key, minutes_delta, chat_args):
+        name = task.cleaned_text.split()[-1]
+        times[name] = asyncio.get_running_loop().time()
+        if name == "a":
+            raise Throttled()
+
+    async def scenario():
+        queue = OutboundQueue(send, lambda job, error: results.append((job.key, error)), workers=2,
+                              global_rate=1000, chat_rate_per_min=60000, chat_burst=100)
+        await queue.start()
+        try:
+            queue.submit(job("a"))
+            await queue.join()
+            queue.submit(job("b"))
+            queue.submit(job("c", chat_id=2))
+            await queue.join()
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+    assert isinstance(results[0][1], Throttled)
+    # Чат 1 придержан на retry_after, чат 2 — нет
+    assert times["b"] - times["a"] >= 0.25
+    assert times["c"] - times["a"] < 0.1
+
+
+def test_notification_in_flight_is_not_submitted_again(tmp_path, monkeypatch):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / f"{date.today():%Y-%m-%d}.md").write_text(
+        "- [ ] давно пора [startTime:: 00:00] [endTime:: 00:00]\n", encoding="utf-8")
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "TELEGRAM_TOKEN": "t", "CHAT_ID": 1, "TASKS_FOLDER": str(vault),
+        "default_warn_before_start": [], "default_warn_during": [], "default_warn_overdue": ["0m"],
+        "SNAPSHOT_FILE": "",
+    }), encoding="utf-8")
+    monkeypatch.setattr(utils, "CONFIG_PATH", config)
+    monkeypatch.chdir(tmp_path)
+    sent = []
+
+    async def scenario():
+        delivered = asyncio.Event()
+
+        async def send(task, key, minutes_delta, chat_args):
+            sent.append(key)
+            await delivered.wait()
+
+        bot = Notifier(str(vault), [], [], ["0m"], send, sent_flags={})
+        await bot.start()
+        try:
+            await bot.check_tasks_once()
+            await asyncio.sleep(0.01)
+            assert sent == ["overdue1"]
+            # Перепланирование снова выдаёт ключ, но он ещё в работе
+            bot.queue.rebuild(bot.sent_flags)
+            await bot.check_tasks_once(rescan=False)
+            delivered.set()
+            await bot.outbound.join()
+        finally:
+            await bot.close()
+        assert sent == ["overdue1"]
+        assert "overdue1" in bot.sent_flags[next(iter(bot.sent_flags))]
+
+    asyncio.run(scenario())
+
+
+def test_digest_waits_for_every_task_it_covers():
+    events = []
+    gates = {}
+
+    async def send(task, key, minutes_delta, chat_args):
+        name = task.cleaned_text.split()[-1]
+        events.append(("start", name))
+        await gates.setdefault(name, asyncio.Event()).wait()
+        events.append(("end", name))
+
+    async def send_digest(items, chat_args):
+        events.append(("digest", sorted(item.task.cleaned_text.split()[-1] for item in items)))
+
+    async def scenario():
+        queue = OutboundQueue(send, lambda job, error: None, workers=4, global_rate=1000,
+                              chat_rate_per_min=60000, chat_burst=100, send_digest=send_digest)
+        await queue.start()
+        try:
+            queue.submit(job("z"))
+            items = [job("z", "overdue1"), job("a", "overdue1")]
+            queue.submit(OutboundJob(items[0].task, "digest:overdue", 0, {"chat_id": 1}, items=items))
+            queue.submit(job("a", "overdue2"))
+            await asyncio.sleep(0.05)
+            # «a» свободна, но overdue2 ждёт сводку с её overdue1, а сводка — «z»
+            assert events == [("start", "z")]
+            assert len(queue) == 2
+            gates["z"].set()
+            gates["a"] = asyncio.Event()
+            gates["a"].set()
+            await queue.join()
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+    assert events == [("start", "z"), ("end", "z"), ("digest", ["a", "z"]), ("start", "a"), ("end", "a")]
@@ -0,0 +1,214 @@
+import time
+import types
+
+import pytest
+
+import memory
+import notifier
+from notifier import Notifier
+from outbound import OutboundJob
+from outbox import RetryPolicy
+from parser import parse_task_content
+from state_store import StateStore
+
+NOTE = "/vault/2030-01-02.md"
+CONFIG = {
+    "TELEGRAM_TOKEN": "t", "CHAT_ID": 1, "TASKS_FOLDER": "/vault",
+    "default_warn_before_start": ["15m"], "default_warn_during": ["0m"], "default_warn_overdue": ["5m"],
+    "outbox_retry_base_sec": 2.0, "outbox_retry_cap_sec": 60.0, "outbox_stale_sec": 600.0,
+    "SNAPSHOT_FILE": "",
+}
+
+
+class Throttled(Exception):
+    retry_after = 30
+
+
+class Highest:
+    """rng для RetryPolicy.delay: всегда верхняя граница джиттера."""
+
+    @staticmethod
+    def uniform(a, b):
+        return b
+
+
+class Lowest:
+    @staticmethod
+    def uniform(a, b):
+        return a
+
+
+class FakeStore(StateStore):
+    """Держит состояние в памяти; committed — то, что было бы на диске."""
+
+    def __init__(self):
+        self.outbox = {}
+        self.flags = {}
+        self.committed = {"outbox": {}, "flags": {}}
+        self.commits = 0
+
+    def add_flag(self, task_id, key):
+        self.flags.setdefault(task_id, set()).add(key)
+
+    def replace_flags(self, flags):
+        self.flags = {task_id: set(keys) for task_id, keys in flags.items()}
+
+    def set_expiry(self, task_id, expires_at):
+        pass
+
+    def put_outbox(self, task_id, key, item):
+        self.outbox.setdefault(task_id, {})[key] = dict(item)
+
+    def delete_outbox(self, task_id, key):
+        self.outbox.get(task_id, {}).pop(key, None)
+        if not self.outbox.get(task_id, True):
+            del self.outbox[task_id]
+
+    def commit(self):
+        self.commits += 1
+        self.committed = {
+            "outbox": {task_id: dict(items) for task_id, items in self.outbox.items()},
+            "flags": {task_id: set(keys) for task_id, keys in self.flags.items()},
+        }
+
+
+def task(name: str):
+    [parsed] = parse_task_content(NOTE, [f"- [ ] {name} [startTime:: 10:00]"])
+    return parsed
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(notifier, "time", types.SimpleNamespace(time=lambda: clock.now,
+                                                                perf_counter=time.perf_counter))
+    return clock
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(memory, "_store", store)
+    monkeypatch.setattr(memory, "_memory", {})
+    monkeypatch.setattr(memory, "_expiry", {})
+    monkeypatch.setattr(memory, "_outbox", {})
+    return store
+
+
+@pytest.fixture
+def bot(clock, store, monkeypatch):
+    async def send(task, key, minutes_delta, chat_args):
+        raise AssertionError("jobs are collected, not sent")
+
+    monkeypatch.setattr(notifier, "task_index", {})
+    bot = Notifier("/vault", CONFIG["default_warn_before_start"], CONFIG["default_warn_during"],
+                   CONFIG["default_warn_overdue"], send, sent_flags={}, config=CONFIG)
+    bot.scheduled = []
+    bot.dispatched = []
+    bot._schedule_retry = lambda keys, delay: bot.scheduled.append((sorted(keys), delay))
+    bot.dispatch = bot.dispatched.extend
+    return bot
+
+
+def put(task_id, key, created_at, attempts=0, next_at=None):
+    memory.outbox_put([(task_id, key, {"minutes_delta": 5, "created_at": created_at, "attempts": attempts,
+                                       "next_at": created_at if next_at is None else next_at})])
+
+
+def test_retry_policy_prefers_retry_after_over_backoff():
+    policy = RetryPolicy(base=2.0, cap=60.0, stale_after=600.0)
+    assert policy.delay(1, Throttled(), rng=Lowest) == 30
+    assert policy.delay(7, Throttled(), rng=Highest) == 32
+    # Экспонента: [backoff/2, backoff], backoff = base·2^(attempts-1), не больше cap
+    assert [policy.delay(n, RuntimeError(), rng=Highest) for n in (1, 2, 3, 10)] == [2, 4, 8, 60]
+    assert [policy.delay(n, RuntimeError(), rng=Lowest) for n in (1, 2, 3, 10)] == [1, 2, 4, 30]
+    assert not policy.is_stale(0, 600) and policy.is_stale(0, 601)
+
+
+def test_failed_send_is_rescheduled_and_committed(bot, store, clock):
+    job = OutboundJob(task("a"), "before1", 15, bot.chat_args)
+    task_id = job.task.stable_id
+    put(task_id, "before1", clock.now)
+    bot.in_flight.add((task_id, "before1"))
+
+    bot.on_send_result(job, Throttled())
+    entry = store.committed["outbox"][task_id]["before1"]
+    assert entry["attempts"] == 1
+    assert 30 <= entry["next_at"] - clock.now <= 32
+    [(keys, delay)] = bot.scheduled
+    assert keys == [(task_id, "before1")] and delay == pytest.approx(entry["next_at"] - clock.now)
+    assert (task_id, "before1") in bot.in_flight
+
+    clock.now += 40
+    bot.on_send_result(job, RuntimeError("network"))
+    entry = store.committed["outbox"][task_id]["before1"]
+    assert entry["attempts"] == 2
+    assert 2 <= entry["next_at"] - clock.now <= 4
+
+
+def test_delivery_clears_the_outbox_in_one_commit(bot, store, clock):
+    job = OutboundJob(task("a"), "during1", 0, bot.chat_args)
+    task_id = job.task.stable_id
+    memory.outbox_put([(task_id, "during1", {"minutes_delta": 0, "created_at": clock.now, "attempts": 0,
+                                             "next_at": clock.now})], commit=False)
+    bot.in_flight.add((task_id, "during1"))
+    commits = store.commits
+
+    bot.on_send_result(job, None)
+    assert store.commits == commits + 1
+    assert store.committed == {"outbox": {}, "flags": {task_id: {"during1"}}}
+    assert bot.in_flight == set()
+
+
+def test_stale_notification_is_dropped_instead_of_retried(bot, store, clock):
+    job = OutboundJob(task("a"), "before1", 15, bot.chat_args)
+    task_id = job.task.stable_id
+    put(task_id, "before1", clock.now - 590)
+    bot.in_flight.add((task_id, "before1"))
+
+    bot.on_send_result(job, Throttled())
+    assert store.committed["outbox"] == {}
+    assert bot.scheduled == []
+    assert bot.in_flight == set()
+
+
+def test_digest_is_retried_as_one_group(bot, store, clock):
+    items = [OutboundJob(task(name), "overdue1", -5, bot.chat_args) for name in ("a", "b")]
+    put(items[0].task.stable_id, "overdue1", clock.now, attempts=2)
+    put(items[1].task.stable_id, "overdue1", clock.now)
+    digest = OutboundJob(items[0].task, "digest:overdue", 0, bot.chat_args, items=items)
+
+    bot.on_send_result(digest, RuntimeError("network"))
+    [(keys, delay)] = bot.scheduled
+    assert keys == sorted((item.task.stable_id, "overdue1") for item in items)
+    # Попытки группы — по самой «старой» записи
+    assert {store.committed["outbox"][item.task.stable_id]["overdue1"]["attempts"] for item in items} == {3}
+
+
+def test_resume_after_restart(bot, store, clock):
+    due, later, stale, sent = (task(name).stable_id for name in ("due", "later", "stale", "sent"))
+    put(due, "before1", clock.now - 100, attempts=1, next_at=clock.now - 10)
+    put(due, "during1", clock.now - 50, attempts=1, next_at=clock.now)
+    put(later, "overdue1", clock.now - 100, attempts=3, next_at=clock.now + 25)
+    put(stale, "overdue1", clock.now - 700)
+    put(sent, "before1", clock.now)
+    bot.sent_flags[sent] = {"before1"}
+
+    bot.resume_outbox()
+    # Всё просроченное — одной группой, чтобы свернулось в сводку
+    assert bot.scheduled == [([(later, "overdue1")], 25), ([(due, "before1"), (due, "during1")], 0.0)]
+    assert set(store.committed["outbox"]) == {due, later}
+    assert bot.in_flight == {(due, "before1"), (due, "during1"), (later, "overdue1")}
+
+
+def test_retry_drops_entries_whose_task_is_gone(bot, store, clock):
+    kept, gone = task("kept"), task("gone")
+    notifier.task_index[kept.stable_id] = kept
+    for t in (kept, gone):
+        put(t.stable_id, "overdue1", clock.now, attempts=1)
+        bot.in_flight.add((t.stable_id, "overdue1"))
+
+    bot._retry_now([(kept.stable_id, "overdue1"), (gone.stable_id, "overdue1")])
+    assert [(job.task, job.key, job.minutes_delta) for job in bot.dispatched] == [(kept, "overdue1", 5)]
+    assert set(store.committed["outbox"]) == {kept.stable_id}
+    assert bot.in_flight == {(kept.stable_id, "overdue1")}
@@ -0,0 +1,68 @@
+import json
+
+from state_store import JsonStore, SqliteStore
+
+
+def test_sqlite_imports_full_legacy_json(tmp_path):
+    flags_file = tmp_path / "sent_notifications.json"
+    message_file = tmp_path / "message_ids.json"
+    outbox_item = {"minutes_delta": 15, "created_at": 1000.0, "attempts": 2, "next_at": 1060.0}
+    flags_file.write_text(json.dumps({"t1": ["before1", "during1"]}), encoding="utf-8")
+    message_file.write_text(json.dumps({
+        "ids": {"t1": {"during1": 42}},
+        "meta": {"t1": ["note.md", 3]},
+        "expires": {"t1": 5000.0, "t2": 6000.0},
+        "outbox": {"t2": {"overdue1": outbox_item}},
+    }), encoding="utf-8")
+
+    store = SqliteStore(tmp_path / "state.sqlite3", flags_file, message_file)
+    try:
+        assert store.load_flags() == {"t1": {"before1", "during1"}}
+        assert store.load_messages() == ({"t1": {"during1": 42}}, {"t1": ("note.md", 3)})
+        assert store.load_expiry() == {"t1": 5000.0, "t2": 6000.0}
+        assert store.load_outbox() == {"t2": {"overdue1": outbox_item}}
+    finally:
+        store.close()
+
+    # Повторный запуск не импортирует заново и не теряет записи
+    store = SqliteStore(tmp_path / "state.sqlite3", flags_file, message_file)
+    try:
+        assert store.load_outbox() == {"t2": {"overdue1": outbox_item}}
+    finally:
+        store.close()
+
+
+def test_json_store_round_trip_keeps_expiry_and_outbox(tmp_path):
+    store = JsonStore(tmp_path / "flags.json", tmp_path / "messages.json")
+    store.load_flags()
+    store.load_messages()
+    store.set_expiry("t1", 123.0)
+    store.put_outbox("t1", "before1", {"minutes_delta": 5, "created_at": 1.0, "attempts": 0, "next_at": 2.0})
+    store.commit()
+
+    reloaded = JsonStore(tmp_path / "flags.json", tmp_path / "messages.json")
+    reloaded.load_messages()
+    assert reloaded.load_expiry() == {"t1": 123.0}
+    assert reloaded.load_outbox()["t1"]["before1"]["attempts"] == 0
+
+
+def test_sqlite_retries_legacy_import_after_a_read_error(tmp_path):
+    flags_file = tmp_path / "sent_notifications.json"
+    message_file = tmp_path / "message_ids.json"
+    flags_file.write_text(json.dumps({"t1": ["before1"]}), encoding="utf-8")
+    message_file.write_text("{not json", encoding="utf-8")
+
+    store = SqliteStore(tmp_path / "state.sqlite3", flags_file, message_file)
+    try:
+        assert store.load_flags() == {}
+    finally:
+        store.close()
+
+    # Файл починили — импорт проходит при следующем запуске
+    message_file.write_text(json.dumps({"ids": {"t1": {"before1": 7}}, "meta": {}}), encoding="utf-8")
+    store = SqliteStore(tmp_path / "state.sqlite3", flags_file, message_file)
+    try:
+        assert store.load_flags() == {"t1": {"before1"}}
+        assert store.load_messages()[0] == {"t1": {"before1": 7}}
+    finally:
+        store.close()
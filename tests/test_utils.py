@@ -0,0 +1,105 @@
+import json
+import os
+import stat
+
+import pytest
+
+import utils
+from utils import atomic_write_text, load_config, validate_config
+
+VALID = {
+    "TELEGRAM_TOKEN": "t", "CHAT_ID": 1, "TASKS_FOLDER": "/vault",
+    "default_warn_before_start": ["15m"], "default_warn_during": ["0m"], "default_warn_overdue": ["5m", "1h"],
+}
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permission bits")
+def test_atomic_write_keeps_the_file_mode(tmp_path):
+    note = tmp_path / "note.md"
+    note.write_text("- [ ] a\n", encoding="utf-8")
+    note.chmod(0o640)
+
+    atomic_write_text(note, "- [x] a\n")
+
+    assert note.read_text(encoding="utf-8") == "- [x] a\n"
+    assert stat.S_IMODE(note.stat().st_mode) == 0o640
+    assert list(tmp_path.iterdir()) == [note]
+
+
+def test_atomic_write_falls_back_to_in_place_when_the_file_stays_locked(tmp_path, monkeypatch):
+    note = tmp_path / "note.md"
+    note.write_text("- [ ] a\n- [ ] b\n", encoding="utf-8")
+
+    def locked(src, dst):
+        raise PermissionError(13, "The process cannot access the file")
+
+    monkeypatch.setattr(utils, "IS_WINDOWS", True)
+    monkeypatch.setattr(utils, "REPLACE_RETRY_DELAY", 0)
+    monkeypatch.setattr(utils.os, "replace", locked)
+
+    atomic_write_text(note, "- [x] a\n")
+
+    assert note.read_text(encoding="utf-8") == "- [x] a\n"
+    assert list(tmp_path.iterdir()) == [note]
+
+
+def test_validate_config_accepts_a_valid_config():
+    validate_config({**VALID, "CHECK_INTERVAL": 30, "override_max_offset": "24h",
+                     "UPDATE_MODE": "webhook", "WEBHOOK_SECRET": "s3cret_-"})
+
+
+@pytest.mark.parametrize("change, error", [
+    ({"TASKS_FOLDER": None}, KeyError),
+    ({"default_warn_overdue": "5m"}, ValueError),
+    ({"default_warn_before_start": ["15 minutes"]}, ValueError),
+    ({"CHECK_INTERVAL": 0}, ValueError),
+    ({"tolerance_during_sec": True}, ValueError),
+    ({"override_max_offset": "1d"}, ValueError),
+    ({"UPDATE_MODE": "push"}, ValueError),
+    ({"UPDATE_MODE": "webhook"}, ValueError),
+    ({"UPDATE_MODE": "webhook", "WEBHOOK_SECRET": "no spaces"}, ValueError),
+])
+def test_validate_config_rejects(change, error):
+    config = {**VALID, **change}
+    config = {key: value for key, value in config.items() if value is not None}
+    with pytest.raises(error):
+        validate_config(config)
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(utils, "CONFIG_PATH", path)
+    monkeypatch.setattr(utils, "_config_cache", {"mtime_ns": None, "data": None})
+    return path
+
+
+def write_config(path, config, mtime_ns):
+    path.write_text(config if isinstance(config, str) else json.dumps(config), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_load_config_is_cached_until_the_file_changes(config_file):
+    write_config(config_file, VALID, 1_000_000_000)
+    first = load_config()
+    assert load_config() is first
+
+    write_config(config_file, {**VALID, "CHECK_INTERVAL": 30}, 2_000_000_000)
+    second = load_config()
+    assert second is not first and second["CHECK_INTERVAL"] == 30
+
+
+def test_load_config_keeps_the_last_good_config(config_file):
+    write_config(config_file, VALID, 1_000_000_000)
+    good = load_config()
+
+    write_config(config_file, "{broken", 2_000_000_000)
+    assert load_config() is good
+    write_config(config_file, {**VALID, "CHECK_INTERVAL": -1}, 3_000_000_000)
+    assert load_config() is good
+
+
+def test_load_config_raises_on_an_invalid_first_load(config_file):
+    write_config(config_file, {**VALID, "default_warn_during": "0m"}, 1_000_000_000)
+    with pytest.raises(ValueError):
+        load_config()
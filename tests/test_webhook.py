@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from webhook import WebhookServer
+
+SECRET = "s3cret"
+
+
+class StubApp:
+    """Вместо telegram.ext.Application: webhook трогает только bot и process_update."""
+
+    def __init__(self):
+        self.bot = None
+        self.processed = []
+        self.release = asyncio.Event()
+
+    async def process_update(self, update):
+        await self.release.wait()
+        self.processed.append(update.update_id)
+
+
+def post(update_id: int, secret: str = SECRET, body: bytes = None, path: str = "/telegram") -> bytes:
+    body = json.dumps({"update_id": update_id}).encode() if body is None else body
+    return (f"POST {path} HTTP/1.1\r\nX-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def status(server: WebhookServer, raw: bytes) -> int:
+    reader, writer = await asyncio.open_connection(server.server.host, server.server.port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        return int((await reader.readline()).split()[1])
+    finally:
+        writer.close()
+
+
+def run(scenario, **options):
+    async def main():
+        app = StubApp()
+        server = WebhookServer(app, SECRET, port=0, **options)
+        await server.start()
+        try:
+            return await scenario(app, server)
+        finally:
+            app.release.set()
+            await server.close(drain_timeout=1)
+
+    return asyncio.run(main())
+
+
+def test_update_with_the_right_secret_is_processed():
+    async def scenario(app, server):
+        assert await status(server, post(1)) == 200
+        app.release.set()
+        await asyncio.wait_for(server._queue.join(), 1)
+        return app.processed
+
+    assert run(scenario) == [1]
+
+
+def test_rejected_requests_never_reach_the_application():
+    async def scenario(app, server):
+        app.release.set()
+        results = [
+            await status(server, post(1, secret="wrong")),
+            await status(server, post(2, secret="")),
+            await status(server, post(3, body=b"{not json")),
+            await status(server, post(4, body=b"[1, 2]")),
+            await status(server, post(5, path="/other")),
+            await status(server, b"GET /telegram HTTP/1.1\r\n\r\n"),
+        ]
+        await asyncio.sleep(0.05)
+        return results, app.processed
+
+    assert run(scenario) == ([403, 403, 400, 400, 404, 405], [])
+
+
+def test_full_queue_answers_503_so_telegram_redelivers():
+    async def scenario(app, server):
+        first = await status(server, post(1))
+        await asyncio.sleep(0.05)       # воркер забрал первый апдейт и ждёт
+        second = await status(server, post(2))
+        third = await status(server, post(3))
+        app.release.set()
+        await asyncio.wait_for(server._queue.join(), 1)
+        return [first, second, third], app.processed
+
+    assert run(scenario, workers=1, queue_size=1) == ([200, 200, 503], [1, 2])
+
+
+def test_http_limits_apply_to_the_webhook():
+    async def scenario(app, server):
+        return [
+            # Тело не нужно: 413 — по одному Content-Length, до чтения
+            await status(server, b"POST /telegram HTTP/1.1\r\nContent-Length: 1048577\r\n\r\n"),
+            await status(server, b"POST /telegram HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"),
+            await status(server, b"POST /telegram HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+            await status(server, b"POST /telegram HTTP/1.1\r\nX-Long: " + b"a" * 9000 + b"\r\n\r\n"),
+        ]
+
+    assert run(scenario) == [413, 411, 400, 431]
@@ -1,33 +1,172 @@
 # utils.py
 
 import json
+import logging
 import os
 import re
+import shutil
+import time
 from pathlib import Path
 from datetime import timedelta
 
+log = logging.getLogger(__name__)
+
 # === CONFIG LOADER ===
 
 # Assumes config.json lives next to this utils.py
 CONFIG_PATH = Path(__file__).parent / "config.json"
 
+REQUIRED_KEYS = [
+    "TELEGRAM_TOKEN",
+    "CHAT_ID",
+    "TASKS_FOLDER",
+    "default_warn_before_start",
+    "default_warn_during",
+    "default_warn_overdue",
+]
+
+OFFSET_KEYS = ["default_warn_before_start", "default_warn_during", "default_warn_overdue"]
+
+POSITIVE_NUMBER_KEYS = ["CHECK_INTERVAL", "tolerance_before_sec", "tolerance_during_sec"]
+
+UPDATE_MODES = ("polling", "webhook")
+# Bot API limits for secret_token (see webhook.py)
+WEBHOOK_SECRET_RE = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+# Parsed config and the mtime_ns of the file it came from
+_config_cache = {"mtime_ns": None, "data": None}
+
+
+def validate_config(config: dict):
+    """
+    Raise KeyError for a missing required key, ValueError for a bad value.
+    """
+    for key in REQUIRED_KEYS:
+        if key not in config:
+            raise KeyError(f"Missing required config key: {key}")
+    for key in OFFSET_KEYS:
+        offsets = config[key]
+        if not isinstance(offsets, list) or not all(
+                isinstance(o, str) and OFFSET_RE.fullmatch(o.strip()) for o in offsets):
+            raise ValueError(f"{key} must be a list of offsets like \"15m\" or \"2h\", got {offsets!r}")
+    for key in POSITIVE_NUMBER_KEYS:
+        value = config.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{key} must be a positive number, got {value!r}")
+    cap = config.get("override_max_offset")
+    if cap is not None and not (isinstance(cap, str) and OFFSET_RE.fullmatch(cap.strip())):
+        raise ValueError(f"override_max_offset must be an offset like \"1440m\" or \"24h\", got {cap!r}")
+    mode = config.get("UPDATE_MODE", "polling")
+    if mode not in UPDATE_MODES:
+        raise ValueError(f"UPDATE_MODE must be one of {UPDATE_MODES}, got {mode!r}")
+    if mode == "webhook" and not WEBHOOK_SECRET_RE.fullmatch(str(config.get("WEBHOOK_SECRET", ""))):
+        raise ValueError("UPDATE_MODE=webhook needs WEBHOOK_SECRET: 1-256 characters A-Z, a-z, 0-9, _ or -")
+
+
 def load_config() -> dict:
     """
     Load the bot configuration from config.json.
+    The parsed dict is cached and re-read only when the file's mtime changes,
+    so calling this on every tick is cheap. A reload returns a new dict object.
+    If the edited file is broken, the last good config is kept.
+    Treat the returned dict as read-only: it is shared between callers.
+    """
+    mtime_ns = os.stat(CONFIG_PATH).st_mtime_ns
+    if mtime_ns == _config_cache["mtime_ns"]:
+        return _config_cache["data"]
+
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        validate_config(config)
+    except (ValueError, KeyError) as e:
+        if _config_cache["data"] is None:
+            raise
+        log.error(f"[config] ❌ Invalid {CONFIG_PATH.name}, keeping previous config: {e}")
+        _config_cache["mtime_ns"] = mtime_ns
+        return _config_cache["data"]
+
+    if _config_cache["data"] is not None:
+        log.info(f"[config] 🔁 Reloaded {CONFIG_PATH.name}")
+    _config_cache["mtime_ns"] = mtime_ns
+    _config_cache["data"] = config
+    return config
+
+
+# === FILE UTILITY ===
+
+def atomic_write_text(path, text: str, encoding: str = "utf-8"):
+    """
+    Write text to path atomically: write a temp file next to it, fsync,
+    then os.replace. A crash mid-write leaves the old file intact.
     """
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+# On Windows os.replace fails while another program (Obsidian) has the file open
+IS_WINDOWS = os.name == "nt"
+REPLACE_RETRIES = 5
+REPLACE_RETRY_DELAY = 0.05
+
+
+def atomic_write_bytes(path, data: bytes):
+    """
+    Binary counterpart of atomic_write_text (used for the warm-start snapshot).
+    The new file keeps the mode (and, where permitted, the owner) of the old one.
+    If the target stays locked, the data is written in place instead.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        _copy_owner_and_mode(path, tmp_path)
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                if not IS_WINDOWS:
+                    raise
+                time.sleep(REPLACE_RETRY_DELAY * (attempt + 1))
+        log.warning(f"[file] ⚠️ {path.name} is locked, writing it in place")
+        with open(path, "r+b") as f:
+            f.write(data)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.unlink(missing_ok=True)
+
+
+def _copy_owner_and_mode(src: Path, dst: Path):
+    try:
+        st = os.stat(src)
+    except FileNotFoundError:
+        return
+    shutil.copymode(src, dst)
+    if hasattr(os, "chown") and (st.st_uid, st.st_gid) != (os.getuid(), os.getgid()):
+        try:
+            os.chown(dst, st.st_uid, st.st_gid)
+        except OSError:
+            pass    # only root may give a file away; the mode is still preserved
 
 
 # === TIME PARSING UTILITY ===
 
+OFFSET_RE = re.compile(r"([+-]?)(\d+)\s*([mh])")
+
 def parse_relative_time(offset_str: str) -> timedelta:
     """
     Convert a string like '10m', '-2h', '+15m' into a timedelta.
     Supports 'm' (minutes) and 'h' (hours). Invalid formats return zero timedelta.
     """
     offset_str = offset_str.strip()
-    match = re.fullmatch(r"([+-]?)(\d+)\s*([mh])", offset_str)
+    match = OFFSET_RE.fullmatch(offset_str)
     if not match:
         # Unrecognized format → zero offset
         return timedelta()
@@ -41,6 +180,24 @@ def parse_relative_time(offset_str: str) -> timedelta:
     else:  # unit == 'h'
         return timedelta(hours=sign * value)
 
+
+def max_offset(offsets) -> timedelta:
+    """
+    Largest offset from a list like ["15m", "1440m"]; never negative.
+    """
+    return max([parse_relative_time(o) for o in offsets] + [timedelta()])
+
+
+DEFAULT_OVERRIDE_MAX_OFFSET = "1440m"
+
+def override_cap(config: dict) -> timedelta:
+    """
+    Largest offset a per-task [remind:: ...] / [during:: ...] / [overdue:: ...]
+    field may use (override_max_offset). The note window and the retention
+    horizon are widened to cover it; larger overrides are rejected.
+    """
+    return parse_relative_time(config.get("override_max_offset", DEFAULT_OVERRIDE_MAX_OFFSET))
+
 # === ARGS ====
 
 def telegram_args() -> dict:
@@ -0,0 +1,304 @@
+# watcher.py
+"""
+Наблюдение за папкой с задачами.
+
+- InotifyWatcher: события ядра Linux (через ctypes, без зависимостей)
+- PollingWatcher: запасной вариант — периодический stat файлов
+Оба копят изменённые пути и отдают их пачкой после паузы (debounce),
+чтобы серия автосохранений Obsidian превращалась в одну перепроверку.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class FolderWatcher(ABC):
+    """
+    Базовый класс: накопление изменений и ожидание с debounce.
+    """
+
+    def __init__(self, folder_path: str, debounce: float = 1.0, max_delay: float = 5.0):
+        self.folder = Path(folder_path)
+        self.debounce = debounce
+        self.max_delay = max_delay          # верхняя граница ожидания тишины
+        self._pending: Set[str] = set()
+        self._full_rescan = False
+        self._event = asyncio.Event()
+
+    def _notify(self, path: Optional[str]):
+        if path is None:
+            self._full_rescan = True
+        else:
+            self._pending.add(path)
+        self._event.set()
+
+    async def wait_for_changes(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Ждёт изменений не дольше timeout секунд.
+        Возвращает множество путей (пустое — ничего не менялось)
+        или None, если нужен полный обход папки.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+
+        # Debounce: ждём, пока поток событий затихнет
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while True:
+            self._event.clear()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._event.wait(), min(self.debounce, remaining))
+            except asyncio.TimeoutError:
+                break
+
+        self._event.clear()
+        changed, self._pending = self._pending, set()
+        if self._full_rescan:
+            self._full_rescan = False
+            return None
+        return changed
+
+    @abstractmethod
+    async def start(self):
+        """Начинает наблюдение; OSError — если оно невозможно."""
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(FolderWatcher):
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    # После них watch на папку больше не действует
+    LOST_MASK = IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, folder_path: str, debounce: float = 1.0, max_delay: float = 5.0,
+                 rewatch_interval: float = 2.0):
+        super().__init__(folder_path, debounce, max_delay)
+        self.rewatch_interval = rewatch_interval
+        self._fd: Optional[int] = None
+        self._wd: Optional[int] = None
+        self._libc = None
+        self._rewatch_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return False
+        return hasattr(ctypes.CDLL(libc_name), "inotify_init1")
+
+    async def start(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        try:
+            self._wd = self._add_watch(fd)
+        except OSError:
+            os.close(fd)
+            raise
+
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_readable)
+        log.info(f"[watch] 👁 inotify watching {self.folder}")
+
+    def _add_watch(self, fd: int) -> int:
+        wd = self._libc.inotify_add_watch(fd, os.fsencode(str(self.folder)), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {self.folder}")
+        return wd
+
+    def _lost_watch(self, wd: int, mask: int):
+        """
+        Папку удалили, переместили или подменили: watch на неё мёртв.
+        Снимаем его и заново ставим на тот же путь — сразу или, пока
+        папки нет, раз в rewatch_interval.
+        """
+        if wd != self._wd:
+            return      # хвост уже заменённого watch (например, IN_IGNORED после IN_DELETE_SELF)
+        log.warning(f"[watch] ⚠️ inotify watch on {self.folder} lost (mask={mask:#x}), re-adding")
+        if not mask & self.IN_IGNORED:
+            # IN_MOVE_SELF: watch остался на перемещённой папке — снимаем
+            self._libc.inotify_rm_watch(self._fd, wd)
+        self._wd = None
+        self._notify(None)
+        if self._rewatch_task is None:
+            self._rewatch_task = asyncio.get_running_loop().create_task(self._rewatch())
+
+    async def _rewatch(self):
+        try:
+            while self._fd is not None:
+                try:
+                    self._wd = self._add_watch(self._fd)
+                    log.info(f"[watch] 👁 inotify watching {self.folder} again")
+                    # Всё, что менялось без watch, найдёт полный обход
+                    self._notify(None)
+                    return
+                except OSError as e:
+                    log.debug(f"[watch] inotify re-add failed → {e}")
+                await asyncio.sleep(self.rewatch_interval)
+        finally:
+            self._rewatch_task = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log.error(f"[watch] ❌ inotify read failed → {e}")
+            self._notify(None)
+            return
+
+        offset = 0
+        header = self._EVENT_HEADER
+        while offset + header.size <= len(data):
+            wd, mask, _cookie, length = header.unpack_from(data, offset)
+            raw_name = data[offset + header.size: offset + header.size + length]
+            offset += header.size + length
+
+            if mask & self.IN_Q_OVERFLOW:
+                log.warning("[watch] ⚠️ inotify queue overflow, full rescan")
+                self._notify(None)
+                continue
+            if mask & self.LOST_MASK:
+                self._lost_watch(wd, mask)
+                continue
+            if wd != self._wd:
+                continue
+
+            name = os.fsdecode(raw_name.rstrip(b"\0"))
+            if name.endswith(".md"):
+                self._notify(str(self.folder / name))
+
+    def close(self):
+        if self._rewatch_task is not None:
+            self._rewatch_task.cancel()
+            self._rewatch_task = None
+        if self._fd is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._fd)
+            except RuntimeError:
+                pass
+            os.close(self._fd)
+            self._fd = None
+
+
+class PollingWatcher(FolderWatcher):
+    """
+    Запасной вариант: раз в poll_interval сравнивает (mtime_ns, size) файлов.
+    Это только stat, без чтения и разбора.
+    """
+
+    def __init__(self, folder_path: str, debounce: float = 1.0, max_delay: float = 5.0,
+                 poll_interval: float = 2.0):
+        super().__init__(folder_path, debounce, max_delay)
+        self.poll_interval = poll_interval
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._failed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _stat_folder(self) -> Dict[str, Tuple[int, int]]:
+        result = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.endswith(".md"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                result[str(self.folder / entry.name)] = (st.st_mtime_ns, st.st_size)
+        return result
+
+    async def start(self):
+        self._snapshot = await asyncio.to_thread(self._stat_folder)
+        self._task = asyncio.create_task(self._poll())
+        log.info(f"[watch] 👁 Polling {self.folder} every {self.poll_interval}s")
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # scandir + stat на каждый файл — вне event loop
+                current = await asyncio.to_thread(self._stat_folder)
+            except OSError as e:
+                # Папки нет — полный обход просим один раз, а не на каждом опросе
+                if not self._failed:
+                    log.warning(f"[watch] ⚠️ Poll failed → {e}")
+                    self._failed = True
+                    self._notify(None)
+                continue
+
+            if self._failed:
+                # Папка вернулась: всё, что менялось без опроса, найдёт полный обход
+                log.info(f"[watch] 👁 Polling {self.folder} again")
+                self._failed = False
+                self._snapshot = current
+                self._notify(None)
+                continue
+            for path, stamp in current.items():
+                if self._snapshot.get(path) != stamp:
+                    self._notify(path)
+            for path in self._snapshot.keys() - current.keys():
+                self._notify(path)
+            self._snapshot = current
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+async def create_watcher(folder_path: str, mode: str = "auto", debounce: float = 1.0,
+                         poll_interval: float = 2.0) -> Optional[FolderWatcher]:
+    """
+    mode: "auto" (inotify, иначе polling), "inotify", "poll" или "off".
+    """
+    if mode == "off":
+        return None
+
+    if mode in ("auto", "inotify") and InotifyWatcher.available():
+        watcher = InotifyWatcher(folder_path, debounce)
+        try:
+            await watcher.start()
+            return watcher
+        except OSError as e:
+            log.warning(f"[watch] ⚠️ inotify unavailable ({e}), falling back to polling")
+
+    watcher = PollingWatcher(folder_path, debounce, poll_interval=poll_interval)
+    await watcher.start()
+    return watcher
@@ -0,0 +1,160 @@
+# webhook.py
+"""
+Приём апдейтов через webhook вместо long polling.
+
+Telegram сам присылает POST с апдейтом на локальный HTTP-сервер
+(http_server.HttpServer, перед ним — reverse proxy с TLS). Нажатие «Done»
+обрабатывается сразу, без круга getUpdates и без 5-секундной паузы
+перезапуска поллинга после сбоя.
+
+- Запрос принимается, только если заголовок X-Telegram-Bot-Api-Secret-Token
+  совпадает с WEBHOOK_SECRET (его же получает set_webhook).
+- Сервер отвечает 200 сразу после постановки апдейта в очередь; обработку
+  ведут WEBHOOK_WORKERS воркеров. Очередь ограничена WEBHOOK_QUEUE_SIZE:
+  при переполнении — 503, и Telegram повторит доставку позже.
+
+Локальная проверка без Telegram — прислать апдейт напрямую:
+    curl -X POST http://127.0.0.1:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+import asyncio
+import hmac
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+import metrics
+from http_server import HttpRequest, HttpResponse, HttpServer
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+# Больше ничего бот не обрабатывает — остальное Telegram даже не присылает
+ALLOWED_UPDATES = ["callback_query", "message"]
+
+
+class WebhookServer:
+    def __init__(self, app: Application, secret: str, host: str = "127.0.0.1", port: int = 8443,
+                 path: str = "/telegram", url: str = "", workers: int = 4, queue_size: int = 256):
+        """
+        url — публичный адрес для set_webhook (например, https://bot.example.com/telegram);
+        пустой — webhook в Telegram не регистрируется (локальные проверки, fake Bot API).
+        """
+        self.app = app
+        self.secret = secret
+        self.path = path
+        self.url = url
+        self.workers = workers
+        self.server = HttpServer(self.handle, host, port, max_body=1 << 20)
+        self._queue: "asyncio.Queue[Tuple[Update, float]]" = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+
+    @classmethod
+    def from_config(cls, app: Application, config: dict) -> "WebhookServer":
+        return cls(
+            app,
+            secret=config["WEBHOOK_SECRET"],
+            host=config.get("WEBHOOK_HOST", "127.0.0.1"),
+            port=int(config.get("WEBHOOK_PORT", 8443)),
+            path=config.get("WEBHOOK_PATH", "/telegram"),
+            url=config.get("WEBHOOK_URL", ""),
+            workers=int(config.get("WEBHOOK_WORKERS", 4)),
+            queue_size=int(config.get("WEBHOOK_QUEUE_SIZE", 256)),
+        )
+
+    async def start(self):
+        await self.server.start()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info(f"[webhook] 🚀 Accepting updates at {self.server.url}{self.path} ({self.workers} workers)")
+        if self.url:
+            await self.register()
+
+    async def register(self):
+        """set_webhook на self.url с секретом — с этого момента Telegram шлёт апдейты сюда."""
+        await self.app.bot.set_webhook(self.url, secret_token=self.secret, allowed_updates=ALLOWED_UPDATES)
+        log.info(f"[webhook] 🪝 Registered {self.url}")
+
+    async def close(self, drain_timeout: float = 5.0):
+        """
+        Сервер закрывается первым; уже принятые апдейты дообрабатываются
+        (до drain_timeout), затем воркеры отменяются. Webhook в Telegram
+        не снимается: непринятые апдейты он доставит после перезапуска,
+        а start_polling сам вызывает delete_webhook.
+        """
+        await self.server.close()
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"[webhook] ⚠️ {self._queue.qsize()} updates left unprocessed")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        if request.path != self.path:
+            return HttpResponse.text("not found", 404)
+        if request.method != "POST":
+            return HttpResponse.text("method not allowed", 405)
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            metrics.WEBHOOK_UPDATES.inc(result="forbidden")
+            log.warning("[webhook] 🚫 Rejected update with a missing or wrong secret token")
+            return HttpResponse.text("forbidden", 403)
+
+        update = self._parse(request)
+        if update is None:
+            metrics.WEBHOOK_UPDATES.inc(result="invalid")
+            return HttpResponse.text("bad update", 400)
+        try:
+            self._queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            metrics.WEBHOOK_UPDATES.inc(result="overloaded")
+            log.warning(f"[webhook] ⚠️ Queue is full, update {update.update_id} will be redelivered")
+            return HttpResponse.text("busy", 503)
+        metrics.WEBHOOK_UPDATES.inc(result="accepted")
+        return HttpResponse.text("ok")
+
+    def _parse(self, request: HttpRequest) -> Optional[Update]:
+        try:
+            data = request.json()
+            if not isinstance(data, dict):
+                raise ValueError("update must be a JSON object")
+            return Update.de_json(data, self.app.bot)
+        except Exception as e:
+            log.warning(f"[webhook] ⚠️ Ignoring malformed update: {e}")
+            return None
+
+    async def _worker(self, n: int):
+        while True:
+            update, received = await self._queue.get()
+            try:
+                await self.app.process_update(update)
+            except Exception as e:
+                log.error(f"[webhook] ❌ Update {update.update_id} failed: {e}", exc_info=True)
+            finally:
+                metrics.WEBHOOK_LATENCY.observe(time.perf_counter() - received)
+                self._queue.task_done()
+
+
+async def serve_webhook(app: Application, config: dict):
+    """
+    Держит webhook-сервер до отмены — замена safe_polling при UPDATE_MODE=webhook.
+    """
+    server = WebhookServer.from_config(app, config)
+    while True:
+        try:
+            await server.start()
+            break
+        except Exception as e:
+            # Порт занят, set_webhook не прошёл — как у поллинга, пробуем снова
+            log.error(f"[webhook] 🔥 Failed to start: {e}; retrying in 5 seconds", exc_info=True)
+            await server.close()
+            await asyncio.sleep(5)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()